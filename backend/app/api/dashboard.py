@@ -1,17 +1,13 @@
-from fastapi import APIRouter, Depends
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
 from app.core.database import get_db
 from app.core.deps import require_auth
+from app.core.kpi import METRICS, kpi_totals, kpi_trend, reconcile
+from app.core.stats import table_stats
 from app.modules.identity.models import User
-from app.modules.accounting.models import AccountMove
-from app.modules.sales.models import SaleOrder, Lead
-from app.modules.purchasing.models import PurchaseOrder
-from app.modules.inventory.models import Product, StockPicking
-from app.modules.hr.models import Employee
-from app.modules.manufacturing.models import ProductionOrder
-from app.modules.projects.models import Project, Task
-from app.modules.helpdesk.models import HelpdeskTicket
+from app.modules.identity.permissions import require_permission
 
 router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
 
@@ -22,70 +18,53 @@ def get_tenant(user: User = Depends(require_auth)) -> str:
 
 @router.get("")
 async def global_dashboard(tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
-    async def cnt(model, *filters):
-        return (await db.execute(select(func.count()).where(*filters, model.tenant_id == tenant_id, model.is_deleted == False))).scalar()
-
-    async def sm(model, col, *filters):
-        return float((await db.execute(select(func.coalesce(func.sum(col), 0)).where(*filters, model.tenant_id == tenant_id, model.is_deleted == False))).scalar())
-
+    k = await kpi_totals(db, tenant_id)
+    s = await table_stats(db, tenant_id, "account_move", "sale_order", "purchase_order",
+                          "product", "stock_picking", "employee", "production_order",
+                          "project", "task", "helpdesk_ticket")
+    so, po = s["sale_order"], s["purchase_order"]
+    emp, mo, tk = s["employee"], s["production_order"], s["helpdesk_ticket"]
     return {
         "accounting": {
-            "accounts_receivable": await sm(AccountMove, AccountMove.amount_residual,
-                                             AccountMove.move_type == "out_invoice",
-                                             AccountMove.state == "posted",
-                                             AccountMove.payment_state != "paid"),
-            "accounts_payable": await sm(AccountMove, AccountMove.amount_residual,
-                                          AccountMove.move_type == "in_invoice",
-                                          AccountMove.state == "posted",
-                                          AccountMove.payment_state != "paid"),
-            "revenue_this_month": await sm(AccountMove, AccountMove.amount_total,
-                                            AccountMove.move_type == "out_invoice",
-                                            AccountMove.state == "posted"),
-            "invoices": await cnt(AccountMove,
-                                   AccountMove.move_type.in_(["out_invoice","in_invoice"])),
+            "accounts_receivable": k["receivable"],
+            "accounts_payable": k["payable"],
+            "revenue_this_month": k["revenue"],
+            "invoices": s["account_move"]["invoices"],
         },
         "sales": {
-            "orders": await cnt(SaleOrder),
-            "confirmed": await cnt(SaleOrder, SaleOrder.state == "confirmed"),
-            "revenue": await sm(SaleOrder, SaleOrder.total,
-                                 SaleOrder.state.in_(["confirmed","done"])),
-            "pipeline": await sm(Lead, Lead.expected_revenue,
-                                  Lead.state.not_in(["won","lost"])),
+            "orders": so["orders"],
+            "confirmed": so["confirmed"],
+            "revenue": k["sales_revenue"],
+            "pipeline": k["pipeline"],
         },
         "purchasing": {
-            "orders": await cnt(PurchaseOrder),
-            "pending": await cnt(PurchaseOrder, PurchaseOrder.state.in_(["draft","sent"])),
-            "spend": await sm(PurchaseOrder, PurchaseOrder.total,
-                               PurchaseOrder.state.in_(["confirmed","received","billed"])),
+            "orders": po["orders"],
+            "pending": po["pending"],
+            "spend": k["po_spend"],
         },
         "inventory": {
-            "products": await cnt(Product),
-            "low_stock": await cnt(Product,
-                                    Product.qty_on_hand <= Product.reorder_point,
-                                    Product.reorder_point > 0),
-            "total_value": await sm(Product, Product.qty_on_hand * Product.cost_price),
-            "pending_receipts": await cnt(StockPicking,
-                                           StockPicking.picking_type == "incoming",
-                                           StockPicking.state.in_(["confirmed","assigned"])),
+            "products": s["product"]["products"],
+            "low_stock": s["product"]["low_stock"],
+            "total_value": k["stock_value"],
+            "pending_receipts": s["stock_picking"]["pending_receipts"],
         },
         "hr": {
-            "employees": await cnt(Employee),
-            "active": await cnt(Employee, Employee.status == "active"),
-            "monthly_payroll": await sm(Employee, Employee.salary,
-                                         Employee.status == "active"),
+            "employees": emp["employees"],
+            "active": emp["active"],
+            "monthly_payroll": emp["payroll"],
         },
         "manufacturing": {
-            "orders": await cnt(ProductionOrder),
-            "in_progress": await cnt(ProductionOrder, ProductionOrder.state.in_(["confirmed","in_progress"])),
-            "done": await cnt(ProductionOrder, ProductionOrder.state == "done"),
+            "orders": mo["orders"],
+            "in_progress": mo["in_progress"],
+            "done": mo["done"],
         },
         "projects": {
-            "active": await cnt(Project, Project.state == "active"),
-            "open_tasks": await cnt(Task, Task.state.in_(["new","in_progress"])),
+            "active": s["project"]["active"],
+            "open_tasks": s["task"]["open"],
         },
         "helpdesk": {
-            "open_tickets": await cnt(HelpdeskTicket, HelpdeskTicket.state.in_(["new","open"])),
-            "urgent": await cnt(HelpdeskTicket, HelpdeskTicket.priority == "urgent"),
+            "open_tickets": int(k["open_tickets"]),
+            "urgent": tk["urgent"],
         },
     }
 
@@ -93,21 +72,39 @@ async def global_dashboard(tenant_id: str = Depends(get_tenant), db: AsyncSessio
 @router.get("/kpis")
 async def dashboard_kpis(tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
     """Lightweight KPI endpoint for the dashboard overview widgets."""
-    from sqlalchemy import select, func
-    from app.modules.sales.models import SaleOrder, Customer
-    from app.modules.helpdesk.models import HelpdeskTicket
-
-    async def cnt(model, *filters):
-        q = select(func.count()).select_from(model).where(
-            model.tenant_id == tenant_id,
-            model.is_deleted == False,
-            *filters,
-        )
-        return (await db.execute(q)).scalar() or 0
-
+    s = await table_stats(db, tenant_id, "sale_order", "customer")
+    k = await kpi_totals(db, tenant_id, "open_tickets")
     return {
-        "total_orders":    await cnt(SaleOrder),
-        "active_orders":   await cnt(SaleOrder, SaleOrder.state.in_(["draft", "confirmed"])),
-        "total_customers": await cnt(Customer),
-        "open_tickets":    await cnt(HelpdeskTicket, HelpdeskTicket.state.in_(["new", "open"])),
+        "total_orders":    s["sale_order"]["orders"],
+        "active_orders":   s["sale_order"]["active"],
+        "total_customers": s["customer"]["customers"],
+        "open_tickets":    int(k["open_tickets"]),
     }
+
+
+@router.get("/trends")
+async def dashboard_trends(
+    metric: str,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    tenant_id: str = Depends(get_tenant),
+    db: AsyncSession = Depends(get_db),
+):
+    """Monthly series of one KPI from the rollup table (default: the last 12 months)."""
+    if metric not in METRICS:
+        raise HTTPException(400, f"Unknown metric '{metric}'. Available: {', '.join(METRICS)}")
+    date_to = date_to or date.today()
+    if date_from is None:
+        y, m = divmod(date_to.year * 12 + date_to.month - 1 - 11, 12)
+        date_from = date(y, m + 1, 1)
+    if date_from > date_to:
+        raise HTTPException(400, "'from' must not be after 'to'")
+    return {"metric": metric, "from": date_from.isoformat(), "to": date_to.isoformat(),
+            "series": await kpi_trend(db, tenant_id, metric, date_from, date_to)}
+
+
+@router.post("/kpis/reconcile")
+async def reconcile_kpis(tenant_id: str = Depends(get_tenant),
+                         _p: User = Depends(require_permission("admin.settings.manage"))):
+    """Recount this tenant's KPIs from the source tables and record any drift as of today."""
+    return {"ok": True, "corrections": await reconcile(tenant_id)}
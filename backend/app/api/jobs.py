@@ -1,11 +1,20 @@
 """
 CI ERP — Jobs API
-Endpoints to inspect job status, dead-letters, and trigger retries.
+Endpoints to inspect job and batch status (polled or streamed as Server-Sent Events),
+queue depths, dead-letters, recurring schedules, and trigger retries.
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+import json
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from app.core.deps import require_auth, require_superadmin
 from app.modules.identity.models import User
-from app.core.jobs import get_job_status, get_dead_letters, retry_dead_letter, enqueue_job, JobType
+from app.core.jobs import (
+    get_job_status, watch_job, get_batch_status, get_dead_letters, count_dead_letters, retry_dead_letter,
+    replay_dead_letters, get_queue_depths,
+    get_schedules, get_schedule_history, enqueue_job, JobType,
+)
 
 router = APIRouter(prefix="/jobs", tags=["Background Jobs"])
 
@@ -19,14 +28,64 @@ async def job_status(job_id: str, user: User = Depends(require_auth)):
     return job
 
 
+@router.get("/stream/{job_id}")
+async def job_stream(job_id: str, request: Request, user: User = Depends(require_auth)):
+    """
+    Server-Sent Events: the job's current state, then a `job` event per progress report
+    or outcome, closing once it is done or dead.  Use instead of polling /status.
+    """
+    if not await get_job_status(job_id, user.tenant_id):
+        raise HTTPException(404, "Job not found")
+
+    async def events():
+        async for event in watch_job(job_id, user.tenant_id):
+            if await request.is_disconnected():
+                break
+            yield ": keep-alive\n\n" if event is None else f"event: job\ndata: {json.dumps(event)}\n\n"
+
+    # identity encoding keeps GZipMiddleware from buffering the stream
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache", "Content-Encoding": "identity", "X-Accel-Buffering": "no"})
+
+
+@router.get("/batches/{batch_id}")
+async def batch_status(batch_id: str, user: User = Depends(require_auth)):
+    """Aggregate progress of a bulk-enqueued batch (e.g. "1,850 / 2,000 done")."""
+    batch = await get_batch_status(batch_id, user.tenant_id)
+    if not batch:
+        raise HTTPException(404, "Batch not found")
+    return batch
+
+
+@router.get("/queues")
+async def queue_depths(user: User = Depends(require_superadmin)):
+    """Ready / delayed jobs per priority lane and the dead-letter count."""
+    return await get_queue_depths(user.tenant_id)
+
+
 @router.get("/dead-letters")
 async def dead_letters(
     limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    job_type: Optional[JobType] = Query(None, alias="type"),
     user: User = Depends(require_superadmin),
 ):
-    """List dead-lettered jobs (exhausted all retries)."""
-    items = await get_dead_letters(user.tenant_id, limit=limit)
-    return {"items": items, "total": len(items)}
+    """List dead-lettered jobs (exhausted all retries), newest first."""
+    t = job_type.value if job_type else None
+    items = await get_dead_letters(user.tenant_id, limit=limit, offset=offset, job_type=t)
+    return {"items": items, "total": await count_dead_letters(user.tenant_id, t),
+            "limit": limit, "offset": offset}
+
+
+@router.post("/dead-letters/replay")
+async def replay_dead(
+    job_type: Optional[JobType] = Query(None, alias="type"),
+    since: Optional[datetime] = Query(None),
+    user: User = Depends(require_superadmin),
+):
+    """Re-enqueue every dead letter of `type` dead-lettered at or after `since` (both optional)."""
+    n = await replay_dead_letters(user.tenant_id, job_type.value if job_type else None, since)
+    return {"status": "re-enqueued", "replayed": n}
 
 
 @router.post("/dead-letters/{job_id}/retry")
@@ -38,6 +97,22 @@ async def retry_dead(job_id: str, user: User = Depends(require_superadmin)):
     return {"status": "re-enqueued", "job_id": job_id}
 
 
+@router.get("/schedules")
+async def schedules(user: User = Depends(require_superadmin)):
+    """Recurring schedules with their next / last fire time and the current leader."""
+    return await get_schedules()
+
+
+@router.get("/schedules/{name}/history")
+async def schedule_history(name: str, limit: int = Query(20, ge=1, le=50),
+                           user: User = Depends(require_superadmin)):
+    """Recent fires of one schedule and the status of the jobs they enqueued."""
+    items = await get_schedule_history(name, limit, user.tenant_id)
+    if items is None:
+        raise HTTPException(404, "Schedule not found")
+    return {"name": name, "items": items}
+
+
 @router.post("/test")
 async def enqueue_test_job(user: User = Depends(require_superadmin)):
     """Enqueue a test notification job (dev/testing only)."""
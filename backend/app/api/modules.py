@@ -2,6 +2,7 @@
 All module routers — auth enforced, tenant from JWT, real workflow endpoints.
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, text
 from pydantic import BaseModel as Schema
@@ -9,6 +10,13 @@ from typing import Optional, List
 from datetime import datetime
 from app.core.database import get_db
 from app.core.deps import require_auth
+from app.core.pagination import paginate, InvalidCursor
+from app.core.counts import TotalMode
+from app.core.serialization import rows_to_dicts, to_dict as row_to_dict
+from app.core.export import ExportFormat, export_response
+from app.core.sequence import next_number
+from app.core.stats import table_stats
+from app.core.kpi import kpi_totals
 from app.modules.identity.models import User
 from app.modules.identity.permissions import require_permission
 
@@ -36,20 +44,22 @@ from app.modules.helpdesk.models import HelpdeskTicket, TicketReply
 from app.modules.crm.models import Activity
 
 
-def row_to_dict(obj):
-    """Convert SQLAlchemy model to dict."""
-    d = {}
-    for c in obj.__table__.columns:
-        v = getattr(obj, c.name)
-        if hasattr(v, 'isoformat'):
-            v = v.isoformat()
-        elif hasattr(v, '__float__'):
-            try:
-                v = float(v)
-            except Exception:
-                pass
-        d[c.name] = v
-    return d
+async def _list_page(db: AsyncSession, q, *keys, descending: bool = False,
+                     page: int = 1, limit: int = 20, cursor: Optional[str] = None,
+                     tenant_id: Optional[str] = None, total: TotalMode = TotalMode.EXACT) -> ORJSONResponse:
+    """
+    Standard list response: offset paging by default, keyset paging when `cursor` is passed.
+    `total` is exact (cached), estimate, or skip (null).
+    Rows are fetched as Core tuples and encoded directly — no ORM hydration.
+    """
+    try:
+        p = await paginate(db, q, *keys, descending=descending, page=page, limit=limit,
+                           cursor=cursor, tenant_id=tenant_id, total=total, core_rows=True)
+    except InvalidCursor as e:
+        raise HTTPException(400, str(e))
+    model = q.column_descriptions[0]["entity"]
+    return ORJSONResponse({"items": rows_to_dicts(model, p.items), "total": p.total,
+                           "page": page, "next_cursor": p.next_cursor, "total_mode": total.value})
 
 
 def get_tenant(user: User = Depends(require_auth)) -> str:
@@ -352,14 +362,7 @@ async def list_journals(tenant_id: str = Depends(get_tenant), db: AsyncSession =
     r = await db.execute(select(Journal).where(Journal.tenant_id == tenant_id, Journal.is_deleted == False))
     return [row_to_dict(x) for x in r.scalars().all()]
 
-@accounting_router.get("/invoices")
-async def list_invoices(
-    page: int = 1, limit: int = 20,
-    move_type: Optional[str] = None,
-    state: Optional[str] = None,
-    tenant_id: str = Depends(get_tenant),
-    db: AsyncSession = Depends(get_db)
-):
+def _invoices_query(tenant_id: str, move_type: Optional[str] = None, state: Optional[str] = None):
     q = select(AccountMove).where(
         AccountMove.tenant_id == tenant_id,
         AccountMove.is_deleted == False,
@@ -367,9 +370,26 @@ async def list_invoices(
     )
     if move_type: q = q.where(AccountMove.move_type == move_type)
     if state: q = q.where(AccountMove.state == state)
-    total = (await db.execute(select(func.count()).select_from(q.subquery()))).scalar()
-    items = (await db.execute(q.order_by(AccountMove.created_at.desc()).offset((page-1)*limit).limit(limit))).scalars().all()
-    return {"items": [row_to_dict(x) for x in items], "total": total, "page": page}
+    return q
+
+@accounting_router.get("/invoices")
+async def list_invoices(
+    page: int = 1, limit: int = 20, cursor: Optional[str] = None,
+    total: TotalMode = TotalMode.EXACT,
+    move_type: Optional[str] = None,
+    state: Optional[str] = None,
+    tenant_id: str = Depends(get_tenant),
+    db: AsyncSession = Depends(get_db)
+):
+    q = _invoices_query(tenant_id, move_type, state)
+    return await _list_page(db, q, AccountMove.created_at, descending=True, page=page, limit=limit, cursor=cursor,
+                            tenant_id=tenant_id, total=total)
+
+@accounting_router.get("/invoices/export")
+async def export_invoices(fmt: ExportFormat = ExportFormat.NDJSON, move_type: Optional[str] = None,
+                          state: Optional[str] = None, tenant_id: str = Depends(get_tenant)):
+    return export_response(_invoices_query(tenant_id, move_type, state), fmt, "invoices",
+                           AccountMove.created_at, descending=True)
 
 @accounting_router.post("/invoices", status_code=201)
 async def create_invoice(data: InvoiceCreate, tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
@@ -421,12 +441,17 @@ async def cancel_invoice(inv_id: str, tenant_id: str = Depends(get_tenant), db:
     return {"ok": True}
 
 @accounting_router.get("/payments")
-async def list_payments(page: int = 1, limit: int = 20,
+async def list_payments(page: int = 1, limit: int = 20, cursor: Optional[str] = None,
+                         total: TotalMode = TotalMode.EXACT,
                          tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
     q = select(Payment).where(Payment.tenant_id == tenant_id, Payment.is_deleted == False)
-    total = (await db.execute(select(func.count()).select_from(q.subquery()))).scalar()
-    items = (await db.execute(q.order_by(Payment.created_at.desc()).offset((page-1)*limit).limit(limit))).scalars().all()
-    return {"items": [row_to_dict(x) for x in items], "total": total}
+    return await _list_page(db, q, Payment.created_at, descending=True, page=page, limit=limit, cursor=cursor,
+                            tenant_id=tenant_id, total=total)
+
+@accounting_router.get("/payments/export")
+async def export_payments(fmt: ExportFormat = ExportFormat.NDJSON, tenant_id: str = Depends(get_tenant)):
+    q = select(Payment).where(Payment.tenant_id == tenant_id, Payment.is_deleted == False)
+    return export_response(q, fmt, "payments", Payment.created_at, descending=True)
 
 @accounting_router.post("/payments", status_code=201)
 async def create_payment(data: PaymentCreate, tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db),
@@ -454,54 +479,37 @@ async def post_payment_endpoint(pid: str, tenant_id: str = Depends(get_tenant),
 async def trial_balance(tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
     return await get_trial_balance(db, tenant_id)
 
-@accounting_router.get("/journal-entries")
-async def list_journal_entries(page: int = 1, limit: int = 20,
-                                tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
-    q = select(AccountMove).where(
+def _journal_entries_query(tenant_id: str):
+    return select(AccountMove).where(
         AccountMove.tenant_id == tenant_id,
         AccountMove.is_deleted == False,
         AccountMove.state == "posted"
     )
-    total = (await db.execute(select(func.count()).select_from(q.subquery()))).scalar()
-    items = (await db.execute(q.order_by(AccountMove.created_at.desc()).offset((page-1)*limit).limit(limit))).scalars().all()
-    return {"items": [row_to_dict(x) for x in items], "total": total}
+
+@accounting_router.get("/journal-entries")
+async def list_journal_entries(page: int = 1, limit: int = 20, cursor: Optional[str] = None,
+                                total: TotalMode = TotalMode.EXACT,
+                                tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
+    q = _journal_entries_query(tenant_id)
+    return await _list_page(db, q, AccountMove.created_at, descending=True, page=page, limit=limit, cursor=cursor,
+                            tenant_id=tenant_id, total=total)
+
+@accounting_router.get("/journal-entries/export")
+async def export_journal_entries(fmt: ExportFormat = ExportFormat.NDJSON, tenant_id: str = Depends(get_tenant)):
+    return export_response(_journal_entries_query(tenant_id), fmt, "journal-entries",
+                           AccountMove.created_at, descending=True)
 
 @accounting_router.get("/dashboard")
 async def accounting_dashboard(tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
-    total_ar = float((await db.execute(
-        select(func.coalesce(func.sum(AccountMove.amount_residual), 0))
-        .where(AccountMove.tenant_id == tenant_id, AccountMove.move_type == "out_invoice",
-               AccountMove.state == "posted", AccountMove.payment_state != "paid",
-               AccountMove.is_deleted == False)
-    )).scalar())
-    total_ap = float((await db.execute(
-        select(func.coalesce(func.sum(AccountMove.amount_residual), 0))
-        .where(AccountMove.tenant_id == tenant_id, AccountMove.move_type == "in_invoice",
-               AccountMove.state == "posted", AccountMove.payment_state != "paid",
-               AccountMove.is_deleted == False)
-    )).scalar())
-    total_revenue = float((await db.execute(
-        select(func.coalesce(func.sum(AccountMove.amount_total), 0))
-        .where(AccountMove.tenant_id == tenant_id, AccountMove.move_type == "out_invoice",
-               AccountMove.state == "posted", AccountMove.is_deleted == False)
-    )).scalar())
-    total_expenses = float((await db.execute(
-        select(func.coalesce(func.sum(AccountMove.amount_total), 0))
-        .where(AccountMove.tenant_id == tenant_id, AccountMove.move_type == "in_invoice",
-               AccountMove.state == "posted", AccountMove.is_deleted == False)
-    )).scalar())
-    inv_count = (await db.execute(
-        select(func.count()).where(AccountMove.tenant_id == tenant_id,
-                                    AccountMove.move_type.in_(["out_invoice","in_invoice"]),
-                                    AccountMove.is_deleted == False)
-    )).scalar()
+    k = await kpi_totals(db, tenant_id, "receivable", "payable", "revenue", "expenses")
+    am = (await table_stats(db, tenant_id, "account_move"))["account_move"]
     return {
-        "accounts_receivable": total_ar,
-        "accounts_payable": total_ap,
-        "total_revenue": total_revenue,
-        "total_expenses": total_expenses,
-        "net_income": total_revenue - total_expenses,
-        "invoice_count": inv_count,
+        "accounts_receivable": k["receivable"],
+        "accounts_payable": k["payable"],
+        "total_revenue": k["revenue"],
+        "total_expenses": k["expenses"],
+        "net_income": k["revenue"] - k["expenses"],
+        "invoice_count": am["invoices"],
     }
 
 
@@ -510,13 +518,13 @@ async def accounting_dashboard(tenant_id: str = Depends(get_tenant), db: AsyncSe
 # ═══════════════════════════════════════════════════════════════════
 
 @sales_router.get("/customers")
-async def list_customers(page: int = 1, limit: int = 20, search: Optional[str] = None,
+async def list_customers(page: int = 1, limit: int = 20, cursor: Optional[str] = None,
+                          total: TotalMode = TotalMode.EXACT, search: Optional[str] = None,
                           tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
     q = select(Customer).where(Customer.tenant_id == tenant_id, Customer.is_deleted == False)
     if search: q = q.where(Customer.name.ilike(f"%{search}%"))
-    total = (await db.execute(select(func.count()).select_from(q.subquery()))).scalar()
-    items = (await db.execute(q.order_by(Customer.name).offset((page-1)*limit).limit(limit))).scalars().all()
-    return {"items": [row_to_dict(x) for x in items], "total": total, "page": page}
+    return await _list_page(db, q, Customer.name, page=page, limit=limit, cursor=cursor,
+                            tenant_id=tenant_id, total=total)
 
 @sales_router.post("/customers", status_code=201)
 async def create_customer(data: CustomerCreate, tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
@@ -532,20 +540,28 @@ async def update_customer(cid: str, data: CustomerUpdate, tenant_id: str = Depen
     await db.commit(); return row_to_dict(c)
 
 @sales_router.get("/orders")
-async def list_orders(page: int = 1, limit: int = 20, state: Optional[str] = None,
+async def list_orders(page: int = 1, limit: int = 20, cursor: Optional[str] = None,
+                       total: TotalMode = TotalMode.EXACT, state: Optional[str] = None,
                        tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
     q = select(SaleOrder).where(SaleOrder.tenant_id == tenant_id, SaleOrder.is_deleted == False)
     if state: q = q.where(SaleOrder.state == state)
-    total = (await db.execute(select(func.count()).select_from(q.subquery()))).scalar()
-    items = (await db.execute(q.order_by(SaleOrder.created_at.desc()).offset((page-1)*limit).limit(limit))).scalars().all()
-    return {"items": [row_to_dict(x) for x in items], "total": total, "page": page}
+    return await _list_page(db, q, SaleOrder.created_at, descending=True, page=page, limit=limit, cursor=cursor,
+                            tenant_id=tenant_id, total=total)
+
+@sales_router.get("/orders/export")
+async def export_orders(fmt: ExportFormat = ExportFormat.NDJSON, state: Optional[str] = None,
+                        tenant_id: str = Depends(get_tenant)):
+    q = select(SaleOrder).where(SaleOrder.tenant_id == tenant_id, SaleOrder.is_deleted == False)
+    if state: q = q.where(SaleOrder.state == state)
+    return export_response(q, fmt, "sale-orders", SaleOrder.created_at, descending=True)
 
 @sales_router.post("/orders", status_code=201)
 async def create_order(data: SaleOrderCreate, tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db),
                        _p: User = Depends(require_permission("sales.orders.create"))):
     import uuid
     o = SaleOrder(**data.model_dump(exclude_none=True), tenant_id=tenant_id)
-    o.number = f"SO-{datetime.now().year}-{str((await db.execute(select(func.count()).where(SaleOrder.tenant_id == tenant_id))).scalar() + 1).zfill(4)}"
+    o.number = await next_number(db, tenant_id, "SO",
+                                 seed=select(func.count()).where(SaleOrder.tenant_id == tenant_id))
     db.add(o); await db.commit(); await db.refresh(o)
     return row_to_dict(o)
 
@@ -647,13 +663,13 @@ async def cancel_order(oid: str, tenant_id: str = Depends(get_tenant), db: Async
     return {"ok": True}
 
 @sales_router.get("/leads")
-async def list_leads(page: int = 1, limit: int = 20, state: Optional[str] = None,
+async def list_leads(page: int = 1, limit: int = 20, cursor: Optional[str] = None,
+                      total: TotalMode = TotalMode.EXACT, state: Optional[str] = None,
                       tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
     q = select(Lead).where(Lead.tenant_id == tenant_id, Lead.is_deleted == False)
     if state: q = q.where(Lead.state == state)
-    total = (await db.execute(select(func.count()).select_from(q.subquery()))).scalar()
-    items = (await db.execute(q.order_by(Lead.created_at.desc()).offset((page-1)*limit).limit(limit))).scalars().all()
-    return {"items": [row_to_dict(x) for x in items], "total": total, "page": page}
+    return await _list_page(db, q, Lead.created_at, descending=True, page=page, limit=limit, cursor=cursor,
+                            tenant_id=tenant_id, total=total)
 
 @sales_router.post("/leads", status_code=201)
 async def create_lead(data: LeadCreate, tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
@@ -670,11 +686,10 @@ async def update_lead(lid: str, data: LeadUpdate, tenant_id: str = Depends(get_t
 
 @sales_router.get("/dashboard")
 async def sales_dashboard(tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
-    total_orders = (await db.execute(select(func.count()).where(SaleOrder.tenant_id == tenant_id, SaleOrder.is_deleted == False))).scalar()
-    confirmed = (await db.execute(select(func.count()).where(SaleOrder.tenant_id == tenant_id, SaleOrder.state == "confirmed", SaleOrder.is_deleted == False))).scalar()
-    revenue = float((await db.execute(select(func.coalesce(func.sum(SaleOrder.total), 0)).where(SaleOrder.tenant_id == tenant_id, SaleOrder.state.in_(["confirmed","done"]), SaleOrder.is_deleted == False))).scalar())
-    pipeline = float((await db.execute(select(func.coalesce(func.sum(Lead.expected_revenue), 0)).where(Lead.tenant_id == tenant_id, Lead.state.not_in(["won","lost"]), Lead.is_deleted == False))).scalar())
-    return {"total_orders": total_orders, "confirmed_orders": confirmed, "revenue": revenue, "pipeline_value": pipeline}
+    so = (await table_stats(db, tenant_id, "sale_order"))["sale_order"]
+    k = await kpi_totals(db, tenant_id, "sales_revenue", "pipeline")
+    return {"total_orders": so["orders"], "confirmed_orders": so["confirmed"], "revenue": k["sales_revenue"],
+            "pipeline_value": k["pipeline"]}
 
 
 # ═══════════════════════════════════════════════════════════════════
@@ -682,13 +697,13 @@ async def sales_dashboard(tenant_id: str = Depends(get_tenant), db: AsyncSession
 # ═══════════════════════════════════════════════════════════════════
 
 @purchasing_router.get("/suppliers")
-async def list_suppliers(page: int = 1, limit: int = 20, search: Optional[str] = None,
+async def list_suppliers(page: int = 1, limit: int = 20, cursor: Optional[str] = None,
+                          total: TotalMode = TotalMode.EXACT, search: Optional[str] = None,
                           tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
     q = select(Supplier).where(Supplier.tenant_id == tenant_id, Supplier.is_deleted == False)
     if search: q = q.where(Supplier.name.ilike(f"%{search}%"))
-    total = (await db.execute(select(func.count()).select_from(q.subquery()))).scalar()
-    items = (await db.execute(q.order_by(Supplier.name).offset((page-1)*limit).limit(limit))).scalars().all()
-    return {"items": [row_to_dict(x) for x in items], "total": total, "page": page}
+    return await _list_page(db, q, Supplier.name, page=page, limit=limit, cursor=cursor,
+                            tenant_id=tenant_id, total=total)
 
 @purchasing_router.post("/suppliers", status_code=201)
 async def create_supplier(data: SupplierCreate, tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
@@ -704,19 +719,26 @@ async def update_supplier(sid: str, data: SupplierUpdate, tenant_id: str = Depen
     await db.commit(); return row_to_dict(s)
 
 @purchasing_router.get("/orders")
-async def list_po(page: int = 1, limit: int = 20, state: Optional[str] = None,
+async def list_po(page: int = 1, limit: int = 20, cursor: Optional[str] = None,
+                   total: TotalMode = TotalMode.EXACT, state: Optional[str] = None,
                    tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
     q = select(PurchaseOrder).where(PurchaseOrder.tenant_id == tenant_id, PurchaseOrder.is_deleted == False)
     if state: q = q.where(PurchaseOrder.state == state)
-    total = (await db.execute(select(func.count()).select_from(q.subquery()))).scalar()
-    items = (await db.execute(q.order_by(PurchaseOrder.created_at.desc()).offset((page-1)*limit).limit(limit))).scalars().all()
-    return {"items": [row_to_dict(x) for x in items], "total": total, "page": page}
+    return await _list_page(db, q, PurchaseOrder.created_at, descending=True, page=page, limit=limit, cursor=cursor,
+                            tenant_id=tenant_id, total=total)
+
+@purchasing_router.get("/orders/export")
+async def export_po(fmt: ExportFormat = ExportFormat.NDJSON, state: Optional[str] = None,
+                    tenant_id: str = Depends(get_tenant)):
+    q = select(PurchaseOrder).where(PurchaseOrder.tenant_id == tenant_id, PurchaseOrder.is_deleted == False)
+    if state: q = q.where(PurchaseOrder.state == state)
+    return export_response(q, fmt, "purchase-orders", PurchaseOrder.created_at, descending=True)
 
 @purchasing_router.post("/orders", status_code=201)
 async def create_po(data: PurchaseOrderCreate, tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
     po = PurchaseOrder(**data.model_dump(exclude_none=True), tenant_id=tenant_id)
-    count = (await db.execute(select(func.count()).where(PurchaseOrder.tenant_id == tenant_id))).scalar()
-    po.number = f"PO-{datetime.now().year}-{str(count + 1).zfill(4)}"
+    po.number = await next_number(db, tenant_id, "PO",
+                                  seed=select(func.count()).where(PurchaseOrder.tenant_id == tenant_id))
     db.add(po); await db.commit(); await db.refresh(po)
     return row_to_dict(po)
 
@@ -774,10 +796,9 @@ async def create_bill(oid: str, tenant_id: str = Depends(get_tenant), db: AsyncS
 
 @purchasing_router.get("/dashboard")
 async def purchasing_dashboard(tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
-    total = (await db.execute(select(func.count()).where(PurchaseOrder.tenant_id == tenant_id, PurchaseOrder.is_deleted == False))).scalar()
-    pending = (await db.execute(select(func.count()).where(PurchaseOrder.tenant_id == tenant_id, PurchaseOrder.state.in_(["draft","sent"]), PurchaseOrder.is_deleted == False))).scalar()
-    total_spend = float((await db.execute(select(func.coalesce(func.sum(PurchaseOrder.total), 0)).where(PurchaseOrder.tenant_id == tenant_id, PurchaseOrder.state.in_(["confirmed","received","billed"]), PurchaseOrder.is_deleted == False))).scalar())
-    return {"total_orders": total, "pending_orders": pending, "total_spend": total_spend}
+    po = (await table_stats(db, tenant_id, "purchase_order"))["purchase_order"]
+    k = await kpi_totals(db, tenant_id, "po_spend")
+    return {"total_orders": po["orders"], "pending_orders": po["pending"], "total_spend": k["po_spend"]}
 
 
 # ═══════════════════════════════════════════════════════════════════
@@ -785,13 +806,13 @@ async def purchasing_dashboard(tenant_id: str = Depends(get_tenant), db: AsyncSe
 # ═══════════════════════════════════════════════════════════════════
 
 @inventory_router.get("/products")
-async def list_products(page: int = 1, limit: int = 20, search: Optional[str] = None,
+async def list_products(page: int = 1, limit: int = 20, cursor: Optional[str] = None,
+                         total: TotalMode = TotalMode.EXACT, search: Optional[str] = None,
                          tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
     q = select(Product).where(Product.tenant_id == tenant_id, Product.is_deleted == False)
     if search: q = q.where(Product.name.ilike(f"%{search}%"))
-    total = (await db.execute(select(func.count()).select_from(q.subquery()))).scalar()
-    items = (await db.execute(q.order_by(Product.name).offset((page-1)*limit).limit(limit))).scalars().all()
-    return {"items": [row_to_dict(x) for x in items], "total": total, "page": page}
+    return await _list_page(db, q, Product.name, page=page, limit=limit, cursor=cursor,
+                            tenant_id=tenant_id, total=total)
 
 @inventory_router.post("/products", status_code=201)
 async def create_product(data: ProductCreate, tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
@@ -824,13 +845,20 @@ async def stock_on_hand(tenant_id: str = Depends(get_tenant), db: AsyncSession =
     return await get_stock_on_hand(db, tenant_id)
 
 @inventory_router.get("/movements")
-async def list_moves(page: int = 1, limit: int = 20, move_type: Optional[str] = None,
+async def list_moves(page: int = 1, limit: int = 20, cursor: Optional[str] = None,
+                      total: TotalMode = TotalMode.EXACT, move_type: Optional[str] = None,
                       tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
     q = select(StockMove).where(StockMove.tenant_id == tenant_id, StockMove.is_deleted == False)
     if move_type: q = q.where(StockMove.move_type == move_type)
-    total = (await db.execute(select(func.count()).select_from(q.subquery()))).scalar()
-    items = (await db.execute(q.order_by(StockMove.created_at.desc()).offset((page-1)*limit).limit(limit))).scalars().all()
-    return {"items": [row_to_dict(x) for x in items], "total": total}
+    return await _list_page(db, q, StockMove.created_at, descending=True, page=page, limit=limit, cursor=cursor,
+                            tenant_id=tenant_id, total=total)
+
+@inventory_router.get("/movements/export")
+async def export_moves(fmt: ExportFormat = ExportFormat.NDJSON, move_type: Optional[str] = None,
+                       tenant_id: str = Depends(get_tenant)):
+    q = select(StockMove).where(StockMove.tenant_id == tenant_id, StockMove.is_deleted == False)
+    if move_type: q = q.where(StockMove.move_type == move_type)
+    return export_response(q, fmt, "stock-moves", StockMove.created_at, descending=True)
 
 @inventory_router.post("/movements", status_code=201)
 async def create_move(data: StockMoveCreate, tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db),
@@ -856,14 +884,22 @@ async def create_move(data: StockMoveCreate, tenant_id: str = Depends(get_tenant
     return row_to_dict(m)
 
 @inventory_router.get("/pickings")
-async def list_pickings(page: int = 1, limit: int = 20, picking_type: Optional[str] = None, state: Optional[str] = None,
+async def list_pickings(page: int = 1, limit: int = 20, cursor: Optional[str] = None,
+                         total: TotalMode = TotalMode.EXACT, picking_type: Optional[str] = None, state: Optional[str] = None,
                          tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
     q = select(StockPicking).where(StockPicking.tenant_id == tenant_id, StockPicking.is_deleted == False)
     if picking_type: q = q.where(StockPicking.picking_type == picking_type)
     if state: q = q.where(StockPicking.state == state)
-    total = (await db.execute(select(func.count()).select_from(q.subquery()))).scalar()
-    items = (await db.execute(q.order_by(StockPicking.created_at.desc()).offset((page-1)*limit).limit(limit))).scalars().all()
-    return {"items": [row_to_dict(x) for x in items], "total": total}
+    return await _list_page(db, q, StockPicking.created_at, descending=True, page=page, limit=limit, cursor=cursor,
+                            tenant_id=tenant_id, total=total)
+
+@inventory_router.get("/pickings/export")
+async def export_pickings(fmt: ExportFormat = ExportFormat.NDJSON, picking_type: Optional[str] = None,
+                          state: Optional[str] = None, tenant_id: str = Depends(get_tenant)):
+    q = select(StockPicking).where(StockPicking.tenant_id == tenant_id, StockPicking.is_deleted == False)
+    if picking_type: q = q.where(StockPicking.picking_type == picking_type)
+    if state: q = q.where(StockPicking.state == state)
+    return export_response(q, fmt, "pickings", StockPicking.created_at, descending=True)
 
 @inventory_router.post("/pickings/{pid}/validate")
 async def validate_picking_endpoint(pid: str, tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db),
@@ -884,20 +920,11 @@ async def list_warehouses(tenant_id: str = Depends(get_tenant), db: AsyncSession
 
 @inventory_router.get("/dashboard")
 async def inventory_dashboard(tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
-    product_count = (await db.execute(select(func.count()).where(Product.tenant_id == tenant_id, Product.is_deleted == False))).scalar()
-    low_stock = (await db.execute(select(func.count()).where(
-        Product.tenant_id == tenant_id, Product.qty_on_hand <= Product.reorder_point,
-        Product.reorder_point > 0, Product.is_deleted == False))).scalar()
-    total_value = float((await db.execute(
-        select(func.coalesce(func.sum(Product.qty_on_hand * Product.cost_price), 0))
-        .where(Product.tenant_id == tenant_id, Product.is_deleted == False)
-    )).scalar())
-    pending_receipts = (await db.execute(select(func.count()).where(
-        StockPicking.tenant_id == tenant_id, StockPicking.picking_type == "incoming",
-        StockPicking.state.in_(["confirmed", "assigned"]), StockPicking.is_deleted == False
-    ))).scalar()
-    return {"product_count": product_count, "low_stock_count": low_stock,
-            "total_inventory_value": total_value, "pending_receipts": pending_receipts}
+    s = await table_stats(db, tenant_id, "product", "stock_picking")
+    p = s["product"]
+    k = await kpi_totals(db, tenant_id, "stock_value")
+    return {"product_count": p["products"], "low_stock_count": p["low_stock"],
+            "total_inventory_value": k["stock_value"], "pending_receipts": s["stock_picking"]["pending_receipts"]}
 
 
 # ═══════════════════════════════════════════════════════════════════
@@ -916,20 +943,20 @@ async def create_department(data: DepartmentCreate, tenant_id: str = Depends(get
     return row_to_dict(d)
 
 @hr_router.get("/employees")
-async def list_employees(page: int = 1, limit: int = 20, search: Optional[str] = None,
+async def list_employees(page: int = 1, limit: int = 20, cursor: Optional[str] = None,
+                          total: TotalMode = TotalMode.EXACT, search: Optional[str] = None,
                           tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
     q = select(Employee).where(Employee.tenant_id == tenant_id, Employee.is_deleted == False)
     if search: q = q.where(Employee.first_name.ilike(f"%{search}%") | Employee.last_name.ilike(f"%{search}%"))
-    total = (await db.execute(select(func.count()).select_from(q.subquery()))).scalar()
-    items = (await db.execute(q.order_by(Employee.first_name).offset((page-1)*limit).limit(limit))).scalars().all()
-    return {"items": [row_to_dict(x) for x in items], "total": total, "page": page}
+    return await _list_page(db, q, Employee.first_name, page=page, limit=limit, cursor=cursor,
+                            tenant_id=tenant_id, total=total)
 
 @hr_router.post("/employees", status_code=201)
 async def create_employee(data: EmployeeCreate, tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db),
                           _p: User = Depends(require_permission("hr.employees.create"))):
-    count = (await db.execute(select(func.count()).where(Employee.tenant_id == tenant_id))).scalar()
     e = Employee(**data.model_dump(exclude_none=True), tenant_id=tenant_id)
-    e.employee_number = f"EMP-{str(count + 1).zfill(4)}"
+    e.employee_number = await next_number(db, tenant_id, "EMP",
+                                          seed=select(func.count()).where(Employee.tenant_id == tenant_id))
     db.add(e); await db.commit(); await db.refresh(e)
     return row_to_dict(e)
 
@@ -941,13 +968,13 @@ async def update_employee(eid: str, data: EmployeeUpdate, tenant_id: str = Depen
     await db.commit(); return row_to_dict(e)
 
 @hr_router.get("/leaves")
-async def list_leaves(page: int = 1, limit: int = 20, state: Optional[str] = None,
+async def list_leaves(page: int = 1, limit: int = 20, cursor: Optional[str] = None,
+                       total: TotalMode = TotalMode.EXACT, state: Optional[str] = None,
                        tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
     q = select(LeaveRequest).where(LeaveRequest.tenant_id == tenant_id, LeaveRequest.is_deleted == False)
     if state: q = q.where(LeaveRequest.state == state)
-    total = (await db.execute(select(func.count()).select_from(q.subquery()))).scalar()
-    items = (await db.execute(q.order_by(LeaveRequest.created_at.desc()).offset((page-1)*limit).limit(limit))).scalars().all()
-    return {"items": [row_to_dict(x) for x in items], "total": total}
+    return await _list_page(db, q, LeaveRequest.created_at, descending=True, page=page, limit=limit, cursor=cursor,
+                            tenant_id=tenant_id, total=total)
 
 @hr_router.post("/leaves", status_code=201)
 async def create_leave(data: dict, tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
@@ -962,21 +989,19 @@ async def transition_leave(lid: str, data: dict, tenant_id: str = Depends(get_te
     await db.commit(); return row_to_dict(leave)
 
 @hr_router.get("/payslips")
-async def list_payslips(page: int = 1, limit: int = 20,
+async def list_payslips(page: int = 1, limit: int = 20, cursor: Optional[str] = None,
+                         total: TotalMode = TotalMode.EXACT,
                          tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
     q = select(Payslip).where(Payslip.tenant_id == tenant_id, Payslip.is_deleted == False)
-    total = (await db.execute(select(func.count()).select_from(q.subquery()))).scalar()
-    items = (await db.execute(q.order_by(Payslip.created_at.desc()).offset((page-1)*limit).limit(limit))).scalars().all()
-    return {"items": [row_to_dict(x) for x in items], "total": total}
+    return await _list_page(db, q, Payslip.created_at, descending=True, page=page, limit=limit, cursor=cursor,
+                            tenant_id=tenant_id, total=total)
 
 @hr_router.get("/dashboard")
 async def hr_dashboard(tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
-    total_emp = (await db.execute(select(func.count()).where(Employee.tenant_id == tenant_id, Employee.is_deleted == False))).scalar()
-    active_emp = (await db.execute(select(func.count()).where(Employee.tenant_id == tenant_id, Employee.status == "active", Employee.is_deleted == False))).scalar()
-    pending_leaves = (await db.execute(select(func.count()).where(LeaveRequest.tenant_id == tenant_id, LeaveRequest.state == "pending", LeaveRequest.is_deleted == False))).scalar()
-    payroll = float((await db.execute(select(func.coalesce(func.sum(Employee.salary), 0)).where(Employee.tenant_id == tenant_id, Employee.status == "active", Employee.is_deleted == False))).scalar())
-    return {"total_employees": total_emp, "active_employees": active_emp,
-            "pending_leaves": pending_leaves, "monthly_payroll": payroll}
+    s = await table_stats(db, tenant_id, "employee", "leave_request")
+    emp = s["employee"]
+    return {"total_employees": emp["employees"], "active_employees": emp["active"],
+            "pending_leaves": s["leave_request"]["pending"], "monthly_payroll": emp["payroll"]}
 
 
 # ═══════════════════════════════════════════════════════════════════
@@ -984,12 +1009,12 @@ async def hr_dashboard(tenant_id: str = Depends(get_tenant), db: AsyncSession =
 # ═══════════════════════════════════════════════════════════════════
 
 @manufacturing_router.get("/boms")
-async def list_boms(page: int = 1, limit: int = 20,
+async def list_boms(page: int = 1, limit: int = 20, cursor: Optional[str] = None,
+                     total: TotalMode = TotalMode.EXACT,
                      tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
     q = select(BOM).where(BOM.tenant_id == tenant_id, BOM.is_deleted == False)
-    total = (await db.execute(select(func.count()).select_from(q.subquery()))).scalar()
-    items = (await db.execute(q.order_by(BOM.product_name).offset((page-1)*limit).limit(limit))).scalars().all()
-    return {"items": [row_to_dict(x) for x in items], "total": total}
+    return await _list_page(db, q, BOM.product_name, page=page, limit=limit, cursor=cursor,
+                            tenant_id=tenant_id, total=total)
 
 @manufacturing_router.post("/boms", status_code=201)
 async def create_bom(data: BOMCreate, tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
@@ -1013,19 +1038,19 @@ async def add_bom_line(bid: str, data: BOMLineCreate, tenant_id: str = Depends(g
     return row_to_dict(line)
 
 @manufacturing_router.get("/orders")
-async def list_production(page: int = 1, limit: int = 20, state: Optional[str] = None,
+async def list_production(page: int = 1, limit: int = 20, cursor: Optional[str] = None,
+                           total: TotalMode = TotalMode.EXACT, state: Optional[str] = None,
                            tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
     q = select(ProductionOrder).where(ProductionOrder.tenant_id == tenant_id, ProductionOrder.is_deleted == False)
     if state: q = q.where(ProductionOrder.state == state)
-    total = (await db.execute(select(func.count()).select_from(q.subquery()))).scalar()
-    items = (await db.execute(q.order_by(ProductionOrder.created_at.desc()).offset((page-1)*limit).limit(limit))).scalars().all()
-    return {"items": [row_to_dict(x) for x in items], "total": total, "page": page}
+    return await _list_page(db, q, ProductionOrder.created_at, descending=True, page=page, limit=limit, cursor=cursor,
+                            tenant_id=tenant_id, total=total)
 
 @manufacturing_router.post("/orders", status_code=201)
 async def create_production(data: ProductionOrderCreate, tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
-    count = (await db.execute(select(func.count()).where(ProductionOrder.tenant_id == tenant_id))).scalar()
     po = ProductionOrder(**data.model_dump(exclude_none=True), tenant_id=tenant_id)
-    po.number = f"MO-{datetime.now().year}-{str(count + 1).zfill(4)}"
+    po.number = await next_number(db, tenant_id, "MO",
+                                  seed=select(func.count()).where(ProductionOrder.tenant_id == tenant_id))
     db.add(po); await db.commit(); await db.refresh(po)
     return row_to_dict(po)
 
@@ -1065,10 +1090,8 @@ async def produce(oid: str, qty: Optional[float] = None,
 
 @manufacturing_router.get("/dashboard")
 async def mfg_dashboard(tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
-    total = (await db.execute(select(func.count()).where(ProductionOrder.tenant_id == tenant_id, ProductionOrder.is_deleted == False))).scalar()
-    in_progress = (await db.execute(select(func.count()).where(ProductionOrder.tenant_id == tenant_id, ProductionOrder.state.in_(["confirmed","in_progress"]), ProductionOrder.is_deleted == False))).scalar()
-    done = (await db.execute(select(func.count()).where(ProductionOrder.tenant_id == tenant_id, ProductionOrder.state == "done", ProductionOrder.is_deleted == False))).scalar()
-    return {"total_orders": total, "in_progress": in_progress, "done": done}
+    mo = (await table_stats(db, tenant_id, "production_order"))["production_order"]
+    return {"total_orders": mo["orders"], "in_progress": mo["in_progress"], "done": mo["done"]}
 
 
 # ═══════════════════════════════════════════════════════════════════
@@ -1076,12 +1099,12 @@ async def mfg_dashboard(tenant_id: str = Depends(get_tenant), db: AsyncSession =
 # ═══════════════════════════════════════════════════════════════════
 
 @crm_router.get("/activities")
-async def list_activities(page: int = 1, limit: int = 20,
+async def list_activities(page: int = 1, limit: int = 20, cursor: Optional[str] = None,
+                           total: TotalMode = TotalMode.EXACT,
                            tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
     q = select(Activity).where(Activity.tenant_id == tenant_id, Activity.is_deleted == False)
-    total = (await db.execute(select(func.count()).select_from(q.subquery()))).scalar()
-    items = (await db.execute(q.order_by(Activity.created_at.desc()).offset((page-1)*limit).limit(limit))).scalars().all()
-    return {"items": [row_to_dict(x) for x in items], "total": total}
+    return await _list_page(db, q, Activity.created_at, descending=True, page=page, limit=limit, cursor=cursor,
+                            tenant_id=tenant_id, total=total)
 
 
 # ═══════════════════════════════════════════════════════════════════
@@ -1089,13 +1112,13 @@ async def list_activities(page: int = 1, limit: int = 20,
 # ═══════════════════════════════════════════════════════════════════
 
 @projects_router.get("/projects")
-async def list_projects(page: int = 1, limit: int = 20, state: Optional[str] = None,
+async def list_projects(page: int = 1, limit: int = 20, cursor: Optional[str] = None,
+                         total: TotalMode = TotalMode.EXACT, state: Optional[str] = None,
                          tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
     q = select(Project).where(Project.tenant_id == tenant_id, Project.is_deleted == False)
     if state: q = q.where(Project.state == state)
-    total = (await db.execute(select(func.count()).select_from(q.subquery()))).scalar()
-    items = (await db.execute(q.order_by(Project.created_at.desc()).offset((page-1)*limit).limit(limit))).scalars().all()
-    return {"items": [row_to_dict(x) for x in items], "total": total, "page": page}
+    return await _list_page(db, q, Project.created_at, descending=True, page=page, limit=limit, cursor=cursor,
+                            tenant_id=tenant_id, total=total)
 
 @projects_router.post("/projects", status_code=201)
 async def create_project(data: ProjectCreate, tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
@@ -1111,13 +1134,13 @@ async def update_project(pid: str, data: ProjectUpdate, tenant_id: str = Depends
     await db.commit(); return row_to_dict(p)
 
 @projects_router.get("/tasks")
-async def list_tasks(project_id: Optional[str] = None, page: int = 1, limit: int = 20,
+async def list_tasks(project_id: Optional[str] = None, page: int = 1, limit: int = 20, cursor: Optional[str] = None,
+                      total: TotalMode = TotalMode.EXACT,
                       tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
     q = select(Task).where(Task.tenant_id == tenant_id, Task.is_deleted == False)
     if project_id: q = q.where(Task.project_id == project_id)
-    total = (await db.execute(select(func.count()).select_from(q.subquery()))).scalar()
-    items = (await db.execute(q.order_by(Task.created_at.desc()).offset((page-1)*limit).limit(limit))).scalars().all()
-    return {"items": [row_to_dict(x) for x in items], "total": total}
+    return await _list_page(db, q, Task.created_at, descending=True, page=page, limit=limit, cursor=cursor,
+                            tenant_id=tenant_id, total=total)
 
 @projects_router.post("/tasks", status_code=201)
 async def create_task(data: TaskCreate, tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
@@ -1134,10 +1157,9 @@ async def update_task(tid: str, data: TaskUpdate, tenant_id: str = Depends(get_t
 
 @projects_router.get("/dashboard")
 async def projects_dashboard(tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
-    total = (await db.execute(select(func.count()).where(Project.tenant_id == tenant_id, Project.is_deleted == False))).scalar()
-    active = (await db.execute(select(func.count()).where(Project.tenant_id == tenant_id, Project.state == "active", Project.is_deleted == False))).scalar()
-    tasks_open = (await db.execute(select(func.count()).where(Task.tenant_id == tenant_id, Task.state.in_(["new","in_progress"]), Task.is_deleted == False))).scalar()
-    return {"total_projects": total, "active_projects": active, "open_tasks": tasks_open}
+    s = await table_stats(db, tenant_id, "project", "task")
+    return {"total_projects": s["project"]["projects"], "active_projects": s["project"]["active"],
+            "open_tasks": s["task"]["open"]}
 
 
 # ═══════════════════════════════════════════════════════════════════
@@ -1145,21 +1167,21 @@ async def projects_dashboard(tenant_id: str = Depends(get_tenant), db: AsyncSess
 # ═══════════════════════════════════════════════════════════════════
 
 @helpdesk_router.get("/tickets")
-async def list_tickets(page: int = 1, limit: int = 20, state: Optional[str] = None,
+async def list_tickets(page: int = 1, limit: int = 20, cursor: Optional[str] = None,
+                        total: TotalMode = TotalMode.EXACT, state: Optional[str] = None,
                         priority: Optional[str] = None,
                         tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
     q = select(HelpdeskTicket).where(HelpdeskTicket.tenant_id == tenant_id, HelpdeskTicket.is_deleted == False)
     if state: q = q.where(HelpdeskTicket.state == state)
     if priority: q = q.where(HelpdeskTicket.priority == priority)
-    total = (await db.execute(select(func.count()).select_from(q.subquery()))).scalar()
-    items = (await db.execute(q.order_by(HelpdeskTicket.created_at.desc()).offset((page-1)*limit).limit(limit))).scalars().all()
-    return {"items": [row_to_dict(x) for x in items], "total": total, "page": page}
+    return await _list_page(db, q, HelpdeskTicket.created_at, descending=True, page=page, limit=limit, cursor=cursor,
+                            tenant_id=tenant_id, total=total)
 
 @helpdesk_router.post("/tickets", status_code=201)
 async def create_ticket(data: TicketCreate, tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
-    count = (await db.execute(select(func.count()).where(HelpdeskTicket.tenant_id == tenant_id))).scalar()
     t = HelpdeskTicket(**data.model_dump(exclude_none=True), tenant_id=tenant_id)
-    t.number = f"TKT-{datetime.now().year}-{str(count + 1).zfill(4)}"
+    t.number = await next_number(db, tenant_id, "TKT",
+                                 seed=select(func.count()).where(HelpdeskTicket.tenant_id == tenant_id))
     db.add(t); await db.commit(); await db.refresh(t)
     return row_to_dict(t)
 
@@ -1205,7 +1227,6 @@ async def add_ticket_reply(tid: str, data: TicketReplyCreate, user: User = Depen
 
 @helpdesk_router.get("/dashboard")
 async def helpdesk_dashboard(tenant_id: str = Depends(get_tenant), db: AsyncSession = Depends(get_db)):
-    total = (await db.execute(select(func.count()).where(HelpdeskTicket.tenant_id == tenant_id, HelpdeskTicket.is_deleted == False))).scalar()
-    open_ = (await db.execute(select(func.count()).where(HelpdeskTicket.tenant_id == tenant_id, HelpdeskTicket.state.in_(["new","open"]), HelpdeskTicket.is_deleted == False))).scalar()
-    urgent = (await db.execute(select(func.count()).where(HelpdeskTicket.tenant_id == tenant_id, HelpdeskTicket.priority == "urgent", HelpdeskTicket.is_deleted == False))).scalar()
-    return {"total_tickets": total, "open_tickets": open_, "urgent_tickets": urgent}
+    tk = (await table_stats(db, tenant_id, "helpdesk_ticket"))["helpdesk_ticket"]
+    k = await kpi_totals(db, tenant_id, "open_tickets")
+    return {"total_tickets": tk["tickets"], "open_tickets": int(k["open_tickets"]), "urgent_tickets": tk["urgent"]}
@@ -11,6 +11,7 @@ from datetime import datetime, timezone
 
 from app.core.database import get_db
 from app.core.deps import require_auth
+from app.core.serialization import to_dict as _row
 from app.modules.identity.models import User
 from app.modules.identity.permissions import require_permission
 from app.modules.order_tracking.models import (
@@ -25,17 +26,6 @@ router = APIRouter(tags=["Order Tracking"])
 
 # ─── Helpers ──────────────────────────────────────────────────────────────────
 
-def _row(obj) -> dict:
-    """Convert SQLAlchemy row to dict, serialising dates."""
-    d = {}
-    for c in obj.__table__.columns:
-        v = getattr(obj, c.name)
-        if hasattr(v, "isoformat"):
-            v = v.isoformat()
-        d[c.name] = v
-    return d
-
-
 def _tenant_filter(model, tenant_id: str):
     """
     Standard tenant + soft-delete filter for OTBase tables.
@@ -12,6 +12,8 @@ import io
 
 from app.core.database import get_db
 from app.core.deps import require_auth
+from app.core.serialization import to_dict as row_to_dict
+from app.core.export import ExportFormat, export_response
 from app.modules.identity.models import User
 from app.modules.identity.permissions import require_permission
 from app.modules.payroll.models import PayrollEntry, PayrollBatch, EmployeeAdvance, EndOfServiceCalculation
@@ -21,21 +23,6 @@ from app.modules.payroll.service import compute_payroll, compute_end_of_service
 router = APIRouter(prefix="/payroll", tags=["Payroll"])
 
 
-def row_to_dict(obj) -> dict:
-    d = {}
-    for c in obj.__table__.columns:
-        v = getattr(obj, c.name)
-        if hasattr(v, "isoformat"):
-            v = v.isoformat()
-        elif hasattr(v, "__float__"):
-            try:
-                v = float(v)
-            except Exception:
-                pass
-        d[c.name] = v
-    return d
-
-
 # ─── Schemas ──────────────────────────────────────────────────────
 
 class PayrollEntryCreate(Schema):
@@ -90,6 +77,20 @@ class EndServiceCreate(Schema):
 
 # ─── Payroll Entries ──────────────────────────────────────────────
 
+def _entries_query(tenant_id: str, year: Optional[int], month: Optional[int],
+                   employee_id: Optional[str], state: Optional[str]):
+    q = select(PayrollEntry).where(PayrollEntry.is_deleted == False, PayrollEntry.tenant_id == tenant_id)
+    if year:
+        q = q.where(PayrollEntry.period_year == year)
+    if month:
+        q = q.where(PayrollEntry.period_month == month)
+    if employee_id:
+        q = q.where(PayrollEntry.employee_id == employee_id)
+    if state:
+        q = q.where(PayrollEntry.state == state)
+    return q
+
+
 @router.get("/entries")
 async def list_entries(
     year: Optional[int] = None,
@@ -101,20 +102,27 @@ async def list_entries(
     db: AsyncSession = Depends(get_db),
     user: User = Depends(require_auth),
 ):
-    q = select(PayrollEntry).where(PayrollEntry.is_deleted == False, PayrollEntry.tenant_id == user.tenant_id)
-    if year:
-        q = q.where(PayrollEntry.period_year == year)
-    if month:
-        q = q.where(PayrollEntry.period_month == month)
-    if employee_id:
-        q = q.where(PayrollEntry.employee_id == employee_id)
-    if state:
-        q = q.where(PayrollEntry.state == state)
+    q = _entries_query(user.tenant_id, year, month, employee_id, state)
     q = q.order_by(PayrollEntry.period_year.desc(), PayrollEntry.period_month.desc()).offset(offset).limit(limit)
     result = await db.execute(q)
     return {"entries": [row_to_dict(r) for r in result.scalars().all()]}
 
 
+@router.get("/entries/export")
+async def export_entries(
+    fmt: ExportFormat = ExportFormat.NDJSON,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    employee_id: Optional[str] = None,
+    state: Optional[str] = None,
+    user: User = Depends(require_auth),
+):
+    """Stream every matching entry (same filters as /entries, no limit) as NDJSON or CSV."""
+    q = _entries_query(user.tenant_id, year, month, employee_id, state)
+    return export_response(q, fmt, "payroll-entries", PayrollEntry.period_year, PayrollEntry.period_month,
+                           descending=True)
+
+
 @router.post("/entries")
 async def create_entry(
     data: PayrollEntryCreate,
@@ -0,0 +1,49 @@
+"""
+CI ERP — Profiling API
+Collapsed-stack profiles of individual requests (sent with X-Profile: 1 by a
+superadmin, stored by trace id) and continuous-mode hot stacks per route.
+Collapsed output feeds straight into flamegraph.pl or speedscope.
+"""
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from app.core.deps import require_superadmin
+from app.core.config import settings
+from app.core.observability import PROCESS_ID
+from app.core.profiler import MAX_HOT_STACKS, collapsed, get_hot_stacks, get_profile
+from app.modules.identity.models import User
+
+router = APIRouter(prefix="/profiles", tags=["Profiling"])
+
+
+@router.get("/hot")
+async def hot_stacks(
+    route: Optional[str] = Query(None, description='Route key, e.g. "GET /api/v1/sales/orders/{oid}"'),
+    limit: int = Query(20, ge=1, le=500),
+    format: str = Query("json", pattern="^(json|collapsed)$"),
+    user: User = Depends(require_superadmin),
+):
+    """Hottest sampled stacks per route in this process (needs PROFILE_CONTINUOUS); collapsed gives all of one route's."""
+    routes = get_hot_stacks(route, MAX_HOT_STACKS if format == "collapsed" else limit)
+    if format == "collapsed":
+        if not route:
+            raise HTTPException(400, "format=collapsed needs a route")
+        stacks = routes.get(route, {}).get("stacks", [])
+        return PlainTextResponse(collapsed({s["stack"]: s["samples"] for s in stacks}))
+    return {"enabled": settings.PROFILE_CONTINUOUS, "process": PROCESS_ID,
+            "interval_ms": settings.PROFILE_CONTINUOUS_INTERVAL_MS, "routes": routes}
+
+
+@router.get("/{trace_id}")
+async def request_profile(
+    trace_id: str,
+    format: str = Query("collapsed", pattern="^(json|collapsed)$"),
+    user: User = Depends(require_superadmin),
+):
+    """The stored profile of one request: collapsed stacks, or with format=json its metadata too."""
+    profile = await get_profile(trace_id, user.tenant_id)
+    if not profile:
+        raise HTTPException(404, "Profile not found")
+    if format == "collapsed":
+        return PlainTextResponse(profile["collapsed"])
+    return profile
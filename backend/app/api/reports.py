@@ -10,6 +10,7 @@ from datetime import datetime
 
 from app.core.database import get_db
 from app.core.deps import require_auth
+from app.core.serialization import to_dict as _row_dict
 from app.modules.identity.models import User
 from app.modules.sales.models import SaleOrder, SaleOrderLine
 from app.modules.accounting.models import AccountMove, InvoiceLine
@@ -18,21 +19,6 @@ from app.modules.payroll.models import PayrollEntry
 router = APIRouter(prefix="/reports", tags=["Reports & PDF"])
 
 
-def _row_dict(obj) -> dict:
-    d = {}
-    for c in obj.__table__.columns:
-        v = getattr(obj, c.name)
-        if hasattr(v, "isoformat"):
-            v = v.isoformat()
-        elif hasattr(v, "__float__"):
-            try:
-                v = float(v)
-            except Exception:
-                pass
-        d[c.name] = v
-    return d
-
-
 def _brand():
     from reportlab.lib import colors
     return {
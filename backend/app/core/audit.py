@@ -137,8 +137,8 @@ def audited(
 
 
 # ─── Auto-Audit Middleware ────────────────────────────────────────────────────
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 # These path patterns always get auto-audited on mutating methods
 AUDIT_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
@@ -196,7 +196,7 @@ def _infer_action(method: str, path: str) -> str:
     return f"{module}.{resource}.{verb}"
 
 
-class AuditMiddleware(BaseHTTPMiddleware):
+class AuditMiddleware:
     """
     Layer 1 audit enforcement.
     Automatically logs all mutating API requests (POST/PUT/PATCH/DELETE)
@@ -204,48 +204,56 @@ class AuditMiddleware(BaseHTTPMiddleware):
 
     Fine-grained audit() calls inside services still run on top of this —
     they provide richer context (before/after changes, business labels, etc.)
+
+    Plain ASGI: the status is read from the response start message and the
+    body is passed through untouched; the entry is written once the response
+    has been sent, from the user / tenant the auth dependency put in request.state.
     """
 
-    def __init__(self, app, db_session_factory=None):
-        super().__init__(app)
+    def __init__(self, app: ASGIApp, db_session_factory=None):
+        self.app = app
         self._db_factory = db_session_factory
+        self._pending: set[asyncio.Task] = set()
 
-    async def dispatch(self, request: Request, call_next) -> Response:
-        path = request.url.path
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path, method = scope["path"], scope["method"]
 
         # Only audit mutating methods on API paths
-        if request.method not in AUDIT_METHODS or path in AUDIT_SKIP_PATHS:
-            return await call_next(request)
-        if not path.startswith("/api/"):
-            return await call_next(request)
+        if method not in AUDIT_METHODS or path in AUDIT_SKIP_PATHS or not path.startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
 
-        response = await call_next(request)
+        await self.app(scope, receive, send_wrapper)
 
         # Only log successful mutations (2xx/3xx)
-        if response.status_code >= 400:
-            return response
-
-        # Extract user info from request state (set by auth dependency)
-        user_id    = getattr(request.state, "user_id",    None)
-        user_email = getattr(request.state, "user_email", None)
-        tenant_id  = getattr(request.state, "tenant_id",  "cierp")
-        trace_id   = getattr(request.state, "trace_id",   None)
-
-        action = _infer_action(request.method, path)
-        module = _infer_module(path)
-        ip     = request.client.host if request.client else None
-        ua     = request.headers.get("user-agent", "")[:500]
-
-        # Fire-and-forget DB write so we don't delay the response
-        if self._db_factory:
-            asyncio.create_task(self._write_log(
-                action=action, module=module,
-                actor_id=user_id, actor_email=user_email,
-                tenant_id=tenant_id, ip=ip, ua=ua,
-                status=response.status_code, trace_id=trace_id,
-            ))
-
-        return response
+        if status_code >= 400 or not self._db_factory:
+            return
+
+        headers = Headers(scope=scope)
+        client  = scope.get("client")
+
+        # Fire-and-forget DB write so we don't delay the next request on this connection
+        task = asyncio.create_task(self._write_log(
+            action=_infer_action(method, path), module=_infer_module(path),
+            actor_id=state.get("user_id"), actor_email=state.get("user_email"),
+            tenant_id=state.get("tenant_id", "cierp"),
+            ip=client[0] if client else None, ua=headers.get("user-agent", "")[:500],
+            status=status_code, trace_id=state.get("trace_id"),
+        ))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
 
     async def _write_log(self, **kwargs):
         try:
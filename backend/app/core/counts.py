@@ -0,0 +1,182 @@
+"""
+CI ERP — List Total-Count Strategies
+Replaces the per-request `COUNT(*) FROM (subquery)` of every paginated list.
+
+Modes (the `?total=` query parameter):
+  - exact     → COUNT(*), cached per (tenant, table, filter-hash) for COUNT_CACHE_TTL
+                seconds; any committed write to that tenant's table invalidates it
+  - estimate  → planner row estimate for the filtered query from EXPLAIN, falling
+                back to exact when there is none (e.g. on SQLite)
+  - skip      → no count at all; total is null (infinite-scroll clients)
+
+Invalidation is automatic: an ORM session listener records the (tenant, table)
+pairs touched by each flush and bumps their version on commit.  The cache is
+per process, so other workers see a write after at most COUNT_CACHE_TTL seconds.
+Other per-table caches subscribe to the same commit hook with @on_commit_write.
+"""
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from enum import Enum
+from typing import Optional
+
+from sqlalchemy import event, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger("cierp.counts")
+
+COUNT_CACHE_TTL = 30.0          # seconds an exact count may be served from cache
+COUNT_CACHE_MAX = 10_000        # entries kept before the oldest are evicted
+
+
+class TotalMode(str, Enum):
+    EXACT    = "exact"
+    ESTIMATE = "estimate"
+    SKIP     = "skip"
+
+
+# ─── Cache + write-driven invalidation ────────────────────────────────────────
+_cache: "OrderedDict[tuple, tuple[int, int, float]]" = OrderedDict()   # key → (count, version, expires)
+_versions: dict[tuple[str, str], int] = {}                             # (tenant, table) → version
+_write_listeners: list = []                                            # fn(tenant, table) per committed write
+
+
+def _version(tenant_id: str, table: str) -> int:
+    return _versions.get((tenant_id, table), 0)
+
+
+def invalidate(tenant_id: str, table: str) -> None:
+    """Drop every cached count for one tenant's table (called on commit)."""
+    _versions[(tenant_id, table)] = _version(tenant_id, table) + 1
+
+
+def clear_cache() -> None:
+    _cache.clear()
+    _versions.clear()
+
+
+def on_commit_write(fn):
+    """Register `fn(tenant_id, table)` to run for every (tenant, table) a commit wrote to."""
+    _write_listeners.append(fn)
+    return fn
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_writes(session: Session, flush_context) -> None:
+    touched = session.info.setdefault("_count_writes", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        tenant = getattr(obj, "tenant_id", None)
+        if table and tenant:
+            touched.add((tenant, table))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_writes(session: Session) -> None:
+    for tenant, table in session.info.pop("_count_writes", ()):
+        invalidate(tenant, table)
+        for fn in _write_listeners:
+            fn(tenant, table)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_writes(session: Session) -> None:
+    session.info.pop("_count_writes", None)
+
+
+def _filter_hash(q) -> str:
+    compiled = q.compile()
+    params = sorted((k, repr(v)) for k, v in compiled.params.items())
+    return hashlib.sha1(f"{compiled}|{params}".encode()).hexdigest()
+
+
+def _table_of(q) -> Optional[str]:
+    entity = q.column_descriptions[0].get("entity")
+    return getattr(entity, "__tablename__", None)
+
+
+# ─── Strategies ───────────────────────────────────────────────────────────────
+
+async def _exact(db: AsyncSession, q) -> int:
+    return (await db.execute(select(func.count()).select_from(q.subquery()))).scalar() or 0
+
+
+def _cache_key(q, tenant_id: Optional[str]) -> Optional[tuple]:
+    table = _table_of(q)
+    if not tenant_id or not table:
+        return None
+    return (tenant_id, table, _filter_hash(q))
+
+
+def _cache_hit(key: tuple) -> Optional[int]:
+    hit = _cache.get(key)
+    if hit and hit[1] == _version(key[0], key[1]) and hit[2] > time.monotonic():
+        _cache.move_to_end(key)
+        return hit[0]
+    return None
+
+
+def cached_count(q, tenant_id: Optional[str]) -> Optional[int]:
+    """The cached exact count of `q` if still valid, else None — never queries."""
+    key = _cache_key(q, tenant_id)
+    return _cache_hit(key) if key else None
+
+
+async def _cached_exact(db: AsyncSession, q, tenant_id: Optional[str]) -> int:
+    key = _cache_key(q, tenant_id)
+    if key is None:
+        return await _exact(db, q)
+    hit = _cache_hit(key)
+    if hit is not None:
+        return hit
+
+    version = _version(key[0], key[1])
+    count = await _exact(db, q)
+    now = time.monotonic()
+    _cache[key] = (count, version, now + COUNT_CACHE_TTL)
+    _cache.move_to_end(key)
+    while len(_cache) > COUNT_CACHE_MAX:
+        _cache.popitem(last=False)
+    return count
+
+
+async def _estimate(db: AsyncSession, q) -> Optional[int]:
+    """Planner estimate for the filtered query; None if the backend can't provide one."""
+    dialect = db.get_bind().dialect
+    if dialect.name != "postgresql":
+        return None
+    try:
+        sql = str(q.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+        # A savepoint, so a failed EXPLAIN does not abort the request's transaction.
+        # On the connection, not the session: a session savepoint rollback fires
+        # after_rollback, which would discard the flush's pending count invalidations.
+        conn = await db.connection()
+        async with conn.begin_nested():
+            plan = (await conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except Exception as e:
+        logger.debug(f"EXPLAIN estimate failed, using an exact count: {e}")
+        return None
+
+
+async def count_total(
+    db: AsyncSession,
+    q,
+    *,
+    mode: TotalMode | str = TotalMode.EXACT,
+    tenant_id: Optional[str] = None,
+) -> Optional[int]:
+    """Total row count of `q` using the requested strategy (None for skip)."""
+    mode = TotalMode(mode)
+    if mode is TotalMode.SKIP:
+        return None
+    if mode is TotalMode.ESTIMATE:
+        est = await _estimate(db, q)
+        if est is not None:
+            return est
+    return await _cached_exact(db, q, tenant_id)
@@ -1,8 +1,12 @@
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase, declared_attr
-from sqlalchemy import Column, String, Boolean, DateTime, func, text
-from typing import AsyncGenerator
+from sqlalchemy import Column, String, Boolean, DateTime, event, func, text
+from contextvars import ContextVar, Token
+from functools import lru_cache
+from typing import AsyncGenerator, Optional
 from app.core.config import settings
+import re
+import time
 import uuid as _uuid
 
 
@@ -12,6 +16,76 @@ engine = create_async_engine(
     echo=False,
 )
 
+
+# ─── Query instrumentation ────────────────────────────────────────────────────
+# ObservabilityMiddleware opens a stats dict per request (keyed to its trace id)
+# in this contextvar.  The async engine runs the driver in a greenlet that shares
+# the caller's context, so the cursor listeners below charge every statement to
+# the request that issued it; outside a request (workers, startup) they no-op.
+_query_stats: ContextVar[Optional[dict]] = ContextVar("cierp_query_stats", default=None)
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r"\$?\?(?:\s*,\s*\$?\?)+")
+
+
+@lru_cache(maxsize=2048)
+def statement_shape(statement: str) -> str:
+    """Statement with literals and placeholder lists folded, so per-row variants compare equal."""
+    shape = _LITERAL_RE.sub("?", statement)
+    return " ".join(_LIST_RE.sub("?, ...", shape).split())
+
+
+def start_query_stats(trace_id: str) -> Token:
+    """Start charging statements to the current request; pass the token to end_query_stats()."""
+    return _query_stats.set({"trace_id": trace_id, "queries": 0, "db_ms": 0.0,
+                             "slowest_ms": 0.0, "slowest_sql": None, "shapes": {}})
+
+
+def current_query_stats() -> Optional[dict]:
+    """Live stats of the current request (None outside one)."""
+    return _query_stats.get()
+
+
+def end_query_stats(token: Token) -> dict:
+    """
+    Stop charging statements and summarise the request: query count, DB time, the
+    slowest statement, and `n_plus_one` — statement shapes run N_PLUS_ONE_THRESHOLD
+    or more times, the usual sign of a lazy load or per-row query inside a loop.
+    """
+    stats = _query_stats.get()
+    _query_stats.reset(token)
+    repeated = sorted(((n, shape) for shape, n in stats["shapes"].items()
+                       if n >= settings.N_PLUS_ONE_THRESHOLD), reverse=True)
+    return {
+        "queries": stats["queries"],
+        "db_ms": round(stats["db_ms"], 2),
+        "slowest_ms": round(stats["slowest_ms"], 2),
+        "slowest_sql": stats["slowest_sql"],
+        "n_plus_one": [{"sql": shape[:300], "count": n} for n, shape in repeated],
+    }
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _query_stats.get() is not None:
+        context._cierp_query_start = time.perf_counter()
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _query_stats.get()
+    start = getattr(context, "_cierp_query_start", None)
+    if stats is None or start is None:
+        return
+    ms = (time.perf_counter() - start) * 1000
+    stats["queries"] += 1
+    stats["db_ms"] += ms
+    if ms > stats["slowest_ms"]:
+        stats["slowest_ms"], stats["slowest_sql"] = ms, statement[:500]
+    shape = statement_shape(statement)
+    stats["shapes"][shape] = stats["shapes"].get(shape, 0) + 1
+
+
 AsyncSessionLocal = async_sessionmaker(
     engine,
     class_=AsyncSession,
@@ -40,6 +114,17 @@ class BaseModel(Base):
     is_deleted = Column(Boolean, default=False, server_default=text('false'), nullable=False)
 
 
+def dialect_insert(dialect_name: str):
+    """insert() construct with ON CONFLICT support for the given dialect (PostgreSQL, SQLite)."""
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"upserts are not supported on {dialect_name}")
+    return insert
+
+
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
         try:
@@ -67,6 +152,8 @@ async def create_tables():
     import app.modules.helpdesk.models           # noqa
     import app.modules.order_tracking.models     # noqa
     import app.modules.payroll.models            # noqa
+    import app.core.sequence                     # noqa: F401 — document_sequence
+    import app.core.kpi                          # noqa: F401 — kpi_rollup, kpi_delta
 
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
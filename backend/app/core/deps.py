@@ -4,6 +4,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 
+from app.core import profiler
 from app.core.database import get_db
 from app.core.security import decode_token
 from app.modules.identity.models import User
@@ -56,6 +57,14 @@ async def get_current_user(
     request.state.user_id    = str(user.id)
     request.state.user_email = user.email
     request.state.tenant_id  = user.tenant_id
+    request.state.is_superadmin = bool(getattr(user, "is_superadmin", False))
+
+    # ── On-demand profiling (X-Profile: 1) — superadmins only, on the task ──
+    # ObservabilityMiddleware registered; it ends the sampling with the request.
+    profile_task = getattr(request.state, "profile_task", None)
+    if profile_task is not None and request.state.is_superadmin:
+        record = profiler.begin(True, profile_task)
+        request.state.profiled = bool(record and record["on_demand"])
 
     return user
 
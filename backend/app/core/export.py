@@ -0,0 +1,104 @@
+"""
+CI ERP — Streaming Exports
+Full-table NDJSON / CSV downloads without building the result in memory.
+
+  - Rows come from a server-side cursor (`AsyncSession.stream` + `yield_per`),
+    EXPORT_BATCH_SIZE at a time, as Core tuples in table-column order.
+  - Each batch is encoded with app.core.serialization.row_encoder_for and
+    flushed to the client before the next batch is fetched, so memory stays
+    flat whether the export is 10k or 10M rows.
+  - The export owns its session: FastAPI closes `get_db` sessions before a
+    StreamingResponse body is sent, so the request session can't be reused.
+
+Usage:
+    q = select(AccountMove).where(AccountMove.tenant_id == tenant_id, ...)
+    return export_response(q, fmt, "journal-entries", AccountMove.created_at, descending=True)
+"""
+import csv
+import io
+import json
+import logging
+from datetime import datetime, timezone
+from enum import Enum
+from typing import AsyncIterator
+
+from fastapi.responses import StreamingResponse
+
+from app.core.database import AsyncSessionLocal
+from app.core.pagination import order_clause, sort_keys
+from app.core.serialization import row_encoder_for, table_columns
+
+try:
+    import orjson
+except ImportError:  # optional — stdlib json is used instead
+    orjson = None
+
+logger = logging.getLogger("cierp.export")
+
+EXPORT_BATCH_SIZE = 2000        # rows fetched per round-trip from the server-side cursor
+
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV    = "csv"
+
+
+_MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV:    "text/csv; charset=utf-8",
+}
+
+
+# ─── Encoders ─────────────────────────────────────────────────────────────────
+
+def _ndjson_batch(encode, rows) -> bytes:
+    if orjson is not None:
+        return b"".join(orjson.dumps(encode(r)) + b"\n" for r in rows)
+    return "".join(json.dumps(encode(r), default=str) + "\n" for r in rows).encode()
+
+
+def _csv_batch(encode, rows, buf: io.StringIO, writer) -> bytes:
+    buf.seek(0)
+    buf.truncate()
+    writer.writerows(encode(r).values() for r in rows)
+    return buf.getvalue().encode()
+
+
+# ─── Streaming ────────────────────────────────────────────────────────────────
+
+async def stream_rows(q, fmt: ExportFormat, *keys, descending: bool = False) -> AsyncIterator[bytes]:
+    """Yield encoded chunks of `q` (one per EXPORT_BATCH_SIZE rows) from a server-side cursor."""
+    entity = q.column_descriptions[0]["entity"]
+    cols = table_columns(entity)
+    encode = row_encoder_for(entity)
+    if keys:
+        q = q.order_by(*order_clause(sort_keys(q, *keys), descending=descending))
+    q = q.with_only_columns(*cols).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if fmt is ExportFormat.CSV:
+        writer.writerow(c.name for c in cols)
+        yield buf.getvalue().encode()
+
+    sent = 0
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(q)
+        async for batch in result.partitions():
+            sent += len(batch)
+            if fmt is ExportFormat.CSV:
+                yield _csv_batch(encode, batch, buf, writer)
+            else:
+                yield _ndjson_batch(encode, batch)
+    logger.info(f"Export {entity.__tablename__} ({fmt.value}) — {sent} rows")
+
+
+def export_response(q, fmt: ExportFormat, name: str, *keys, descending: bool = False) -> StreamingResponse:
+    """StreamingResponse for `q` as an attachment named `<name>-<UTC timestamp>.<fmt>`."""
+    fmt = ExportFormat(fmt)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    return StreamingResponse(
+        stream_rows(q, fmt, *keys, descending=descending),
+        media_type=_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}-{stamp}.{fmt.value}"'},
+    )
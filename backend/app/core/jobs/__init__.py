@@ -6,16 +6,36 @@ Entry point for the standalone worker process:
 
 Or import the core queue helpers directly:
     from app.core.jobs import enqueue_job, JobType, JobWorker
+
+Recurring jobs are declared in app.core.jobs.scheduler.SCHEDULES and fired by
+CronScheduler (one leader across all replicas).
 """
 # Re-export everything from the main jobs module for backward compatibility
 from app.core.jobs_impl import (  # noqa: F401
     enqueue_job,
+    enqueue_many,
+    payload_key,
+    get_batch_status,
     get_job_status,
+    report_progress,
+    watch_job,
     get_dead_letters,
+    count_dead_letters,
     retry_dead_letter,
+    replay_dead_letters,
+    get_queue_depths,
     JobWorker,
+    job_handler,
+    run_cpu,
     JobType,
     JobStatus,
     enqueue_email,
     enqueue_pdf,
 )
+from app.core.jobs.scheduler import (  # noqa: F401
+    CronScheduler,
+    SCHEDULES,
+    register_schedule,
+    get_schedules,
+    get_schedule_history,
+)
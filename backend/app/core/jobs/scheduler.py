@@ -0,0 +1,324 @@
+"""
+CI ERP — Periodic Job Scheduler
+Cron-style schedules that enqueue JobType tasks: KPI delta compaction and
+audit-log pruning.  Only job types with a real handler belong here.
+
+Every web / worker replica runs a CronScheduler; only the leader fires.
+
+Leader election
+---------------
+cierp:cron:leader holds the leader's node id, set with SET NX PX LEADER_TTL and
+renewed every LEADER_TTL / 3 by a compare-and-PEXPIRE script.  A leader that dies
+(or stalls past the TTL) loses the key and another replica takes over on its next
+attempt.  Each fire also enqueues with idempotency_key "cron:{name}:{fire time}", so
+two replicas overlapping during a handover still produce one job per tick.
+
+State (Redis, in-memory when Redis is unavailable)
+--------------------------------------------------
+cierp:cron:{name}          hash  cron, next_fire, last_fire, last_job_id, fires
+cierp:cron:{name}:history  list  newest-first fire records (last CRON_HISTORY)
+
+Schedules are evaluated in UTC.  A fire time missed while no leader was running is
+caught up once, not once per missed tick.
+
+Usage:
+    register_schedule("statement_mailing", "0 6 1 * *", JobType.EXPORT_REPORT,
+                      {"report_type": "statement", "format": "pdf"})
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from app.core.jobs_impl import (
+    JobType, enqueue_job, get_job_status, _get_redis, _script, _memory, _TENANTS_KEY,
+)
+
+logger = logging.getLogger("cierp.cron")
+
+LEADER_KEY = "cierp:cron:leader"
+LEADER_TTL = 30           # seconds a leader keeps the lock without renewing it
+CRON_HISTORY = 50         # fire records kept per schedule
+
+# ─── Registry ─────────────────────────────────────────────────────────────────
+# name → {cron, type, payload?, priority?}.  The fired job's payload is `payload`
+# plus tenant_id and scheduled_for (ISO fire time).
+SCHEDULES: dict[str, dict] = {
+    "kpi_rollup":  {"cron": "*/5 * * * *", "type": JobType.KPI_ROLLUP},
+    "audit_prune": {"cron": "30 3 * * 0",  "type": JobType.PRUNE_AUDIT_LOG,
+                    "payload": {"older_than_days": 365}},
+}
+
+
+def register_schedule(name: str, cron: str, job_type: JobType,
+                      payload: Optional[dict] = None, priority: int = 8) -> None:
+    """Add or replace a schedule (validates the cron expression)."""
+    parse_cron(cron)
+    SCHEDULES[name] = {"cron": cron, "type": job_type, "payload": payload or {}, "priority": priority}
+
+
+# ─── Cron expressions ─────────────────────────────────────────────────────────
+# minute hour day-of-month month day-of-week (0 or 7 = Sunday); *, a-b, lists, /step
+_ALIASES = {
+    "@hourly":  "0 * * * *",
+    "@daily":   "0 0 * * *",
+    "@weekly":  "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+    "@yearly":  "0 0 1 1 *",
+}
+_BOUNDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+
+def _parse_field(spec: str, lo: int, hi: int) -> frozenset[int]:
+    values: set[int] = set()
+    for part in spec.split(","):
+        rng, _, step = part.partition("/")
+        if rng == "*":
+            a, b = lo, hi
+        elif "-" in rng:
+            a, b = (int(x) for x in rng.split("-", 1))
+        else:
+            a = int(rng)
+            b = hi if step else a
+        n = int(step) if step else 1
+        if not lo <= a <= b <= hi or n < 1:
+            raise ValueError(f"cron field '{spec}' out of range {lo}-{hi}")
+        values.update(range(a, b + 1, n))
+    return frozenset(values)
+
+
+def parse_cron(expr: str) -> tuple:
+    """(minutes, hours, days, months, weekdays, day_restricted, weekday_restricted)."""
+    fields = _ALIASES.get(expr.strip(), expr).split()
+    if len(fields) != 5:
+        raise ValueError(f"cron expression needs 5 fields: '{expr}'")
+    minutes, hours, days, months, weekdays = (_parse_field(f, lo, hi) for f, (lo, hi) in zip(fields, _BOUNDS))
+    weekdays = frozenset(d % 7 for d in weekdays)
+    return minutes, hours, days, months, weekdays, fields[2] != "*", fields[4] != "*"
+
+
+def next_fire(expr: str, after: datetime) -> datetime:
+    """First minute strictly after `after` (UTC) that matches the cron expression."""
+    minutes, hours, days, months, weekdays, dom_set, dow_set = parse_cron(expr)
+    t = after.astimezone(timezone.utc).replace(second=0, microsecond=0) + timedelta(minutes=1)
+    limit = t + timedelta(days=366 * 5)
+    while t < limit:
+        if t.month not in months:
+            y, m = (t.year + 1, 1) if t.month == 12 else (t.year, t.month + 1)
+            t = t.replace(year=y, month=m, day=1, hour=0, minute=0)
+            continue
+        dom_ok, dow_ok = t.day in days, (t.weekday() + 1) % 7 in weekdays
+        if not ((dom_ok or dow_ok) if dom_set and dow_set else (dom_ok and dow_ok)):
+            t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            continue
+        if t.hour not in hours:
+            t = t.replace(minute=0) + timedelta(hours=1)
+            continue
+        if t.minute not in minutes:
+            t += timedelta(minutes=1)
+            continue
+        return t
+    raise ValueError(f"cron expression never fires: '{expr}'")
+
+
+# ─── State ────────────────────────────────────────────────────────────────────
+_RENEW_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_memory_state:   dict[str, dict] = {}
+_memory_history: dict[str, deque] = {}
+_memory_leader:  Optional[str] = None
+
+
+def _state_key(name: str) -> str:
+    return f"cierp:cron:{name}"
+
+
+def _history_key(name: str) -> str:
+    return f"cierp:cron:{name}:history"
+
+
+def _iso(ts: Optional[datetime]) -> Optional[str]:
+    return ts.isoformat() if ts else None
+
+
+async def _load_state(redis, name: str) -> dict:
+    if redis:
+        return await redis.hgetall(_state_key(name))
+    return dict(_memory_state.get(name, {}))
+
+
+async def _save_state(redis, name: str, state: dict, record: Optional[dict] = None) -> None:
+    if redis:
+        pipe = redis.pipeline(transaction=True)
+        pipe.hset(_state_key(name), mapping=state)
+        if record:
+            pipe.hincrby(_state_key(name), "fires", 1)
+            pipe.lpush(_history_key(name), json.dumps(record))
+            pipe.ltrim(_history_key(name), 0, CRON_HISTORY - 1)
+        await pipe.execute()
+        return
+    current = _memory_state.setdefault(name, {})
+    current.update(state)
+    if record:
+        current["fires"] = int(current.get("fires", 0)) + 1
+        _memory_history.setdefault(name, deque(maxlen=CRON_HISTORY)).appendleft(record)
+
+
+# ─── Scheduler ────────────────────────────────────────────────────────────────
+
+class CronScheduler:
+    """
+    Fires SCHEDULES while this replica holds the leader lock.
+    tenant_id=None fires each schedule for every tenant in the job tenant registry.
+    """
+
+    def __init__(self, tenant_id: Optional[str] = "cierp"):
+        self.tenant_id = tenant_id
+        self.node = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.is_leader = False
+        self._running = False
+        self._wake = asyncio.Event()
+
+    async def run(self):
+        self._running = True
+        logger.info(f"CronScheduler started node={self.node} schedules={len(SCHEDULES)}")
+        while self._running:
+            delay = LEADER_TTL / 3
+            try:
+                redis = await _get_redis(silent=True)
+                if await self._elect(redis):
+                    delay = min(delay, await self._tick(redis))
+            except Exception as e:
+                logger.error(f"CronScheduler error: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(delay, 0.05))
+            except asyncio.TimeoutError:
+                pass
+        await self._resign()
+        logger.info("CronScheduler stopped.")
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+
+    async def _elect(self, redis) -> bool:
+        """Acquire or renew the leader lock; returns whether this node leads."""
+        global _memory_leader
+        was = self.is_leader
+        if not redis:
+            _memory_leader = _memory_leader or self.node
+            self.is_leader = _memory_leader == self.node
+        elif self.is_leader:
+            self.is_leader = bool(await _script(redis, _RENEW_LUA)(
+                keys=[LEADER_KEY], args=[self.node, LEADER_TTL * 1000]))
+        else:
+            self.is_leader = bool(await redis.set(LEADER_KEY, self.node, nx=True, px=LEADER_TTL * 1000))
+        if self.is_leader != was:
+            logger.info(f"CronScheduler node={self.node} {'is now' if self.is_leader else 'is no longer'} leader")
+        return self.is_leader
+
+    async def _resign(self):
+        global _memory_leader
+        if not self.is_leader:
+            return
+        self.is_leader = False
+        redis = await _get_redis(silent=True)
+        if redis:
+            await _script(redis, _RELEASE_LUA)(keys=[LEADER_KEY], args=[self.node])
+        elif _memory_leader == self.node:
+            _memory_leader = None
+
+    async def _tenants(self, redis) -> list[str]:
+        if self.tenant_id:
+            return [self.tenant_id]
+        return sorted(await redis.smembers(_TENANTS_KEY)) if redis else sorted(_memory.tenants)
+
+    async def _tick(self, redis) -> float:
+        """Fire every due schedule; returns seconds until the next one is due."""
+        now = datetime.now(timezone.utc)
+        soonest = None
+        for name, spec in list(SCHEDULES.items()):
+            state = await _load_state(redis, name)
+            due = datetime.fromisoformat(state["next_fire"]) if state.get("next_fire") else None
+            if due is None or state.get("cron") != spec["cron"]:
+                due = next_fire(spec["cron"], now)
+                await _save_state(redis, name, {"cron": spec["cron"], "next_fire": due.isoformat()})
+            elif due <= now:
+                due = await self._fire(redis, name, spec, due, now)
+            soonest = due if soonest is None else min(soonest, due)
+        return (soonest - datetime.now(timezone.utc)).total_seconds() if soonest else LEADER_TTL / 3
+
+    async def _fire(self, redis, name: str, spec: dict, scheduled: datetime, now: datetime) -> datetime:
+        job_ids = []
+        for tenant in await self._tenants(redis):
+            job_ids.append(await enqueue_job(
+                spec["type"],
+                {**spec.get("payload", {}), "tenant_id": tenant, "scheduled_for": scheduled.isoformat()},
+                priority=spec.get("priority", 8),
+                tenant_id=tenant,
+                idempotency_key=f"cron:{name}:{int(scheduled.timestamp())}",
+            ))
+        nxt = next_fire(spec["cron"], now)
+        record = {"scheduled_for": scheduled.isoformat(), "fired_at": now.isoformat(),
+                  "job_ids": job_ids, "node": self.node}
+        await _save_state(redis, name, {"cron": spec["cron"], "next_fire": nxt.isoformat(),
+                                        "last_fire": now.isoformat(),
+                                        "last_job_id": job_ids[-1] if job_ids else ""}, record)
+        logger.info(f"Cron {name} fired ({len(job_ids)} job(s)); next at {nxt.isoformat()}")
+        return nxt
+
+
+# ─── Inspection ───────────────────────────────────────────────────────────────
+
+async def get_schedules() -> dict:
+    """Every schedule with its next / last fire time, plus the current leader."""
+    redis = await _get_redis(silent=True)
+    leader = await redis.get(LEADER_KEY) if redis else _memory_leader
+    items = []
+    for name, spec in SCHEDULES.items():
+        state = await _load_state(redis, name)
+        nxt = state.get("next_fire") if state.get("cron") == spec["cron"] else None
+        items.append({
+            "name":        name,
+            "cron":        spec["cron"],
+            "type":        spec["type"].value,
+            "priority":    spec.get("priority", 8),
+            "next_fire":   nxt or _iso(next_fire(spec["cron"], datetime.now(timezone.utc))),
+            "last_fire":   state.get("last_fire"),
+            "last_job_id": state.get("last_job_id") or None,
+            "fires":       int(state.get("fires", 0)),
+        })
+    return {"leader": leader, "items": items}
+
+
+async def get_schedule_history(name: str, limit: int = 20, tenant_id: str = "cierp") -> Optional[list[dict]]:
+    """Newest-first fire records of one schedule, each with its jobs' current status."""
+    if name not in SCHEDULES:
+        return None
+    redis = await _get_redis(silent=True)
+    if redis:
+        records = [json.loads(r) for r in await redis.lrange(_history_key(name), 0, limit - 1)]
+    else:
+        records = [dict(r) for r in list(_memory_history.get(name, ()))[:limit]]
+    for record in records:
+        jobs = [await get_job_status(job_id, tenant_id) for job_id in record["job_ids"]]
+        record["jobs"] = [{"id": j["id"], "tenant_id": j.get("tenant_id"), "status": j["status"]}
+                          for j in jobs if j]
+    return records
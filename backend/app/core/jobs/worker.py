@@ -17,15 +17,22 @@ Environment variables used
     DATABASE_URL   — PostgreSQL connection string
     REDIS_URL      — Redis connection string (falls back to in-memory if absent)
     TENANT_ID      — Tenant to process jobs for (default: cierp)
+    WORKER_TENANTS — "*" to serve every tenant's queue from one pool, fair-shared (default: TENANT_ID only)
+    WORKER_TENANT_CONCURRENCY — Max jobs in flight per tenant (default: half of WORKER_CONCURRENCY with "*")
     ENVIRONMENT    — production | development
     LOG_LEVEL      — DEBUG | INFO | WARNING (default: INFO)
-    WORKER_POLL    — Poll interval seconds (default: 2.0)
+    WORKER_POLL    — Max seconds a blocking dequeue waits before re-checking for shutdown (default: 2.0)
+    WORKER_CONCURRENCY   — Jobs in flight at once (default: 4)
+    WORKER_DRAIN_SECONDS — Grace period for in-flight jobs on SIGTERM (default: 30)
+    JOB_PROCESS_POOL_SIZE — Processes for cpu_bound handlers such as PDF rendering (default: one per core)
+    CRON_ENABLED   — Also run the periodic job scheduler; one replica leads (default: true)
 
 What it does
 ------------
 - Connects to Redis (or falls back to in-memory queue)
-- Runs JobWorker.run() in an asyncio event loop
-- Handles SIGTERM/SIGINT for graceful shutdown
+- Runs JobWorker.run() in an asyncio event loop (WORKER_CONCURRENCY jobs at once)
+- Runs the CronScheduler alongside it (CRON_ENABLED); replicas elect one leader to fire schedules
+- Handles SIGTERM/SIGINT for graceful shutdown: stops dequeuing, drains in-flight jobs
 - Logs structured JSON to stdout
 - Can be horizontally scaled (multiple worker containers)
 
@@ -37,12 +44,15 @@ Job types handled
     export_report    — CSV/PDF report export
     notify           — In-app notifications
     sync_data        — Background data synchronisation
+    kpi_rollup       — KPI delta compaction (scheduled)
+    prune_audit_log  — Audit-log retention (scheduled)
 """
 import asyncio
 import logging
 import os
 import signal
 import sys
+from typing import Optional
 
 # ── Bootstrap path ─────────────────────────────────────────────────────────────
 # Allow running as: python -m app.core.jobs.worker from /backend directory
@@ -68,10 +78,15 @@ def _get_settings():
     return settings
 
 
-async def _run_worker(tenant_id: str, poll_interval: float):
-    from app.core.jobs_impl import JobWorker
+async def _run_worker(tenant_id: Optional[str], poll_interval: float, concurrency: int,
+                      drain_timeout: float, tenant_concurrency: int, cron: bool):
+    from app.core.jobs_impl import JobWorker, shutdown_process_pool
+    from app.core.jobs.scheduler import CronScheduler
 
-    worker = JobWorker(tenant_id=tenant_id, poll_interval=poll_interval)
+    worker = JobWorker(tenant_id=tenant_id, poll_interval=poll_interval,
+                       concurrency=concurrency, drain_timeout=drain_timeout,
+                       tenant_concurrency=tenant_concurrency)
+    scheduler = CronScheduler(tenant_id=tenant_id) if cron else None
 
     loop = asyncio.get_running_loop()
 
@@ -79,11 +94,19 @@ async def _run_worker(tenant_id: str, poll_interval: float):
     def _stop(*_):
         logging.getLogger("cierp.worker").info("Shutdown signal received — stopping worker...")
         worker.stop()
+        if scheduler:
+            scheduler.stop()
 
     loop.add_signal_handler(signal.SIGTERM, _stop)
     loop.add_signal_handler(signal.SIGINT,  _stop)
 
-    await worker.run()
+    try:
+        if scheduler:
+            await asyncio.gather(worker.run(), scheduler.run())
+        else:
+            await worker.run()
+    finally:
+        shutdown_process_pool()
 
 
 def main():
@@ -91,16 +114,19 @@ def main():
     logger = logging.getLogger("cierp.worker")
 
     settings = _get_settings()
-    tenant_id    = settings.TENANT_ID
+    tenant_id    = None if settings.WORKER_TENANTS == "*" else settings.TENANT_ID
     poll_interval = float(os.environ.get("WORKER_POLL", "2.0"))
+    concurrency   = settings.WORKER_CONCURRENCY
+    drain_timeout = settings.WORKER_DRAIN_SECONDS
 
     logger.info(
         f"CI ERP Background Worker starting — "
-        f"tenant={tenant_id}  env={settings.ENVIRONMENT}  poll={poll_interval}s"
+        f"tenant={tenant_id or '*'}  env={settings.ENVIRONMENT}  poll={poll_interval}s  concurrency={concurrency}"
     )
 
     try:
-        asyncio.run(_run_worker(tenant_id, poll_interval))
+        asyncio.run(_run_worker(tenant_id, poll_interval, concurrency, drain_timeout,
+                                settings.WORKER_TENANT_CONCURRENCY, settings.CRON_ENABLED))
     except KeyboardInterrupt:
         logger.info("Worker stopped by keyboard interrupt.")
     finally:
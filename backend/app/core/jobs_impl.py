@@ -3,21 +3,62 @@ CI ERP — Background Jobs Queue
 Production-ready: Redis-backed with retries, dead-letter queue, worker process.
 
 Architecture:
-  - enqueue_job()        → push to Redis list  cierp:jobs:{tenant}:{priority}
+  - enqueue_job()        → push to Redis list  cierp:jobs:{tenant}:{lane}, lane from priority
+                           (1–3 high, 4–6 default, 7+ low); workers dequeue with one multi-key
+                           BRPOP in weighted order (LANE_WEIGHTS) so bulk work never starves
+                           urgent jobs and is not starved itself
   - get_job_status()     → read from Redis key  cierp:job:{job_id}
   - JobWorker            → async worker loop; retries failed jobs, dead-letters after max_attempts
-  - Dead-letter queue    → cierp:jobs:dead:{tenant}  (inspect via /api/v1/jobs/dead-letters)
-  - In-memory fallback   → when Redis unavailable (dev / testing)
+  - Delayed jobs         → ZSET cierp:jobs:delayed:{tenant}:{lane} scored by due time (retry back-off,
+                           enqueue_job(..., run_at=...)); the worker's promoter moves due jobs
+                           onto the ready list in batches and sleeps until the next one is due
+  - Reliable processing  → a claim atomically moves the job into the worker's own in-flight list
+                           cierp:jobs:{tenant}:processing:{worker}; it leaves that list only in
+                           the same transaction that records the outcome.  Workers heartbeat into
+                           cierp:jobs:{tenant}:workers; any worker reaps the in-flight list of one
+                           silent for VISIBILITY_TIMEOUT into cierp:jobs:{tenant}:recovered, which
+                           is claimed first.  Delivery is at-least-once: a job whose worker died
+                           after finishing it but before recording that may run twice.
+  - Idempotency          → enqueue_job(idempotency_key=…) (or dedupe=True: key = type + hash of the
+                           canonical payload) claims cierp:jobs:{tenant}:idem:{key} with SET NX;
+                           a repeat within IDEMPOTENCY_TTL gets the first job's id back — its
+                           status carries the handler's result reference once done
+  - Batches              → enqueue_many() writes a fan-out in pipelined chunks (one multi-value
+                           LPUSH per lane + SETEX per job) and tracks it in the hash
+                           cierp:batch:{batch_id}; workers bump its done/dead counters in the
+                           same transaction that records each job's outcome
+  - Tenants              → every tenant that enqueues is added to cierp:jobs:tenants;
+                           JobWorker(tenant_id=None) serves all of them from one pool, taking
+                           tenants round-robin within each lane and capping each tenant's share
+                           of the pool (tenant_concurrency)
+  - Dead-letter store    → hash cierp:jobs:dead:{tenant}:jobs (id → job) indexed by time in the ZSETs
+                           cierp:jobs:dead:{tenant}:index[:{type}]: O(1) retry, paginated listing
+                           and bulk replay by type / time (via /api/v1/jobs/dead-letters)
+  - Progress             → handlers call report_progress(pct, message); the latest value is kept in
+                           cierp:job:{job_id}:progress and every progress / outcome event is
+                           published on cierp:job:{job_id}:events, which watch_job() (and the SSE
+                           endpoint /api/v1/jobs/stream/{job_id}) relays to clients
+  - In-memory fallback   → MemoryJobBackend when Redis is unavailable (dev / testing / outage):
+                           per-(tenant, lane) deques, a delayed-job heap and an id index, with
+                           finished jobs evicted LRU so memory stays bounded
 
 Usage:
   job_id = await enqueue_job(JobType.SEND_EMAIL, {"to": "...", "subject": "..."})
   status = await get_job_status(job_id)
 """
 import json
+import hashlib
+import os
+import time
+import uuid
+import socket
 import asyncio
+import heapq
 import logging
-from datetime import datetime, timezone
-from typing import Optional, Any
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Optional, Any, Callable
 from enum import Enum
 
 logger = logging.getLogger("cierp.jobs")
@@ -25,6 +66,43 @@ logger = logging.getLogger("cierp.jobs")
 MAX_ATTEMPTS = 3          # retries before dead-lettering
 RETRY_DELAY_SECONDS = [0, 30, 120]   # delay before each retry (index = attempt number)
 JOB_TTL = 86400           # Redis key TTL: 24h
+IDEMPOTENCY_TTL = 600     # seconds a duplicate submission maps to the first job (and its result)
+IDEMPOTENCY_CLAIM_TTL = 30   # seconds a guard lives before its job is written (caps a crashed enqueue)
+VISIBILITY_TIMEOUT = 60   # seconds without a worker heartbeat before its in-flight jobs are re-queued
+REAP_INTERVAL = 15        # how often each worker looks for dead workers
+STREAM_KEEPALIVE = 15     # seconds watch_job() waits for an event before yielding a keep-alive
+DEAD_LETTER_MAX = 10_000  # per tenant; the oldest are dropped by worker housekeeping
+MEMORY_FINISHED_MAX = 1000   # in-memory backend: finished jobs kept for get_job_status (LRU)
+MEMORY_BATCHES_MAX = 1000    # in-memory backend: enqueue_many batches kept for get_batch_status
+
+# Handler time limits (seconds); a handler still running after this is cancelled
+# and the attempt counts as failed.
+JOB_TIMEOUTS = {
+    "send_email":      60,
+    "generate_pdf":    300,
+    "process_payroll": 1800,
+    "export_report":   900,
+    "notify":          30,
+    "sync_data":       900,
+    "kpi_rollup":      300,
+    "prune_audit_log": 900,
+}
+DEFAULT_JOB_TIMEOUT = 300
+
+# Types whose duplicate submissions (double-clicks, client retries) are collapsed by default
+DEDUPE_BY_DEFAULT = {"export_report", "generate_pdf"}
+
+# Priority lanes, most urgent first, and their share of dequeues while all are busy.
+# A weight of 0 makes a lane strictly lower priority than every weighted lane.
+PRIORITY_LANES = ("high", "default", "low")
+LANE_WEIGHTS = {"high": 6, "default": 3, "low": 1}
+
+
+def _lane(priority: int) -> str:
+    """Lane for an enqueue_job priority (lower number = more urgent)."""
+    if priority <= 3:
+        return "high"
+    return "default" if priority <= 6 else "low"
 
 
 # ─── Job Types & Statuses ─────────────────────────────────────────────────────
@@ -35,6 +113,8 @@ class JobType(str, Enum):
     EXPORT_REPORT   = "export_report"
     NOTIFY          = "notify"
     SYNC_DATA       = "sync_data"
+    KPI_ROLLUP      = "kpi_rollup"
+    PRUNE_AUDIT_LOG = "prune_audit_log"
 
 
 class JobStatus(str, Enum):
@@ -46,10 +126,156 @@ class JobStatus(str, Enum):
     DEAD       = "dead"          # exhausted all retries → dead-letter
 
 
+# ─── In-memory backend (dev / tests / Redis outage) ───────────────────────────
+
+class MemoryJobBackend:
+    """
+    Process-local stand-in for the Redis structures, with the same semantics:
+    a FIFO deque per (tenant, lane) for ready jobs, a heap of delayed jobs by due
+    time, a dict index of every live (queued, delayed or running) job, and a
+    per-tenant dead-letter store.  Finished jobs and batches are kept in LRU order
+    and evicted beyond MEMORY_FINISHED_MAX / MEMORY_BATCHES_MAX, dead letters beyond
+    DEAD_LETTER_MAX, so memory stays bounded however long the process runs.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self) -> None:
+        """Forget every job, batch and idempotency key (tests)."""
+        self.live:     dict[str, dict] = {}
+        self.ready:    dict[tuple[str, str], deque] = {}               # (tenant, lane) → job ids
+        self.delayed:  list[tuple[float, int, str]] = []               # heap of (due, seq, job id)
+        self.finished: OrderedDict[str, dict] = OrderedDict()          # done jobs, LRU order
+        self.dead:     dict[str, OrderedDict[str, dict]] = {}          # tenant → id → job, oldest first
+        self.batches:  OrderedDict[str, dict] = OrderedDict()
+        self.idem:     dict[tuple[str, str], tuple[str, float]] = {}   # (tenant, key) → (job_id, expires)
+        self.tenants:  set[str] = set()
+        self.listeners: dict[str, set[asyncio.Queue]] = {}              # job id → watch_job() queues
+        self.wake = asyncio.Event()      # set on enqueue to wake idle workers
+        self._seq = 0
+
+    # enqueue / claim
+    def add(self, job: dict) -> None:
+        self.live[job["id"]] = job
+        self.tenants.add(job["tenant_id"])
+        due = _due_ts(job)
+        if due > datetime.now(timezone.utc).timestamp():
+            self._seq += 1
+            heapq.heappush(self.delayed, (due, self._seq, job["id"]))
+        else:
+            self.ready.setdefault((job["tenant_id"], _job_lane(job)), deque()).append(job["id"])
+        self.wake.set()
+
+    def add_batch(self, batch: dict) -> None:
+        self.batches[batch["batch_id"]] = batch
+        while len(self.batches) > MEMORY_BATCHES_MAX:
+            self.batches.popitem(last=False)
+
+    def release(self, job: dict) -> None:
+        """Put a claimed job back at the head of its lane (worker stopped before running it)."""
+        job["status"] = JobStatus.PENDING.value
+        self.ready.setdefault((job["tenant_id"], _job_lane(job)), deque()).appendleft(job["id"])
+        self.wake.set()
+
+    def _promote(self, now: float) -> None:
+        while self.delayed and self.delayed[0][0] <= now:
+            job = self.live.get(heapq.heappop(self.delayed)[2])
+            if job:
+                self.ready.setdefault((job["tenant_id"], _job_lane(job)), deque()).append(job["id"])
+
+    def claim(self, tenants: list[str], lanes: list[str]) -> tuple[Optional[dict], Optional[float]]:
+        """
+        Take the oldest ready job, trying `lanes` in order and `tenants` in order within
+        each lane, and mark it running.  Returns (job, None), or (None, seconds until
+        the next delayed job is due / None).
+        """
+        now = datetime.now(timezone.utc).timestamp()
+        self._promote(now)
+        for lane in lanes:
+            for tenant in tenants:
+                ids = self.ready.get((tenant, lane))
+                while ids:
+                    job = self.live.get(ids.popleft())
+                    if job:
+                        job["status"] = JobStatus.RUNNING.value
+                        return job, None
+        return None, (self.delayed[0][0] - now if self.delayed else None)
+
+    # outcomes
+    def settle(self, job: dict) -> None:
+        """File an executed job by its new status: retry → delayed, done → LRU, dead → dead letters."""
+        if job["status"] == JobStatus.RETRYING.value:
+            self.add(job)
+            return
+        self.live.pop(job["id"], None)
+        if job["status"] == JobStatus.DEAD.value:
+            dead = self.dead.setdefault(job["tenant_id"], OrderedDict())
+            dead[job["id"]] = job
+            while len(dead) > DEAD_LETTER_MAX:
+                dead.popitem(last=False)
+        else:
+            self.finished[job["id"]] = job
+            while len(self.finished) > MEMORY_FINISHED_MAX:
+                self.finished.popitem(last=False)
+
+    def revive(self, jobs: list[dict], event: str) -> None:
+        """Move dead letters back onto their lanes for another round of attempts."""
+        for job in jobs:
+            self.dead.get(job["tenant_id"], {}).pop(job["id"], None)
+            _reset_for_replay(job, event)
+            if job.get("batch_id") in self.batches:
+                self.batches[job["batch_id"]]["dead"] -= 1
+            self.add(job)
+
+    # lookups
+    def get(self, job_id: str) -> Optional[dict]:
+        job = self.live.get(job_id)
+        if job is None and job_id in self.finished:
+            self.finished.move_to_end(job_id)
+            job = self.finished[job_id]
+        if job is None:
+            job = next((d[job_id] for d in self.dead.values() if job_id in d), None)
+        return job
+
+    def dead_letters(self, tenant_id: str, job_type: Optional[str] = None, since: float = 0.0) -> list[dict]:
+        """The tenant's dead letters, newest first."""
+        return [j for j in reversed(self.dead.get(tenant_id, {}).values())
+                if (job_type is None or j["type"] == job_type) and _dead_ts(j) >= since]
+
+    # events
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=100)
+        self.listeners.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue) -> None:
+        queues = self.listeners.get(job_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.listeners[job_id]
+
+    def publish(self, job_id: str, event: str) -> None:
+        for queue in self.listeners.get(job_id, ()):
+            if not queue.full():            # a stalled listener misses events, never blocks the worker
+                queue.put_nowait(event)
+
+    def depths(self, tenant_id: str) -> dict:
+        lanes = {lane: {"ready": len(self.ready.get((tenant_id, lane), ())), "delayed": 0}
+                 for lane in PRIORITY_LANES}
+        for _, _, job_id in self.delayed:
+            job = self.live.get(job_id)
+            if job and job["tenant_id"] == tenant_id:
+                lanes[_job_lane(job)]["delayed"] += 1
+        running = sum(1 for j in self.live.values()
+                      if j["tenant_id"] == tenant_id and j["status"] == JobStatus.RUNNING.value)
+        return {"lanes": lanes, "in_flight": running, "dead": len(self.dead.get(tenant_id, ()))}
+
+
 # ─── Redis client (lazy, graceful fallback) ───────────────────────────────────
 _redis_client = None
-_memory_queue: list[dict] = []
-_memory_dead:  list[dict] = []
+_memory = MemoryJobBackend()         # used whenever Redis is unavailable
 
 
 async def _get_redis(silent: bool = False):
@@ -69,19 +295,226 @@ async def _get_redis(silent: bool = False):
         return None
 
 
-def _queue_key(tenant_id: str) -> str:
+def _queue_key(tenant_id: str, lane: str) -> str:
+    return f"cierp:jobs:{tenant_id}:{lane}"
+
+
+def _legacy_queue_key(tenant_id: str) -> str:
+    """Single pre-lane queue; still drained (last) so jobs queued before upgrading run."""
     return f"cierp:jobs:{tenant_id}"
 
 
 def _dead_key(tenant_id: str) -> str:
+    """Pre-index dead-letter list; migrated into the hash + ZSET store on first access."""
     return f"cierp:jobs:dead:{tenant_id}"
 
 
+def _dead_jobs_key(tenant_id: str) -> str:
+    return f"cierp:jobs:dead:{tenant_id}:jobs"
+
+
+def _dead_index_key(tenant_id: str, job_type: Optional[str] = None) -> str:
+    """ZSET of dead job ids scored by dead-letter time — all types, or one type."""
+    return f"cierp:jobs:dead:{tenant_id}:index" + (f":{job_type}" if job_type else "")
+
+
 def _job_key(job_id: str) -> str:
     return f"cierp:job:{job_id}"
 
 
+def _batch_key(batch_id: str) -> str:
+    return f"cierp:batch:{batch_id}"
+
+
+def _idem_key(tenant_id: str, key: str) -> str:
+    return f"cierp:jobs:{tenant_id}:idem:{key}"
+
+
+def payload_key(job_type: JobType, payload: dict) -> str:
+    """Idempotency key derived from the job type and the canonical JSON of its payload."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return f"{job_type.value}:{hashlib.sha256(canonical.encode()).hexdigest()}"
+
+
+def _delayed_key(tenant_id: str, lane: str) -> str:
+    return f"cierp:jobs:delayed:{tenant_id}:{lane}"
+
+
+def _processing_key(tenant_id: str, worker_id: str) -> str:
+    return f"cierp:jobs:{tenant_id}:processing:{worker_id}"
+
+
+def _workers_key(tenant_id: str) -> str:
+    return f"cierp:jobs:{tenant_id}:workers"
+
+
+def _recovered_key(tenant_id: str) -> str:
+    return f"cierp:jobs:{tenant_id}:recovered"
+
+
+def _wake_key(tenant_id: Optional[str]) -> str:
+    """Wake-token list of one tenant's workers, or (None) of all-tenant workers."""
+    return f"cierp:jobs:{tenant_id}:wake" if tenant_id else "cierp:jobs:wake"
+
+
+_TENANTS_KEY = "cierp:jobs:tenants"       # SET of tenants that have enqueued jobs
+
+
+def _signal_ready(pipe, tenant_id: str, n: int = 1) -> None:
+    """Queue wake-up tokens for idle workers blocked on a wake list (capped)."""
+    tokens = ["1"] * min(n, 64)
+    for key in (_wake_key(tenant_id), _wake_key(None)):
+        pipe.lpush(key, *tokens)
+        pipe.ltrim(key, 0, 255)
+
+
+def _progress_key(job_id: str) -> str:
+    return f"cierp:job:{job_id}:progress"
+
+
+def _events_channel(job_id: str) -> str:
+    return f"cierp:job:{job_id}:events"
+
+
+def _job_lane(job: dict) -> str:
+    return _lane(job.get("priority", 5))
+
+
+# ─── Lua scripts ──────────────────────────────────────────────────────────────
+_scripts: dict[str, Any] = {}
+
+
+def _script(redis, lua: str):
+    """Registered script object for `lua` on the shared client (EVALSHA with EVAL fallback)."""
+    if lua not in _scripts:
+        _scripts[lua] = redis.register_script(lua)
+    return _scripts[lua]
+
+
+# KEYS are (source list, in-flight list) pairs tried in order; move the first available
+# job into its pair's in-flight list and return {pair number, job}.  One atomic step,
+# so a job is always on exactly one list.
+_CLAIM_LUA = """
+for i = 1, #KEYS, 2 do
+    local raw = redis.call('RPOPLPUSH', KEYS[i], KEYS[i + 1])
+    if raw then return {(i + 1) / 2, raw} end
+end
+return false
+"""
+
+# Reap one worker: if its heartbeat (KEYS[1] score of ARGV[1]) is older than ARGV[2],
+# forget it and move its in-flight list KEYS[2] onto the recovered list KEYS[3].
+# Only the reaper that removes the heartbeat moves the jobs.
+_REAP_LUA = """
+local beat = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if beat and tonumber(beat) > tonumber(ARGV[2]) then return -1 end
+redis.call('ZREM', KEYS[1], ARGV[1])
+local n = 0
+while redis.call('RPOPLPUSH', KEYS[2], KEYS[3]) do n = n + 1 end
+return n
+"""
+
+
+# ─── Delayed jobs ─────────────────────────────────────────────────────────────
+PROMOTE_BATCH = 100       # due jobs moved to the ready list per round trip
+
+# KEYS are (delayed ZSET, ready list) pairs.  For each, atomically move up to ARGV[2]
+# members scored <= ARGV[1] to the list, so concurrent promoters never hand the same job
+# out twice.  Returns {1 if some pair had more due, earliest remaining due time,
+# jobs moved by pair 1, pair 2, …}.
+_PROMOTE_LUA = """
+local more, nxt, moved = 0, nil, {}
+local batch = tonumber(ARGV[2])
+for i = 1, #KEYS, 2 do
+    local due = redis.call('ZRANGEBYSCORE', KEYS[i], '-inf', ARGV[1], 'LIMIT', 0, batch)
+    if #due > 0 then
+        redis.call('ZREM', KEYS[i], unpack(due))
+        redis.call('LPUSH', KEYS[i + 1], unpack(due))
+        if #due == batch then more = 1 end
+    end
+    moved[#moved + 1] = #due
+    local head = redis.call('ZRANGE', KEYS[i], 0, 0, 'WITHSCORES')
+    if #head > 0 and (nxt == nil or tonumber(head[2]) < nxt) then nxt = tonumber(head[2]) end
+end
+return {more, tostring(nxt or ''), unpack(moved)}
+"""
+
+
+def _due_ts(job: dict) -> float:
+    """Epoch seconds at which the job becomes runnable (0 = now)."""
+    run_after = job.get("run_after")
+    return datetime.fromisoformat(run_after).timestamp() if run_after else 0.0
+
+
+async def _promote_due(redis, tenant_ids: list[str]) -> tuple[int, Optional[float]]:
+    """
+    Move every due delayed job of these tenants onto its lane's ready list.
+    Returns (jobs moved, epoch seconds of the next delayed job or None).
+    """
+    promote = _script(redis, _PROMOTE_LUA)
+    pairs = [(t, lane) for t in tenant_ids for lane in PRIORITY_LANES]
+    keys = [k for t, lane in pairs for k in (_delayed_key(t, lane), _queue_key(t, lane))]
+    per_tenant: dict[str, int] = {}
+    now = datetime.now(timezone.utc).timestamp()
+    while True:
+        more, nxt, *moved = await promote(keys=keys, args=[now, PROMOTE_BATCH])
+        for (t, _), n in zip(pairs, moved):
+            if n:
+                per_tenant[t] = per_tenant.get(t, 0) + n
+        if not more:
+            break
+    if per_tenant:
+        pipe = redis.pipeline()
+        for t, n in per_tenant.items():
+            _signal_ready(pipe, t, n)
+        await pipe.execute()
+    return sum(per_tenant.values()), (float(nxt) if nxt else None)
+
+
+def _requeue(pipe, job: dict, due: float = 0.0) -> None:
+    """Queue a job back on its lane: the delayed set if `due` is in the future, else the ready list."""
+    lane, raw = _job_lane(job), json.dumps(job)
+    if due > datetime.now(timezone.utc).timestamp():
+        pipe.zadd(_delayed_key(job["tenant_id"], lane), {raw: due})
+    else:
+        pipe.lpush(_queue_key(job["tenant_id"], lane), raw)
+        _signal_ready(pipe, job["tenant_id"])
+
+
 # ─── Public API ───────────────────────────────────────────────────────────────
+ENQUEUE_CHUNK = 1000      # jobs per pipelined round trip in enqueue_many()
+
+
+def _new_job(job_type: JobType, payload: dict, priority: int, tenant_id: str,
+             user_id: Optional[str], run_after: Optional[str], batch_id: Optional[str] = None) -> dict:
+    job = {
+        "id":         str(uuid.uuid4()),
+        "type":       job_type.value,
+        "payload":    payload,
+        "priority":   priority,
+        "tenant_id":  tenant_id,
+        "user_id":    user_id,
+        "status":     JobStatus.PENDING.value,
+        "attempts":   0,
+        "max_attempts": MAX_ATTEMPTS,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "last_error": None,
+        "history":    [],
+    }
+    if run_after:
+        job["run_after"] = run_after
+    if batch_id:
+        job["batch_id"] = batch_id
+    return job
+
+
+def _run_after(run_at: Optional[datetime]) -> Optional[str]:
+    if run_at is None:
+        return None
+    if run_at.tzinfo is None:
+        run_at = run_at.replace(tzinfo=timezone.utc)
+    return run_at.astimezone(timezone.utc).isoformat()
+
 
 async def enqueue_job(
     job_type: JobType,
@@ -90,89 +523,556 @@ async def enqueue_job(
     priority: int = 5,
     tenant_id: str = "cierp",
     user_id: Optional[str] = None,
+    run_at: Optional[datetime] = None,
+    idempotency_key: Optional[str] = None,
+    dedupe: Optional[bool] = None,
 ) -> str:
     """
     Add a job to the background queue.
+    `priority` picks the lane (1–3 high, 4–6 default, 7+ low; see PRIORITY_LANES).
+    `run_at` defers it until that time (naive datetimes are taken as UTC).
+    `idempotency_key` (or `dedupe=True`, the default for DEDUPE_BY_DEFAULT types, which
+    derives it from the payload) makes a repeat within IDEMPOTENCY_TTL return the first
+    job's id instead of queueing another — unless that job was dead-lettered.
     Returns job_id for status polling.
     """
-    import uuid
-    job_id = str(uuid.uuid4())
-    job = {
-        "id":         job_id,
-        "type":       job_type.value,
-        "payload":    payload,
-        "priority":   priority,
+    job = _new_job(job_type, payload, priority, tenant_id, user_id, _run_after(run_at))
+    job_id = job["id"]
+    if idempotency_key is None and (job_type.value in DEDUPE_BY_DEFAULT if dedupe is None else dedupe):
+        idempotency_key = payload_key(job_type, payload)
+    if idempotency_key:
+        job["idempotency_key"] = idempotency_key
+        existing = await _claim_idempotency(tenant_id, idempotency_key, job_id)
+        if existing:
+            logger.debug(f"Duplicate {job_type.value} submission → existing job {existing}")
+            return existing
+
+    try:
+        redis = await _get_redis(silent=True)
+        if redis:
+            raw, lane = json.dumps(job), _lane(priority)
+            due = _due_ts(job)
+            pipe = redis.pipeline()
+            if due > datetime.now(timezone.utc).timestamp():
+                pipe.zadd(_delayed_key(tenant_id, lane), {raw: due})
+            else:
+                pipe.lpush(_queue_key(tenant_id, lane), raw)
+                _signal_ready(pipe, tenant_id)
+            pipe.setex(_job_key(job_id), JOB_TTL, raw)
+            pipe.sadd(_TENANTS_KEY, tenant_id)
+            if idempotency_key:
+                pipe.expire(_idem_key(tenant_id, idempotency_key), IDEMPOTENCY_TTL)
+            await pipe.execute()
+        else:
+            _memory.add(job)
+    except BaseException:
+        if idempotency_key:
+            await _release_idempotency(tenant_id, idempotency_key, job_id)
+        raise
+
+    logger.debug(f"Enqueued job {job_id} type={job_type.value} tenant={tenant_id}")
+    return job_id
+
+
+# Hand the idempotency guard KEYS[1] to job ARGV[2] if it still names ARGV[1] and that
+# job (KEYS[2]) is dead-lettered (status ARGV[4]), or if it expired meanwhile.  Returns
+# the id holding the guard when the caller must not enqueue, else false — so of several
+# submissions that all saw the same dead holder exactly one replaces it.
+_IDEM_REPLACE_LUA = """
+local cur = redis.call('GET', KEYS[1])
+if cur and cur ~= ARGV[1] then return cur end
+if cur then
+    local raw = redis.call('GET', KEYS[2])
+    if not raw or cjson.decode(raw)['status'] ~= ARGV[4] then return cur end
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return false
+"""
+
+# Delete the idempotency guard KEYS[1] only if it still names job ARGV[1].
+_IDEM_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+
+async def _claim_idempotency(tenant_id: str, key: str, job_id: str) -> Optional[str]:
+    """
+    Reserve `key` for `job_id` (SET NX).  Returns the id of the job that already holds
+    it, or None if the caller should enqueue.  A dead-lettered holder is replaced.
+    The reservation lasts IDEMPOTENCY_CLAIM_TTL; the enqueue pipeline extends it to
+    IDEMPOTENCY_TTL together with writing the job, and a failed enqueue releases it.
+    """
+    redis = await _get_redis(silent=True)
+    if redis:
+        guard = _idem_key(tenant_id, key)
+        if await redis.set(guard, job_id, nx=True, ex=IDEMPOTENCY_CLAIM_TTL):
+            return None
+        existing = await redis.get(guard) or ""
+        holder = await _script(redis, _IDEM_REPLACE_LUA)(
+            keys=[guard, _job_key(existing)],
+            args=[existing, job_id, IDEMPOTENCY_CLAIM_TTL, JobStatus.DEAD.value],
+        )
+        return holder or None       # holder: still being enqueued, queued, running or done
+
+    now = time.monotonic()
+    held = _memory.idem.get((tenant_id, key))
+    if held and held[1] > now:
+        job = _memory.get(held[0])
+        if job and job["status"] != JobStatus.DEAD.value:
+            return held[0]
+    if len(_memory.idem) > 10_000:
+        for k in [k for k, (_, exp) in _memory.idem.items() if exp <= now]:
+            del _memory.idem[k]
+    _memory.idem[(tenant_id, key)] = (job_id, now + IDEMPOTENCY_TTL)
+    return None
+
+
+async def _release_idempotency(tenant_id: str, key: str, job_id: str) -> None:
+    """Give up `job_id`'s claim on `key` after its enqueue failed (no-op if it lost the guard)."""
+    try:
+        redis = await _get_redis(silent=True)
+        if redis:
+            await _script(redis, _IDEM_RELEASE_LUA)(keys=[_idem_key(tenant_id, key)], args=[job_id])
+        elif _memory.idem.get((tenant_id, key), (None,))[0] == job_id:
+            del _memory.idem[(tenant_id, key)]
+    except Exception as e:      # Redis down too: the claim expires after IDEMPOTENCY_CLAIM_TTL
+        logger.warning(f"Could not release idempotency key {key!r} of job {job_id}: {e}")
+
+
+async def enqueue_many(
+    job_type: JobType,
+    payloads: list[dict],
+    *,
+    priority: int = 5,
+    tenant_id: str = "cierp",
+    user_id: Optional[str] = None,
+    run_at: Optional[datetime] = None,
+    track: bool = True,
+) -> tuple[list[str], Optional[str]]:
+    """
+    Enqueue one job per payload (payroll runs, statement mailings …).
+    Writes go out in pipelined chunks of ENQUEUE_CHUNK: a single multi-value LPUSH
+    (or ZADD when `run_at` is in the future) plus a SETEX per job.
+    With `track`, the jobs share a batch id whose aggregate progress
+    get_batch_status() reports.  Returns (job_ids, batch_id).
+    """
+    if not payloads:
+        return [], None
+    batch_id = str(uuid.uuid4()) if track else None
+    run_after = _run_after(run_at)
+    jobs = [_new_job(job_type, p, priority, tenant_id, user_id, run_after, batch_id) for p in payloads]
+    batch = {
+        "batch_id":   batch_id,
         "tenant_id":  tenant_id,
-        "user_id":    user_id,
-        "status":     JobStatus.PENDING.value,
-        "attempts":   0,
-        "max_attempts": MAX_ATTEMPTS,
+        "type":       job_type.value,
+        "total":      len(jobs),
+        "done":       0,
+        "dead":       0,
         "created_at": datetime.now(timezone.utc).isoformat(),
-        "last_error": None,
-        "history":    [],
     }
 
     redis = await _get_redis(silent=True)
     if redis:
-        pipe = redis.pipeline()
-        pipe.lpush(_queue_key(tenant_id), json.dumps(job))
-        pipe.setex(_job_key(job_id), JOB_TTL, json.dumps(job))
-        await pipe.execute()
+        lane = _lane(priority)
+        due = _due_ts(jobs[0])
+        delayed = due > datetime.now(timezone.utc).timestamp()
+        if track:
+            await redis.hset(_batch_key(batch_id), mapping=batch)
+            await redis.expire(_batch_key(batch_id), JOB_TTL)
+        for i in range(0, len(jobs), ENQUEUE_CHUNK):
+            chunk = [json.dumps(j) for j in jobs[i:i + ENQUEUE_CHUNK]]
+            pipe = redis.pipeline(transaction=False)
+            if delayed:
+                pipe.zadd(_delayed_key(tenant_id, lane), {raw: due for raw in chunk})
+            else:
+                pipe.lpush(_queue_key(tenant_id, lane), *chunk)
+                _signal_ready(pipe, tenant_id, len(chunk))
+            for job, raw in zip(jobs[i:i + ENQUEUE_CHUNK], chunk):
+                pipe.setex(_job_key(job["id"]), JOB_TTL, raw)
+            pipe.sadd(_TENANTS_KEY, tenant_id)
+            await pipe.execute()
     else:
-        _memory_queue.append(job)
+        if track:
+            _memory.add_batch(batch)
+        for job in jobs:
+            _memory.add(job)
 
-    logger.debug(f"Enqueued job {job_id} type={job_type.value} tenant={tenant_id}")
-    return job_id
+    logger.info(f"Enqueued {len(jobs)} {job_type.value} job(s) tenant={tenant_id} batch={batch_id}")
+    return [j["id"] for j in jobs], batch_id
+
+
+async def get_batch_status(batch_id: str, tenant_id: str = "cierp") -> Optional[dict]:
+    """Aggregate progress of an enqueue_many() batch, e.g. 1850 of 2000 done."""
+    redis = await _get_redis(silent=True)
+    if redis:
+        raw = await redis.hgetall(_batch_key(batch_id))
+        batch = {k: int(v) if k in ("total", "done", "dead") else v for k, v in raw.items()} if raw else None
+    else:
+        batch = _memory.batches.get(batch_id)
+    if not batch or batch.get("tenant_id") != tenant_id:
+        return None
+    finished = batch["done"] + batch["dead"]
+    return {
+        **batch,
+        "pending":  max(batch["total"] - finished, 0),
+        "finished": finished >= batch["total"],
+        "progress": f"{batch['done']:,} / {batch['total']:,} done",
+    }
+
+
+def _count_batch_outcome(pipe, job: dict) -> None:
+    """Bump the job's batch counter once it reaches a final state (done or dead)."""
+    batch_id = job.get("batch_id")
+    if not batch_id or job["status"] not in (JobStatus.DONE.value, JobStatus.DEAD.value):
+        return
+    field = "done" if job["status"] == JobStatus.DONE.value else "dead"
+    if pipe is not None:
+        pipe.hincrby(_batch_key(batch_id), field, 1)
+    elif batch_id in _memory.batches:
+        _memory.batches[batch_id][field] += 1
 
 
 async def get_job_status(job_id: str, tenant_id: str = "cierp") -> Optional[dict]:
-    """Check the status of a queued or completed job."""
+    """Check the status of a queued or completed job; None if unknown or another tenant's."""
     redis = await _get_redis(silent=True)
     if redis:
-        raw = await redis.get(_job_key(job_id))
-        return json.loads(raw) if raw else None
-    return next((j for j in _memory_queue + _memory_dead if j["id"] == job_id), None)
+        raw, progress = await redis.mget(_job_key(job_id), _progress_key(job_id))
+        if not raw:
+            return None
+        job = json.loads(raw)
+        if job.get("tenant_id") != tenant_id:
+            return None
+        if progress and job["status"] not in _FINAL_STATUSES:
+            event = json.loads(progress)
+            job.update(status=event["status"], progress=event["progress"], progress_message=event["message"])
+        return job
+    job = _memory.get(job_id)
+    return job if job is not None and job.get("tenant_id") == tenant_id else None
+
+
+# ─── Progress & events ────────────────────────────────────────────────────────
+_FINAL_STATUSES = (JobStatus.DONE.value, JobStatus.DEAD.value)
+
+# The job the current handler task is running (set by JobWorker._execute)
+_current_job: ContextVar[Optional[dict]] = ContextVar("cierp_current_job", default=None)
+
+
+def _job_event(job: dict) -> dict:
+    event = {
+        "job_id":   job["id"],
+        "status":   job["status"],
+        "attempts": job.get("attempts", 0),
+        "progress": job.get("progress"),
+        "message":  job.get("progress_message"),
+        "at":       datetime.now(timezone.utc).isoformat(),
+    }
+    if job["status"] == JobStatus.DONE.value and "result" in job:
+        event["result"] = job["result"]
+    elif job["status"] != JobStatus.RUNNING.value and job.get("last_error"):
+        event["error"] = job["last_error"]
+    return event
 
 
-async def get_dead_letters(tenant_id: str = "cierp", limit: int = 50) -> list[dict]:
-    """Retrieve dead-lettered jobs for inspection."""
+async def report_progress(pct: float, message: Optional[str] = None) -> None:
+    """
+    Report progress (0–100) of the job the calling handler is running, e.g.
+        await report_progress(40, "Payslips 400 / 1,000")
+    Subscribers of /jobs/stream/{job_id} get it at once; get_job_status shows the
+    latest value.  Repeats of the last value are dropped.  No-op outside a job
+    handler — including cpu_bound handlers, which run in another process.
+    """
+    job = _current_job.get()
+    if job is None:
+        return
+    pct = round(min(max(float(pct), 0.0), 100.0), 1)
+    if pct == job.get("progress") and message in (None, job.get("progress_message")):
+        return
+    job["progress"] = pct
+    if message is not None:
+        job["progress_message"] = message
+    event = json.dumps(_job_event(job))
     redis = await _get_redis(silent=True)
     if redis:
-        items = await redis.lrange(_dead_key(tenant_id), 0, limit - 1)
-        return [json.loads(i) for i in items]
-    return [j for j in _memory_dead if j.get("tenant_id") == tenant_id][:limit]
+        pipe = redis.pipeline(transaction=False)
+        pipe.setex(_progress_key(job["id"]), JOB_TTL, event)
+        pipe.publish(_events_channel(job["id"]), event)
+        await pipe.execute()
+    else:
+        _memory.publish(job["id"], event)
 
 
-async def retry_dead_letter(job_id: str, tenant_id: str = "cierp") -> bool:
-    """Re-enqueue a dead-lettered job for another attempt."""
-    dead = await get_dead_letters(tenant_id, limit=200)
-    job = next((j for j in dead if j["id"] == job_id), None)
-    if not job:
-        return False
+async def watch_job(job_id: str, tenant_id: str = "cierp") -> AsyncIterator[Optional[dict]]:
+    """
+    The job's current state, then each progress / outcome event until it is done or
+    dead.  Yields None after STREAM_KEEPALIVE seconds without an event (so callers can
+    keep connections alive and notice disconnects).  Yields nothing for an unknown job
+    or another tenant's.
+    """
+    redis = await _get_redis(silent=True)
+    if not redis:
+        queue = _memory.subscribe(job_id)
+        try:
+            job = _memory.get(job_id)
+            if job is None or job.get("tenant_id") != tenant_id:
+                return
+            yield _job_event(job)
+            status = job["status"]
+            while status not in _FINAL_STATUSES:
+                try:
+                    event = json.loads(await asyncio.wait_for(queue.get(), STREAM_KEEPALIVE))
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                status = event["status"]
+                yield event
+        finally:
+            _memory.unsubscribe(job_id, queue)
+        return
+
+    pubsub = redis.pubsub()
+    await pubsub.subscribe(_events_channel(job_id))
+    try:
+        job = await get_job_status(job_id, tenant_id)   # read after SUBSCRIBE so no event slips between
+        if job is None:
+            return
+        yield _job_event(job)
+        status = job["status"]
+        while status not in _FINAL_STATUSES:
+            msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=STREAM_KEEPALIVE)
+            if msg is None:
+                yield None
+                continue
+            event = json.loads(msg["data"])
+            status = event["status"]
+            yield event
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+
+
+# ─── Dead letters ─────────────────────────────────────────────────────────────
+
+def _dead_since(since: Optional[datetime]) -> float:
+    if since is None:
+        return 0.0
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return since.timestamp()
+
+
+def _dead_ts(job: dict) -> float:
+    dead_at = job.get("dead_at")
+    return datetime.fromisoformat(dead_at).timestamp() if dead_at else datetime.now(timezone.utc).timestamp()
+
+
+def _store_dead(pipe, job: dict) -> None:
+    """Queue the writes that file `job` in its tenant's dead-letter hash and indexes."""
+    tenant, ts = job["tenant_id"], _dead_ts(job)
+    pipe.hset(_dead_jobs_key(tenant), job["id"], json.dumps(job))
+    pipe.zadd(_dead_index_key(tenant), {job["id"]: ts})
+    pipe.zadd(_dead_index_key(tenant, job["type"]), {job["id"]: ts})
+
+
+def _reset_for_replay(job: dict, event: str) -> dict:
     job["status"]   = JobStatus.PENDING.value
     job["attempts"] = 0
     job["last_error"] = None
-    job["history"].append({"event": "manually_retried", "at": datetime.now(timezone.utc).isoformat()})
+    job.pop("run_after", None)
+    job["history"].append({"event": event, "at": datetime.now(timezone.utc).isoformat()})
+    return job
+
+
+# Take a job out of the dead-letter store and back onto its lane — only if this call's
+# HDEL removed it, so concurrent replays / retries of one dead letter re-enqueue it once.
+# KEYS: dead hash, index, type index, lane list, job key[, batch hash]
+# ARGV: job id, reset job JSON, JOB_TTL.  Returns 1 if re-enqueued, 0 if already taken.
+_UNFILE_DEAD_LUA = """
+if redis.call('HDEL', KEYS[1], ARGV[1]) == 0 then return 0 end
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('ZREM', KEYS[3], ARGV[1])
+redis.call('LPUSH', KEYS[4], ARGV[2])
+redis.call('SETEX', KEYS[5], ARGV[3], ARGV[2])
+if KEYS[6] then redis.call('HINCRBY', KEYS[6], 'dead', -1) end
+return 1
+"""
+
 
+async def _unfile_dead(redis, pipe, job: dict) -> None:
+    """Queue on `pipe` the atomic move of `job` out of the dead-letter store (result: 1/0)."""
+    tenant = job["tenant_id"]
+    keys = [_dead_jobs_key(tenant), _dead_index_key(tenant), _dead_index_key(tenant, job["type"]),
+            _queue_key(tenant, _job_lane(job)), _job_key(job["id"])]
+    if job.get("batch_id"):
+        keys.append(_batch_key(job["batch_id"]))
+    await _script(redis, _UNFILE_DEAD_LUA)(keys=keys, args=[job["id"], json.dumps(job), JOB_TTL], client=pipe)
+
+
+async def _migrate_legacy_dead(redis, tenant_id: str) -> None:
+    """Move a pre-index dead-letter list into the hash + ZSET store (runs once per tenant)."""
+    items = await redis.lrange(_dead_key(tenant_id), 0, -1)
+    if not items:
+        return
+    pipe = redis.pipeline(transaction=True)
+    for raw in items:
+        job = json.loads(raw)
+        job.setdefault("tenant_id", tenant_id)
+        ts = _dead_ts(job)
+        pipe.hset(_dead_jobs_key(tenant_id), job["id"], raw)
+        pipe.zadd(_dead_index_key(tenant_id), {job["id"]: ts})
+        pipe.zadd(_dead_index_key(tenant_id, job["type"]), {job["id"]: ts})
+    pipe.delete(_dead_key(tenant_id))
+    await pipe.execute()
+    logger.info(f"Moved {len(items)} legacy dead letter(s) of tenant={tenant_id} to the indexed store")
+
+
+async def get_dead_letters(tenant_id: str = "cierp", limit: int = 50, offset: int = 0,
+                           job_type: Optional[str] = None) -> list[dict]:
+    """Dead-lettered jobs for inspection, newest first (one ZREVRANGE + HMGET per page)."""
     redis = await _get_redis(silent=True)
     if redis:
-        pipe = redis.pipeline()
-        pipe.lpush(_queue_key(tenant_id), json.dumps(job))
-        pipe.setex(_job_key(job_id), JOB_TTL, json.dumps(job))
-        # Remove from dead list
-        raw_dead = await redis.lrange(_dead_key(tenant_id), 0, -1)
-        for raw in raw_dead:
-            j = json.loads(raw)
-            if j["id"] == job_id:
-                await redis.lrem(_dead_key(tenant_id), 1, raw)
-                break
-        await pipe.execute()
-    else:
-        _memory_dead[:] = [j for j in _memory_dead if j["id"] != job_id]
-        _memory_queue.append(job)
+        await _migrate_legacy_dead(redis, tenant_id)
+        ids = await redis.zrevrange(_dead_index_key(tenant_id, job_type), offset, offset + limit - 1)
+        if not ids:
+            return []
+        return [json.loads(raw) for raw in await redis.hmget(_dead_jobs_key(tenant_id), ids) if raw]
+    return _memory.dead_letters(tenant_id, job_type)[offset:offset + limit]
+
+
+async def count_dead_letters(tenant_id: str = "cierp", job_type: Optional[str] = None) -> int:
+    redis = await _get_redis(silent=True)
+    if redis:
+        await _migrate_legacy_dead(redis, tenant_id)
+        return await redis.zcard(_dead_index_key(tenant_id, job_type))
+    return len(_memory.dead_letters(tenant_id, job_type))
+
+
+async def retry_dead_letter(job_id: str, tenant_id: str = "cierp") -> bool:
+    """Re-enqueue a dead-lettered job for another attempt (O(1) lookup and removal)."""
+    redis = await _get_redis(silent=True)
+    if redis:
+        await _migrate_legacy_dead(redis, tenant_id)
+        raw = await redis.hget(_dead_jobs_key(tenant_id), job_id)
+        if not raw:
+            return False
+        job = _reset_for_replay(json.loads(raw), "manually_retried")
+        job["tenant_id"] = tenant_id
+        pipe = redis.pipeline(transaction=True)
+        await _unfile_dead(redis, pipe, job)
+        _signal_ready(pipe, tenant_id)
+        moved, *_ = await pipe.execute()
+        return bool(moved)      # 0: a concurrent retry / replay took it first
+
+    job = _memory.dead.get(tenant_id, {}).get(job_id)
+    if not job:
+        return False
+    _memory.revive([job], "manually_retried")
     return True
 
 
+async def replay_dead_letters(tenant_id: str = "cierp", job_type: Optional[str] = None,
+                              since: Optional[datetime] = None, limit: Optional[int] = None) -> int:
+    """
+    Re-enqueue every dead letter (optionally only of `job_type`, dead-lettered at or after
+    `since`), oldest first, in pipelined chunks of ENQUEUE_CHUNK.  Returns how many were replayed.
+    """
+    start = _dead_since(since)
+    redis = await _get_redis(silent=True)
+    if not redis:
+        jobs = list(reversed(_memory.dead_letters(tenant_id, job_type, start)))[:limit]
+        _memory.revive(jobs, "replayed")
+        return len(jobs)
+
+    await _migrate_legacy_dead(redis, tenant_id)
+    ids = await redis.zrangebyscore(_dead_index_key(tenant_id, job_type), start, "+inf",
+                                    start=0 if limit else None, num=limit)
+    replayed = 0
+    for i in range(0, len(ids), ENQUEUE_CHUNK):
+        chunk = ids[i:i + ENQUEUE_CHUNK]
+        raws = await redis.hmget(_dead_jobs_key(tenant_id), chunk)
+        pipe = redis.pipeline(transaction=True)
+        n = 0
+        for raw in raws:
+            if raw:
+                job = _reset_for_replay(json.loads(raw), "replayed")
+                job["tenant_id"] = tenant_id
+                await _unfile_dead(redis, pipe, job)
+                n += 1
+        if n:
+            _signal_ready(pipe, tenant_id, n)
+            moved = await pipe.execute()
+            n = sum(moved[:n])      # entries a concurrent retry / replay took first count 0
+        replayed += n
+    logger.info(f"Replayed {replayed} dead letter(s) tenant={tenant_id} type={job_type or '*'}")
+    return replayed
+
+
+async def _trim_dead_letters(redis, tenant_id: str) -> int:
+    """Drop the oldest dead letters beyond DEAD_LETTER_MAX."""
+    excess = await redis.zcard(_dead_index_key(tenant_id)) - DEAD_LETTER_MAX
+    if excess <= 0:
+        return 0
+    ids = await redis.zrange(_dead_index_key(tenant_id), 0, excess - 1)
+    raws = await redis.hmget(_dead_jobs_key(tenant_id), ids)
+    pipe = redis.pipeline(transaction=True)
+    for job_id, raw in zip(ids, raws):
+        pipe.zrem(_dead_index_key(tenant_id), job_id)
+        if raw:
+            pipe.zrem(_dead_index_key(tenant_id, json.loads(raw)["type"]), job_id)
+    pipe.hdel(_dead_jobs_key(tenant_id), *ids)
+    await pipe.execute()
+    return len(ids)
+
+
+# Per-tenant queue depths as last sampled by a worker in this process (see queue_metrics)
+_queue_stats: dict[str, dict] = {}
+_queue_stats_at: Optional[str] = None
+
+
+def queue_metrics() -> dict:
+    """
+    Per-tenant ready / delayed / in-flight job counts for get_metrics().
+    With Redis this is the snapshot the local worker takes on each housekeeping tick
+    (empty when this process runs no worker); in memory it is computed on the spot.
+    """
+    if _redis_client is not None:
+        return {"backend": "redis", "sampled_at": _queue_stats_at, "tenants": dict(_queue_stats)}
+    tenants: dict[str, dict] = {}
+    for tenant in sorted(_memory.tenants):
+        d = _memory.depths(tenant)
+        tenants[tenant] = {"ready":     sum(lane["ready"] for lane in d["lanes"].values()),
+                           "delayed":   sum(lane["delayed"] for lane in d["lanes"].values()),
+                           "in_flight": d["in_flight"]}
+    return {"backend": "memory", "sampled_at": datetime.now(timezone.utc).isoformat(), "tenants": tenants}
+
+
+async def get_queue_depths(tenant_id: str = "cierp") -> dict:
+    """Ready / delayed job counts per priority lane, plus the dead-letter count."""
+    redis = await _get_redis(silent=True)
+    if redis:
+        pipe = redis.pipeline()
+        for lane in PRIORITY_LANES:
+            pipe.llen(_queue_key(tenant_id, lane))
+            pipe.zcard(_delayed_key(tenant_id, lane))
+        pipe.llen(_legacy_queue_key(tenant_id))
+        pipe.llen(_recovered_key(tenant_id))
+        pipe.zrange(_workers_key(tenant_id), 0, -1)
+        pipe.zcard(_dead_index_key(tenant_id))
+        counts = await pipe.execute()
+        lanes = {lane: {"ready": counts[2 * i], "delayed": counts[2 * i + 1]}
+                 for i, lane in enumerate(PRIORITY_LANES)}
+        lanes["default"]["ready"] += counts[-4]
+        workers = counts[-2]
+        pipe = redis.pipeline()
+        for w in workers:
+            pipe.llen(_processing_key(tenant_id, w))
+        in_flight = sum(await pipe.execute()) if workers else 0
+        return {"backend": "redis", "lanes": lanes, "recovered": counts[-3],
+                "workers": len(workers), "in_flight": in_flight, "dead": counts[-1]}
+
+    return {"backend": "memory", "recovered": 0, "workers": None, **_memory.depths(tenant_id)}
+
+
 # ─── Job Worker ───────────────────────────────────────────────────────────────
 
 class JobWorker:
@@ -180,73 +1080,362 @@ class JobWorker:
     Async worker loop. Processes jobs from the Redis queue.
     Handles retries with exponential back-off, dead-lettering after max_attempts.
 
+    Serves one tenant, or with tenant_id=None every tenant that has enqueued jobs
+    (discovered from cierp:jobs:tenants on each housekeeping tick).
+
+    Up to `concurrency` jobs run at once as asyncio tasks, and at most
+    `tenant_concurrency` of them for any one tenant (default: half the pool when
+    serving all tenants), so one tenant's bulk export cannot take every slot.
+    When nothing is claimable the worker blocks on its wake list (or an in-memory
+    wake-up event) for up to `poll_interval` seconds, so an idle worker picks up
+    a new job as soon as it is enqueued.
+
+    Each claim is one atomic script over, in order: the recovered lists, then the
+    lanes in smooth weighted round-robin order over `lane_weights` (default
+    LANE_WEIGHTS), then the legacy lists; within each of those, tenants are
+    tried round-robin starting after the last tenant served.  With every lane
+    busy, high/default/low get 6/3/1 of the claims; an empty lane is simply
+    skipped, so urgent jobs are picked up first whenever bulk lanes are idle.
+
+    A claimed job sits in this worker's in-flight list until its outcome is
+    recorded; the worker heartbeats every tick and reaps workers that have gone
+    silent for VISIBILITY_TIMEOUT.  Handlers run under JOB_TIMEOUTS.
+
+    Delayed jobs (retry back-off, run_at) wait in a ZSET; the housekeeping task
+    moves them to the ready list when due and otherwise sleeps until the next
+    due time (re-checking at least every `poll_interval`).
+
+    stop() stops taking new jobs; run() then waits up to `drain_timeout` seconds
+    for in-flight jobs to finish, cancels the rest and hands them back to the
+    queue before returning.  Housekeeping keeps heartbeating until the drain
+    ends, so other workers never reap jobs that are still draining, however
+    long `drain_timeout` is.
+
     Usage in production:
-      worker = JobWorker(tenant_id="cierp")
+      worker = JobWorker(tenant_id=None, concurrency=8)     # all tenants
       asyncio.create_task(worker.run())          # inside lifespan or separate process
     """
 
-    def __init__(self, tenant_id: str = "cierp", poll_interval: float = 2.0):
+    def __init__(self, tenant_id: Optional[str] = "cierp", poll_interval: float = 2.0,
+                 concurrency: int = 4, drain_timeout: float = 30.0,
+                 lane_weights: Optional[dict[str, int]] = None,
+                 tenant_concurrency: Optional[int] = None):
         self.tenant_id     = tenant_id
         self.poll_interval = poll_interval
+        self.concurrency   = max(1, concurrency)
+        self.drain_timeout = drain_timeout
+        self.lane_weights  = {**LANE_WEIGHTS, **(lane_weights or {})}
+        if not tenant_concurrency:
+            tenant_concurrency = self.concurrency if tenant_id else max(1, self.concurrency // 2)
+        self.tenant_concurrency = min(tenant_concurrency, self.concurrency)
+        self.worker_id     = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
         self._running      = False
+        self._in_flight: set[asyncio.Task] = set()
+        self._wrr = {lane: 0 for lane in PRIORITY_LANES}
+        self._tenants: list[str] = [tenant_id] if tenant_id else []
+        self._tenant_load: dict[str, int] = {}
+        self._rr = 0                        # round-robin cursor into _tenants
+        self._last_reap = 0.0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    def _processing(self, tenant_id: str) -> str:
+        return _processing_key(tenant_id, self.worker_id)
 
     async def run(self):
-        """Main worker loop — runs until stop() is called."""
+        """Main worker loop — runs until stop() is called, then drains in-flight jobs."""
         self._running = True
-        logger.info(f"JobWorker started for tenant={self.tenant_id}")
+        slots = asyncio.Semaphore(self.concurrency)
+        redis = await _get_redis(silent=True)
+        if redis:
+            await self._refresh_tenants(redis)
+            await self._heartbeat(redis)
+        housekeeping = asyncio.create_task(self._housekeeping_loop())
+        logger.info(f"JobWorker {self.worker_id} started for tenant={self.tenant_id or '*'} "
+                    f"concurrency={self.concurrency} per-tenant={self.tenant_concurrency}")
         while self._running:
+            await slots.acquire()
+            if not self._running:           # stopped while waiting for a free slot
+                slots.release()
+                break
             try:
-                processed = await self._process_one()
-                if not processed:
-                    await asyncio.sleep(self.poll_interval)
+                job, redis, raw = await self._next_job()
             except Exception as e:
+                slots.release()
                 logger.error(f"JobWorker loop error: {e}")
                 await asyncio.sleep(self.poll_interval)
+                continue
+            if job is None:
+                slots.release()
+                continue
+            tenant = job["tenant_id"]
+            self._tenant_load[tenant] = self._tenant_load.get(tenant, 0) + 1
+            task = asyncio.create_task(self._run_job(job, redis, raw, slots))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+        try:
+            await self._drain()
+        finally:
+            housekeeping.cancel()
+        await self._release_claims()
         logger.info("JobWorker stopped.")
 
     def stop(self):
+        """Stop taking new jobs; run() returns once in-flight jobs have drained."""
         self._running = False
-
-    async def _process_one(self) -> bool:
-        """Pop and execute one job from the queue. Returns True if a job was processed."""
+        _memory.wake.set()      # wake an idle in-memory dequeue
+
+    async def _drain(self):
+        if not self._in_flight:
+            return
+        logger.info(f"JobWorker draining {len(self._in_flight)} in-flight job(s)...")
+        done, pending = await asyncio.wait(set(self._in_flight), timeout=self.drain_timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning(f"JobWorker drain timed out — cancelled {len(pending)} job(s)")
+
+    async def _release_claims(self):
+        """Hand jobs still claimed by this worker (cancelled on drain) back to the queue."""
         redis = await _get_redis(silent=True)
+        if not redis:
+            return
+        future = datetime.now(timezone.utc).timestamp() + 1e9
+        reap = _script(redis, _REAP_LUA)
+        for tenant in self._tenants:
+            try:
+                n = await reap(keys=[_workers_key(tenant), self._processing(tenant), _recovered_key(tenant)],
+                               args=[self.worker_id, future])
+                if n > 0:
+                    pipe = redis.pipeline()
+                    _signal_ready(pipe, tenant, n)
+                    await pipe.execute()
+                    logger.info(f"JobWorker returned {n} unfinished job(s) of tenant={tenant} to the queue")
+            except Exception as e:
+                logger.error(f"JobWorker could not release its claims for tenant={tenant}: {e}")
 
-        if redis:
-            raw = await redis.rpop(_queue_key(self.tenant_id))
-            if not raw:
-                return False
-            job = json.loads(raw)
+    # ─── Housekeeping: tenants, heartbeat, delayed-job promotion, reaping ─────
+
+    async def _refresh_tenants(self, redis):
+        if self.tenant_id:
+            await redis.sadd(_TENANTS_KEY, self.tenant_id)
         else:
-            # Memory fallback
-            pending = [j for j in _memory_queue if j["status"] == JobStatus.PENDING.value
-                       and j.get("tenant_id") == self.tenant_id]
-            if not pending:
-                return False
-            job = pending[0]
-
-        # Check if job has a scheduled retry delay
-        run_after = job.get("run_after")
-        if run_after:
-            if datetime.now(timezone.utc).isoformat() < run_after:
-                # Not ready yet — re-enqueue at front
+            self._tenants = sorted(await redis.smembers(_TENANTS_KEY))
+
+    async def _heartbeat(self, redis):
+        now = datetime.now(timezone.utc).timestamp()
+        pipe = redis.pipeline()
+        for tenant in self._tenants:
+            pipe.zadd(_workers_key(tenant), {self.worker_id: now})
+        await pipe.execute()
+
+    async def _housekeeping_loop(self):
+        """
+        Heartbeat, promote due delayed jobs, reap dead workers; sleep until the next due job.
+        Runs until run() cancels it after the drain.
+        """
+        while True:
+            delay = self.poll_interval
+            try:
+                redis = await _get_redis(silent=True)
                 if redis:
-                    await redis.rpush(_queue_key(self.tenant_id), json.dumps(job))
-                return False
+                    await self._refresh_tenants(redis)
+                    await self._heartbeat(redis)
+                    _, next_due = await _promote_due(redis, self._tenants)
+                    if time.monotonic() - self._last_reap >= REAP_INTERVAL:
+                        self._last_reap = time.monotonic()
+                        await self._reap(redis)
+                        for tenant in self._tenants:
+                            await _trim_dead_letters(redis, tenant)
+                    await self._sample_depths(redis)
+                    if next_due is not None:
+                        delay = min(delay, max(next_due - datetime.now(timezone.utc).timestamp(), 0.05))
+            except Exception as e:
+                logger.error(f"JobWorker housekeeping error: {e}")
+            await asyncio.sleep(delay)
+
+    async def _reap(self, redis) -> int:
+        """Re-queue the in-flight jobs of workers whose heartbeat is older than VISIBILITY_TIMEOUT."""
+        cutoff = datetime.now(timezone.utc).timestamp() - VISIBILITY_TIMEOUT
+        reap, total = _script(redis, _REAP_LUA), 0
+        for tenant in self._tenants:
+            stale = await redis.zrangebyscore(_workers_key(tenant), "-inf", cutoff)
+            for worker_id in stale:
+                if worker_id == self.worker_id:
+                    continue
+                n = await reap(keys=[_workers_key(tenant), _processing_key(tenant, worker_id),
+                                     _recovered_key(tenant)],
+                               args=[worker_id, cutoff])
+                if n > 0:
+                    total += n
+                    pipe = redis.pipeline()
+                    _signal_ready(pipe, tenant, n)
+                    await pipe.execute()
+                    logger.warning(f"Worker {worker_id} missed its heartbeat — "
+                                   f"re-queued {n} in-flight job(s) of tenant={tenant}")
+        return total
+
+    async def _sample_depths(self, redis):
+        """Record per-tenant queue depths for queue_metrics() / get_metrics()."""
+        global _queue_stats_at
+        pipe = redis.pipeline()
+        for tenant in self._tenants:
+            for lane in PRIORITY_LANES:
+                pipe.llen(_queue_key(tenant, lane))
+                pipe.zcard(_delayed_key(tenant, lane))
+            pipe.llen(_recovered_key(tenant))
+            pipe.llen(_legacy_queue_key(tenant))
+        counts = await pipe.execute()
+        step = 2 * len(PRIORITY_LANES) + 2
+        for i, tenant in enumerate(self._tenants):
+            c = counts[i * step:(i + 1) * step]
+            _queue_stats[tenant] = {
+                "ready":     sum(c[0:-2:2]) + c[-2] + c[-1],
+                "delayed":   sum(c[1:-2:2]),
+                "in_flight": self._tenant_load.get(tenant, 0),
+            }
+        _queue_stats_at = datetime.now(timezone.utc).isoformat()
+
+    # ─── Claiming ────────────────────────────────────────────────────────────
+
+    def _lane_order(self) -> list[str]:
+        """Smooth weighted round-robin: the lane tried first this claim, then the rest by urgency."""
+        total = sum(self.lane_weights.values())
+        for lane in PRIORITY_LANES:
+            self._wrr[lane] += self.lane_weights.get(lane, 0)
+        first = max(PRIORITY_LANES, key=lambda lane: self._wrr[lane])
+        self._wrr[first] -= total
+        return [first] + [lane for lane in PRIORITY_LANES if lane != first]
+
+    def _tenant_order(self) -> list[str]:
+        """Tenants below their concurrency cap, starting after the one served last."""
+        n = len(self._tenants)
+        start = self._rr % n if n else 0
+        ordered = self._tenants[start:] + self._tenants[:start]
+        return [t for t in ordered if self._tenant_load.get(t, 0) < self.tenant_concurrency]
+
+    def _served(self, tenant: str):
+        if tenant in self._tenants:
+            self._rr = self._tenants.index(tenant) + 1
+
+    async def _wait_for_capacity(self):
+        """Nothing claimable outside capped tenants: wait for one of our jobs to finish."""
+        if self._in_flight:
+            await asyncio.wait(set(self._in_flight), timeout=self.poll_interval,
+                               return_when=asyncio.FIRST_COMPLETED)
+        else:
+            await asyncio.sleep(self.poll_interval)
+
+    async def _run_job(self, job: dict, redis, raw: Optional[str], slots: asyncio.Semaphore):
+        try:
+            await self._execute(job, redis, raw)
+        except asyncio.CancelledError:
+            if not redis:
+                _memory.release(job)        # Redis claims are released by _release_claims
+            raise
+        except Exception as e:
+            logger.error(f"Job {job.get('id')} crashed outside its handler: {e}")
+        finally:
+            tenant = job["tenant_id"]
+            self._tenant_load[tenant] = self._tenant_load.get(tenant, 1) - 1
+            slots.release()
+
+    async def _next_job(self) -> tuple[Optional[dict], Any, Optional[str]]:
+        """
+        Claim the next runnable job, blocking up to poll_interval when there is none.
+        Returns (job, redis, raw claimed entry) or (None, redis, None).
+        """
+        redis = await _get_redis(silent=True)
+        lanes = self._lane_order()
+
+        if not redis:
+            if not self.tenant_id:
+                self._tenants = sorted(_memory.tenants)
+            tenants = self._tenant_order()
+            job, next_due = _memory.claim(tenants, lanes)
+            if job is None and len(tenants) < len(self._tenants):
+                await self._wait_for_capacity()
+            elif job is None:
+                _memory.wake.clear()
+                timeout = self.poll_interval if next_due is None else min(self.poll_interval, next_due)
+                try:
+                    await asyncio.wait_for(_memory.wake.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                self._served(job["tenant_id"])
+            return job, None, None
+
+        tenants = self._tenant_order()
+        sources = ([(t, _recovered_key(t)) for t in tenants]
+                   + [(t, _queue_key(t, lane)) for lane in lanes for t in tenants]
+                   + [(t, _legacy_queue_key(t)) for t in tenants])
+        claimed = None
+        if sources:
+            keys = [k for t, src in sources for k in (src, self._processing(t))]
+            claimed = await _script(redis, _CLAIM_LUA)(keys=keys)
+        if not claimed:
+            if len(tenants) < len(self._tenants):
+                await self._wait_for_capacity()
+            else:
+                await redis.brpop(_wake_key(self.tenant_id), timeout=max(1, int(self.poll_interval)))
+            return None, redis, None
+        tenant, raw = sources[int(claimed[0]) - 1][0], claimed[1]
+        job = json.loads(raw)
+        job["tenant_id"] = tenant
+        self._served(tenant)
+
+        # Jobs pushed with a future run_after by older code go to the delayed set
+        due = _due_ts(job)
+        if due > datetime.now(timezone.utc).timestamp():
+            pipe = redis.pipeline(transaction=True)
+            _requeue(pipe, job, due)
+            pipe.lrem(self._processing(tenant), 1, raw)
+            await pipe.execute()
+            return None, redis, None
+        return job, redis, raw
 
-        await self._execute(job, redis)
+    async def _process_one(self) -> bool:
+        """Claim and execute one job inline. Returns True if a job was processed."""
+        job, redis, raw = await self._next_job()
+        if job is None:
+            return False
+        await self._execute(job, redis, raw)
         return True
 
-    async def _execute(self, job: dict, redis):
-        """Execute a job, handle retries and dead-lettering on failure."""
+    async def _execute(self, job: dict, redis, raw: Optional[str] = None):
+        """
+        Execute a job, handle retries and dead-lettering on failure.
+        With Redis the outcome (requeue / dead-letter / status) and the removal of
+        `raw` from the in-flight list are written in one MULTI transaction.
+        """
+        tenant = job["tenant_id"]
         job["status"]     = JobStatus.RUNNING.value
         job["attempts"]   = job.get("attempts", 0) + 1
         job["started_at"] = datetime.now(timezone.utc).isoformat()
+        job.pop("progress", None)
+        job.pop("progress_message", None)
+        pipe = redis.pipeline(transaction=True) if redis else None
+        timeout = JOB_TIMEOUTS.get(job["type"], DEFAULT_JOB_TIMEOUT)
 
         try:
-            await _dispatch(job["type"], job["payload"])
+            current = _current_job.set(job)
+            try:
+                result = await asyncio.wait_for(_dispatch(job["type"], job["payload"]), timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"handler timed out after {timeout}s") from None
+            finally:
+                _current_job.reset(current)
+            if isinstance(result, (str, int, float, bool, dict, list)):
+                job["result"] = result
             job["status"]       = JobStatus.DONE.value
             job["completed_at"] = datetime.now(timezone.utc).isoformat()
             job["last_error"]   = None
+            if job.get("progress") is not None:
+                job["progress"] = 100.0
             logger.info(f"Job {job['id']} type={job['type']} done (attempt {job['attempts']})")
 
         except Exception as e:
@@ -262,55 +1451,143 @@ class JobWorker:
             if job["attempts"] < job.get("max_attempts", MAX_ATTEMPTS):
                 # Schedule retry with delay
                 delay = RETRY_DELAY_SECONDS[min(job["attempts"], len(RETRY_DELAY_SECONDS) - 1)]
-                run_after = datetime.fromtimestamp(
-                    datetime.now(timezone.utc).timestamp() + delay, tz=timezone.utc
-                ).isoformat()
+                due = datetime.now(timezone.utc).timestamp() + delay
                 job["status"]    = JobStatus.RETRYING.value
-                job["run_after"] = run_after
+                job["run_after"] = datetime.fromtimestamp(due, tz=timezone.utc).isoformat()
                 logger.info(f"Job {job['id']} scheduled for retry in {delay}s")
-                if redis:
-                    await redis.lpush(_queue_key(self.tenant_id), json.dumps(job))
-                else:
-                    _memory_queue.append(job)
+                if pipe:
+                    _requeue(pipe, job, due)
             else:
                 # Dead-letter: exhausted all retries
                 job["status"]       = JobStatus.DEAD.value
                 job["dead_at"]      = datetime.now(timezone.utc).isoformat()
                 logger.error(f"Job {job['id']} dead-lettered after {job['attempts']} attempts")
-                if redis:
-                    await redis.lpush(_dead_key(self.tenant_id), json.dumps(job))
-                    await redis.ltrim(_dead_key(self.tenant_id), 0, 999)  # keep last 1000
-                else:
-                    _memory_dead.append(job)
-
-        # Always update the status key
-        if redis:
-            await redis.setex(_job_key(job["id"]), JOB_TTL, json.dumps(job))
+                if pipe:
+                    _store_dead(pipe, job)
+
+        _count_batch_outcome(pipe, job)
+
+        # Always update the status key and tell watchers
+        event = json.dumps(_job_event(job))
+        if pipe:
+            pipe.setex(_job_key(job["id"]), JOB_TTL, json.dumps(job))
+            pipe.delete(_progress_key(job["id"]))
+            pipe.publish(_events_channel(job["id"]), event)
+            if raw is not None:
+                pipe.lrem(self._processing(tenant), 1, raw)
+            await pipe.execute()
         else:
-            for i, j in enumerate(_memory_queue):
-                if j["id"] == job["id"]:
-                    _memory_queue[i] = job
-                    break
+            _memory.settle(job)
+            _memory.publish(job["id"], event)
+
 
+# ─── Job Handlers ────────────────────────────────────────────────────────────
+# job type → (handler, cpu_bound).  Async handlers run on the worker's event loop;
+# cpu_bound handlers are plain module-level functions run in the process pool.
+#
+# cpu_bound contract: the handler is a synchronous top-level function (picklable by
+# reference) taking the job payload and returning None or a picklable value.  Payloads
+# are JSON by construction (they are json.dumps'ed on enqueue), so they always pickle;
+# pass plain data — ids, dicts, lists — never ORM objects, sessions or clients.
+_handlers: dict[str, tuple[Callable, bool]] = {}
+
+
+def job_handler(job_type: JobType, *, cpu_bound: bool = False):
+    """
+    Register the handler for a job type:
+
+        @job_handler(JobType.GENERATE_PDF, cpu_bound=True)
+        def _render_pdf(payload: dict) -> None: ...
+    """
+    def register(fn: Callable) -> Callable:
+        if cpu_bound:
+            if asyncio.iscoroutinefunction(fn):
+                raise TypeError(f"cpu_bound handler {fn.__qualname__} must be a plain function")
+            if "<locals>" in fn.__qualname__ or "<lambda>" in fn.__qualname__:
+                raise TypeError(f"cpu_bound handler {fn.__qualname__} must be defined at module level")
+        elif not asyncio.iscoroutinefunction(fn):
+            raise TypeError(f"handler {fn.__qualname__} must be async (or declare cpu_bound=True)")
+        _handlers[job_type.value] = (fn, cpu_bound)
+        return fn
+    return register
 
-# ─── Job Dispatchers ─────────────────────────────────────────────────────────
 
 async def _dispatch(job_type: str, payload: dict):
-    """Route job to the correct handler. Raise on failure (worker will retry)."""
-    handlers = {
-        JobType.SEND_EMAIL.value:      _handle_send_email,
-        JobType.GENERATE_PDF.value:    _handle_generate_pdf,
-        JobType.PROCESS_PAYROLL.value: _handle_process_payroll,
-        JobType.EXPORT_REPORT.value:   _handle_export_report,
-        JobType.NOTIFY.value:          _handle_notify,
-        JobType.SYNC_DATA.value:       _handle_sync_data,
-    }
-    handler = handlers.get(job_type)
-    if not handler:
+    """
+    Route job to the correct handler and return its result. Raise on failure (worker will retry).
+    A handler may return a small JSON-serializable result reference (a file path, an id …);
+    it is stored on the job as "result", so deduplicated submissions can reuse it.
+    """
+    entry = _handlers.get(job_type)
+    if not entry:
         raise ValueError(f"Unknown job type: {job_type}")
-    await handler(payload)
+    handler, cpu_bound = entry
+    if cpu_bound:
+        return await run_cpu(handler, payload)
+    return await handler(payload)
+
+
+# ─── CPU lane (process pool) ──────────────────────────────────────────────────
+# CPU-bound handlers (ReportLab rendering, Decimal payroll maths) hold the GIL, so
+# threads do not help; they run in a ProcessPoolExecutor of JOB_PROCESS_POOL_SIZE
+# children (0 = one per core), started with "spawn" so no event loop, Redis or DB
+# connection is inherited.  Children import reportlab and the PDF builders once at
+# start-up.  A handler cancelled by its JOB_TIMEOUTS limit stops being awaited, but
+# the child finishes that call before taking the next one.
+_process_pool = None
+
+# Modules imported in every pool child before its first job
+CPU_WARM_IMPORTS = (
+    "reportlab.platypus",
+    "reportlab.lib.styles",
+    "reportlab.lib.pagesizes",
+    "app.api.reports",
+    "app.modules.payroll.service",
+)
+
+
+def _warm_child():
+    import importlib
+    for name in CPU_WARM_IMPORTS:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logging.getLogger("cierp.jobs.cpu").warning(f"Pool child could not pre-import {name}: {e}")
+
+
+def _get_process_pool():
+    global _process_pool
+    if _process_pool is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        from app.core.config import settings
+        size = settings.JOB_PROCESS_POOL_SIZE or os.cpu_count() or 1
+        _process_pool = ProcessPoolExecutor(max_workers=size, mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_warm_child)
+        logger.info(f"CPU job lane started with {size} process(es)")
+    return _process_pool
+
+
+async def run_cpu(fn: Callable, *args):
+    """Run a picklable top-level function in the job process pool and await its result."""
+    from concurrent.futures.process import BrokenProcessPool
+    global _process_pool
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_process_pool(), fn, *args)
+    except BrokenProcessPool:
+        _process_pool = None        # a child died; the next call starts a fresh pool
+        raise
 
 
+def shutdown_process_pool(wait: bool = True) -> None:
+    """Stop the pool children (call after the worker has drained)."""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=wait, cancel_futures=True)
+        _process_pool = None
+
+
+@job_handler(JobType.SEND_EMAIL)
 async def _handle_send_email(payload: dict):
     """
     Send an email.
@@ -324,17 +1601,36 @@ async def _handle_send_email(payload: dict):
     await asyncio.sleep(0)
 
 
-async def _handle_generate_pdf(payload: dict):
+@job_handler(JobType.GENERATE_PDF, cpu_bound=True)
+def _handle_generate_pdf(payload: dict) -> dict:
     """
-    Generate a branded PDF and store it.
-    Payload: {template, data, output_path, tenant_id, branding}
+    Render a PDF and write it to output_path (runs in the CPU process pool).
+    Payload: {template, data, output_path, branding}
+      template "invoice" → data = {invoice: {...}, lines: [{...}, ...]}
+      template "payslip" → data = {entry: {...}}
+    Returns {path, bytes} — the result reference duplicate submissions get back.
     """
+    from app.api.reports import build_invoice_pdf, build_payslip_pdf
+
     template = payload.get("template", "report")
-    logger.info(f"[PDF] Template: {template}")
-    # The actual PDF generation is synchronous (ReportLab) — run in executor
-    await asyncio.get_event_loop().run_in_executor(None, lambda: None)
+    data     = payload.get("data") or {}
+    company  = (payload.get("branding") or {}).get("company_name", "CI ERP")
+    if template == "invoice":
+        pdf = build_invoice_pdf(data["invoice"], data.get("lines", []), company)
+    elif template == "payslip":
+        pdf = build_payslip_pdf(data["entry"], company)
+    else:
+        raise ValueError(f"Unknown PDF template: {template}")
 
+    path = payload["output_path"]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(pdf)
+    logger.info(f"[PDF] Template: {template} → {path} ({len(pdf)} bytes)")
+    return {"path": path, "bytes": len(pdf)}
 
+
+@job_handler(JobType.PROCESS_PAYROLL)
 async def _handle_process_payroll(payload: dict):
     """
     Process a payroll batch.
@@ -345,6 +1641,7 @@ async def _handle_process_payroll(payload: dict):
     await asyncio.sleep(0)
 
 
+@job_handler(JobType.EXPORT_REPORT)
 async def _handle_export_report(payload: dict):
     """
     Export a data report to file/email.
@@ -356,6 +1653,7 @@ async def _handle_export_report(payload: dict):
     await asyncio.sleep(0)
 
 
+@job_handler(JobType.NOTIFY)
 async def _handle_notify(payload: dict):
     """
     Send in-app notification.
@@ -367,6 +1665,7 @@ async def _handle_notify(payload: dict):
     await asyncio.sleep(0)
 
 
+@job_handler(JobType.SYNC_DATA)
 async def _handle_sync_data(payload: dict):
     """
     Background data sync.
@@ -376,22 +1675,58 @@ async def _handle_sync_data(payload: dict):
     await asyncio.sleep(0)
 
 
+@job_handler(JobType.KPI_ROLLUP)
+async def _handle_kpi_rollup(payload: dict) -> dict:
+    """
+    Fold a tenant's pending KPI deltas into its rollup rows (every 5 minutes).
+    Payload: {tenant_id}
+    """
+    from app.core.database import AsyncSessionLocal
+    from app.core.kpi import compact
+
+    async with AsyncSessionLocal() as db:
+        folded = await compact(db, payload["tenant_id"])
+        await db.commit()
+    return {"deltas": folded}
+
+
+@job_handler(JobType.PRUNE_AUDIT_LOG)
+async def _handle_prune_audit_log(payload: dict) -> dict:
+    """
+    Delete a tenant's audit entries older than the retention window (weekly schedule).
+    Payload: {tenant_id, older_than_days?}
+    """
+    from sqlalchemy import delete
+    from app.core.database import AsyncSessionLocal
+    from app.modules.identity.models import AuditLog
+
+    days = int(payload.get("older_than_days", 365))
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(delete(AuditLog).where(
+            AuditLog.tenant_id == payload["tenant_id"], AuditLog.created_at < cutoff))
+        await db.commit()
+    logger.info(f"[AUDIT] pruned {result.rowcount} entries older than {days}d tenant={payload['tenant_id']}")
+    return {"deleted": result.rowcount}
+
+
 # ─── Convenience helpers ──────────────────────────────────────────────────────
 
 async def enqueue_email(to: str, subject: str, body: str,
-                        tenant_id: str = "cierp", user_id: Optional[str] = None) -> str:
+                        tenant_id: str = "cierp", user_id: Optional[str] = None,
+                        priority: int = 2) -> str:
     return await enqueue_job(
         JobType.SEND_EMAIL,
         {"to": to, "subject": subject, "body": body},
-        tenant_id=tenant_id, user_id=user_id,
+        priority=priority, tenant_id=tenant_id, user_id=user_id,
     )
 
 
 async def enqueue_pdf(template: str, data: dict, output_path: str,
                       branding: Optional[dict] = None,
-                      tenant_id: str = "cierp") -> str:
+                      tenant_id: str = "cierp", priority: int = 8) -> str:
     return await enqueue_job(
         JobType.GENERATE_PDF,
         {"template": template, "data": data, "output_path": output_path, "branding": branding or {}},
-        tenant_id=tenant_id,
+        priority=priority, tenant_id=tenant_id,
     )
@@ -0,0 +1,365 @@
+"""
+CI ERP — KPI Rollups
+Value KPIs (AR/AP residual, revenue, pipeline, PO spend, stock value, open tickets)
+kept in `kpi_rollup` so dashboards read a handful of rows instead of scanning
+account_move, sale_order, product, helpdesk_ticket …
+
+Tables
+------
+kpi_rollup  (tenant_id, metric, day) PK, value
+            compacted history: one row per day holding that day's net change,
+            plus a running-total row per metric at day = TOTAL_DAY
+kpi_delta   id PK, tenant_id, metric, day, value
+            append-only changes not yet folded into kpi_rollup
+
+Maintenance
+-----------
+- Every flush that inserts, updates or soft-deletes a tracked row computes
+  contribution(after) − contribution(before) per metric from the attribute
+  history and inserts the deltas into kpi_delta on the same connection, so they
+  commit or roll back with the domain write — post_invoice, post_payment,
+  confirm_sale_order, update_quant and the plain CRUD endpoints all go through it.
+- Writers only ever insert new rows, so concurrent writes to a tracked model
+  never wait on each other for a rollup row.
+- `compact(db, tenant_id)`, run every 5 minutes by the kpi_rollup schedule,
+  deletes the tenant's deltas and adds them to its kpi_rollup day and total
+  rows in one transaction.  Reads sum kpi_rollup and the pending deltas, so
+  they are exact whether or not the compaction has run.
+- Bulk Core UPDATE/DELETE statements bypass the ORM and are not tracked.
+- `reconcile(tenant_id)` recounts each metric from the source tables and records
+  any difference from the tracked value as a delta (after migrating, or if a bulk
+  statement touched tracked columns).  It reads the sources and the rollups in
+  one snapshot (REPEATABLE READ on PostgreSQL), where every write's source rows
+  and deltas are either both visible or both not, so it takes no locks and a
+  concurrent write is never counted twice or missed.
+
+Dating
+------
+A change is dated the UTC day it is recorded: a live write on the day its flush
+runs, a reconcile correction on the day the reconcile runs — regardless of the
+document's own date.  Past days are never rewritten, so /dashboard/trends shows
+the same history before and after a reconcile.  The first reconcile of a tenant
+records its whole opening balance on that day.
+"""
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import (
+    BigInteger, Column, Date, DateTime, Index, Integer, Numeric, String, delete, event, func, select, union_all,
+)
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.database import AsyncSessionLocal, Base, dialect_insert, engine
+from app.modules.accounting.models import AccountMove
+from app.modules.sales.models import SaleOrder, Lead
+from app.modules.purchasing.models import PurchaseOrder
+from app.modules.inventory.models import Product
+from app.modules.helpdesk.models import HelpdeskTicket
+
+logger = logging.getLogger("cierp.kpi")
+
+TOTAL_DAY = date(1, 1, 1)       # `day` of the running-total row of each metric
+
+
+class KpiRollup(Base):
+    """Net change of one metric on one day (or its running total at TOTAL_DAY)."""
+
+    tenant_id  = Column(String(100), primary_key=True)
+    metric     = Column(String(60),  primary_key=True)
+    day        = Column(Date,        primary_key=True)
+    value      = Column(Numeric(20, 4), nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(),
+                        onupdate=func.now(), nullable=False)
+
+
+class KpiDelta(Base):
+    """One flush's change to one metric, until compact() folds it into kpi_rollup."""
+
+    id         = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    tenant_id  = Column(String(100), nullable=False)
+    metric     = Column(String(60),  nullable=False)
+    day        = Column(Date,        nullable=False)
+    value      = Column(Numeric(20, 4), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (Index("ix_kpi_delta_tenant_metric_day", "tenant_id", "metric", "day"),)
+
+
+_table = KpiRollup.__table__
+_delta = KpiDelta.__table__
+_ZERO = Decimal(0)
+_SCALE = Decimal("0.0001")      # kpi_rollup / kpi_delta value scale
+
+
+def _num(v) -> Decimal:
+    if v is None:
+        return _ZERO
+    return v if isinstance(v, Decimal) else Decimal(str(v))
+
+
+# ─── Metric definitions ───────────────────────────────────────────────────────
+# Each takes a row-like object and returns its contribution to the metric.
+# Conditions mirror the SQL the dashboards used (NULL never matches).
+
+def _posted(m, move_type: str) -> bool:
+    return not m.is_deleted and m.move_type == move_type and m.state == "posted"
+
+
+def _unpaid(m) -> bool:
+    return m.payment_state is not None and m.payment_state != "paid"
+
+
+def _receivable(m):
+    return _num(m.amount_residual) if _posted(m, "out_invoice") and _unpaid(m) else _ZERO
+
+
+def _payable(m):
+    return _num(m.amount_residual) if _posted(m, "in_invoice") and _unpaid(m) else _ZERO
+
+
+def _revenue(m):
+    return _num(m.amount_total) if _posted(m, "out_invoice") else _ZERO
+
+
+def _expenses(m):
+    return _num(m.amount_total) if _posted(m, "in_invoice") else _ZERO
+
+
+def _sales_revenue(o):
+    return _num(o.total) if not o.is_deleted and o.state in ("confirmed", "done") else _ZERO
+
+
+def _pipeline(lead):
+    active = lead.state is not None and lead.state not in ("won", "lost")
+    return _num(lead.expected_revenue) if not lead.is_deleted and active else _ZERO
+
+
+def _po_spend(o):
+    return _num(o.total) if not o.is_deleted and o.state in ("confirmed", "received", "billed") else _ZERO
+
+
+def _stock_value(p):
+    return _ZERO if p.is_deleted else _num(p.qty_on_hand) * _num(p.cost_price)
+
+
+def _open_tickets(t):
+    return Decimal(1) if not t.is_deleted and t.state in ("new", "open") else _ZERO
+
+
+# model → [(metric, contribution fn)]
+TRACKED: dict[type, list] = {
+    AccountMove: [("receivable", _receivable), ("payable", _payable),
+                  ("revenue", _revenue), ("expenses", _expenses)],
+    SaleOrder:      [("sales_revenue", _sales_revenue)],
+    Lead:           [("pipeline", _pipeline)],
+    PurchaseOrder:  [("po_spend", _po_spend)],
+    Product:        [("stock_value", _stock_value)],
+    HelpdeskTicket: [("open_tickets", _open_tickets)],
+}
+
+METRICS = [name for specs in TRACKED.values() for name, _ in specs]
+
+
+class _Before:
+    """Read-only view of an instance's attribute values as of its last load/flush."""
+
+    __slots__ = ("_obj", "_attrs")
+
+    def __init__(self, obj):
+        self._obj = obj
+        self._attrs = sa_inspect(obj).attrs
+
+    def __getattr__(self, key):
+        hist = self._attrs[key].history
+        if hist.deleted:
+            return hist.deleted[0]
+        return getattr(self._obj, key)
+
+
+# ─── Delta capture ────────────────────────────────────────────────────────────
+
+def _upsert(dialect_name: str, rows: list[dict]):
+    insert = dialect_insert(dialect_name)
+    stmt = insert(_table).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[_table.c.tenant_id, _table.c.metric, _table.c.day],
+        set_={"value": _table.c.value + stmt.excluded.value, "updated_at": func.now()},
+    )
+
+
+def _changes(session: Session):
+    """(instance, state after, state before) for everything this flush wrote."""
+    for obj in session.new:
+        yield obj, obj, None
+    for obj in session.dirty:
+        yield obj, obj, _Before(obj)
+    for obj in session.deleted:
+        yield obj, None, _Before(obj)
+
+
+@event.listens_for(Session, "after_flush")
+def _capture_deltas(session: Session, flush_context) -> None:
+    deltas: dict[tuple[str, str], Decimal] = defaultdict(Decimal)
+    for obj, after, before in _changes(session):
+        specs = TRACKED.get(type(obj))
+        if not specs:
+            continue
+        for metric, fn in specs:
+            d = (fn(after) if after is not None else _ZERO) - (fn(before) if before is not None else _ZERO)
+            if d:
+                deltas[(obj.tenant_id, metric)] += d
+    if not deltas:
+        return
+
+    today = datetime.now(timezone.utc).date()
+    rows = [{"tenant_id": tenant, "metric": metric, "day": today, "value": d}
+            for (tenant, metric), d in deltas.items() if d]
+    if rows:
+        session.connection().execute(_delta.insert(), rows)
+
+
+# ─── Compaction ───────────────────────────────────────────────────────────────
+
+async def compact(db: AsyncSession, tenant_id: str) -> int:
+    """
+    Fold the tenant's pending deltas into its kpi_rollup day and total rows.
+    Returns the number of deltas folded; the caller commits.
+    """
+    conn = await db.connection()
+    # DELETE … RETURNING claims exactly the rows it folds: a delta committed
+    # meanwhile is left for the next run, and two compactions never fold one twice.
+    taken = (await db.execute(
+        delete(_delta).where(_delta.c.tenant_id == tenant_id)
+        .returning(_delta.c.metric, _delta.c.day, _delta.c.value)
+    )).all()
+    sums: dict[tuple[str, date], Decimal] = defaultdict(Decimal)
+    for metric, day, value in taken:
+        sums[(metric, day)] += _num(value)
+        sums[(metric, TOTAL_DAY)] += _num(value)
+    # sorted, so concurrent compactions lock the rollup rows in the same order
+    rows = [{"tenant_id": tenant_id, "metric": metric, "day": day, "value": v}
+            for (metric, day), v in sorted(sums.items()) if v]
+    if rows:
+        await db.execute(_upsert(conn.dialect.name, rows))
+    return len(taken)
+
+
+# ─── Reads ────────────────────────────────────────────────────────────────────
+
+def _day_changes(tenant_id: str, metric: str):
+    """(day, value) rows of one metric's history: compacted days plus pending deltas."""
+    return union_all(
+        select(_table.c.day, _table.c.value).where(
+            _table.c.tenant_id == tenant_id, _table.c.metric == metric, _table.c.day > TOTAL_DAY),
+        select(_delta.c.day, _delta.c.value).where(
+            _delta.c.tenant_id == tenant_id, _delta.c.metric == metric),
+    ).subquery()
+
+
+async def _recorded(db: AsyncSession, tenant_id: str, names: list[str]) -> dict[str, Decimal]:
+    """Tracked value of each metric: the running-total rows plus the pending deltas."""
+    parts = union_all(
+        select(_table.c.metric, _table.c.value).where(
+            _table.c.tenant_id == tenant_id, _table.c.day == TOTAL_DAY, _table.c.metric.in_(names)),
+        select(_delta.c.metric, _delta.c.value).where(
+            _delta.c.tenant_id == tenant_id, _delta.c.metric.in_(names)),
+    ).subquery()
+    rows = (await db.execute(
+        select(parts.c.metric, func.sum(parts.c.value)).group_by(parts.c.metric)
+    )).all()
+    found = {m: _num(v) for m, v in rows}
+    return {m: found.get(m, _ZERO) for m in names}
+
+
+async def kpi_totals(db: AsyncSession, tenant_id: str, *metrics: str) -> dict[str, float]:
+    """Current value of each metric (a handful of indexed rows, no source-table scan)."""
+    recorded = await _recorded(db, tenant_id, list(metrics) or METRICS)
+    return {m: float(v) for m, v in recorded.items()}
+
+
+async def kpi_trend(db: AsyncSession, tenant_id: str, metric: str,
+                    date_from: date, date_to: date) -> list[dict]:
+    """
+    Monthly series for `metric` between two dates:
+    `change` is the net movement within the month, `closing` the value at month end.
+    """
+    history = _day_changes(tenant_id, metric)
+    opening = (await db.execute(
+        select(func.coalesce(func.sum(history.c.value), 0)).where(history.c.day < date_from)
+    )).scalar()
+    days = (await db.execute(
+        select(history.c.day, history.c.value).where(
+            history.c.day >= date_from, history.c.day <= date_to)
+    )).all()
+
+    changes: dict[tuple[int, int], Decimal] = defaultdict(Decimal)
+    for day, value in days:
+        changes[(day.year, day.month)] += _num(value)
+
+    series, running = [], _num(opening)
+    y, m = date_from.year, date_from.month
+    while (y, m) <= (date_to.year, date_to.month):
+        change = changes.get((y, m), _ZERO)
+        running += change
+        series.append({"month": f"{y:04d}-{m:02d}", "change": float(change), "closing": float(running)})
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return series
+
+
+# ─── Reconciliation ───────────────────────────────────────────────────────────
+
+async def _source_totals(db: AsyncSession, tenant_id: str) -> dict[str, Decimal]:
+    """Each metric recounted from the source tables."""
+    totals: dict[str, Decimal] = defaultdict(Decimal)
+    for model, specs in TRACKED.items():
+        result = await db.stream(
+            select(model.__table__).where(model.tenant_id == tenant_id).execution_options(yield_per=1000)
+        )
+        async for row in result:
+            for metric, fn in specs:
+                v = fn(row)
+                if v:
+                    totals[metric] += v
+    return totals
+
+
+async def reconcile(tenant_id: str) -> dict[str, float]:
+    """
+    Record the difference between each metric's recount and its tracked value as
+    a delta dated today, in its own transaction.  Returns the corrections made.
+    """
+    async with AsyncSessionLocal() as db:
+        if engine.dialect.name == "postgresql":
+            await db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        actual = await _source_totals(db, tenant_id)
+        recorded = await _recorded(db, tenant_id, METRICS)
+        corrections = {}
+        for metric in METRICS:
+            d = (actual.get(metric, _ZERO) - recorded[metric]).quantize(_SCALE)
+            if d:
+                corrections[metric] = d
+        if corrections:
+            today = datetime.now(timezone.utc).date()
+            await db.execute(_delta.insert(), [
+                {"tenant_id": tenant_id, "metric": m, "day": today, "value": d} for m, d in corrections.items()
+            ])
+        await db.commit()
+    logger.info(f"KPI rollups reconciled for tenant={tenant_id}: {len(corrections)} corrected")
+    return {m: float(d) for m, d in corrections.items()}
+
+
+async def ensure_built(tenant_id: str) -> Optional[dict[str, float]]:
+    """Reconcile the tenant if it has no KPI rows yet (first start after migrating)."""
+    async with AsyncSessionLocal() as db:
+        exists = (await db.execute(
+            select(_table.c.metric).where(_table.c.tenant_id == tenant_id)
+            .union_all(select(_delta.c.metric).where(_delta.c.tenant_id == tenant_id)).limit(1)
+        )).first()
+    if exists:
+        return None
+    return await reconcile(tenant_id)
@@ -1,15 +1,43 @@
 """
 CI ERP — Observability: Structured Logging + Metrics
 Provides structured JSON logging, request tracing, and basic metrics.
+
+Per-route metrics are keyed by the matched route template (/api/v1/sales/orders/{oid}),
+never the raw path, so ids in URLs cannot grow them: at most MAX_ROUTE_KEYS templates
+are tracked, further ones count under OVERFLOW_ROUTE and requests no route matched
+(404s, scanners) under UNMATCHED_ROUTE.
+
+Fleet view: every process (uvicorn / gunicorn worker) records into its own
+_metrics and, every METRICS_FLUSH_SECONDS, writes a snapshot of it to its field of
+the Redis hash cierp:metrics.  get_fleet_metrics() merges the fields flushed
+recently (counters summed, latency samples pooled), so /api/v1/metrics shows the
+whole deployment.  Requests themselves never touch Redis.
+
+Database cost: the SQLAlchemy cursor listeners in app.core.database charge every
+statement to the request that issued it.  Each access log line carries db_queries /
+db_ms (plus n_plus_one when a statement shape repeats N_PLUS_ONE_THRESHOLD times),
+non-production responses get X-DB-Queries / X-DB-Time headers, and db_by_route
+keeps per-route totals.  Like X-Response-Time, the headers cover the work done
+before the response started; the log and aggregates include the whole request.
 """
+import asyncio
+import os
+import socket
 import time
 import logging
 import json
 import uuid
+from collections import deque
 from datetime import datetime, timezone
-from typing import Callable
-from fastapi import FastAPI, Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from typing import Optional
+from fastapi import FastAPI
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import profiler
+from app.core.config import settings
+from app.core.database import current_query_stats, end_query_stats, start_query_stats
+from app.core.jobs_impl import queue_metrics, _get_redis
 
 # ─── Structured JSON Logger ───────────────────────────────────────────────────
 class StructuredFormatter(logging.Formatter):
@@ -26,7 +54,8 @@ class StructuredFormatter(logging.Formatter):
             "line": record.lineno,
         }
         # Add extra fields
-        for key in ("trace_id", "tenant_id", "user_id", "duration_ms", "path", "method", "status_code"):
+        for key in ("trace_id", "tenant_id", "user_id", "duration_ms", "path", "method", "status_code",
+                    "db_queries", "db_ms", "db_slowest_ms", "n_plus_one"):
             if hasattr(record, key):
                 log_dict[key] = getattr(record, key)
         if record.exc_info:
@@ -50,26 +79,63 @@ def setup_logging(level: str = "INFO"):
 
 
 # ─── In-Memory Metrics (lightweight, no external deps) ────────────────────────
+MAX_ROUTE_KEYS = 300                  # distinct route templates tracked per process
+UNMATCHED_ROUTE = "<unmatched>"
+OVERFLOW_ROUTE = "<other>"
+
 _metrics: dict = {
     "requests_total": 0,
-    "requests_by_path": {},
+    "requests_by_route": {},   # "METHOD /route/{template}" → count
+    "errors_by_route": {},
+    "db_by_route": {},         # "METHOD /route/{template}" → {requests, queries, db_ms, max_queries, n_plus_one}
     "errors_total": 0,
     "response_times_ms": [],
-    "slow_requests": [],   # requests > 1000ms
+    "slow_requests": deque(maxlen=50),   # requests > 1000ms
     "active_requests": 0,
     "started_at": datetime.now(timezone.utc).isoformat(),
 }
 
 
+def route_template(scope: dict) -> str:
+    """Path template of the route that handled the request (set by routing)."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+def _route_key(method: str, template: str) -> str:
+    key = f"{method} {template}"
+    by_route = _metrics["requests_by_route"]
+    if key in by_route or len(by_route) < MAX_ROUTE_KEYS:
+        return key
+    return OVERFLOW_ROUTE      # no method either: clients can send arbitrary ones
+
+
+def _record_db(key: str, db: dict) -> None:
+    agg = _metrics["db_by_route"].get(key)
+    if agg is None:
+        agg = _metrics["db_by_route"][key] = {"requests": 0, "queries": 0, "db_ms": 0.0,
+                                              "max_queries": 0, "n_plus_one": 0}
+    agg["requests"] += 1
+    agg["queries"] += db["queries"]
+    agg["db_ms"] = round(agg["db_ms"] + db["db_ms"], 2)
+    agg["max_queries"] = max(agg["max_queries"], db["queries"])
+    agg["n_plus_one"] += bool(db["n_plus_one"])
+
+
 def get_metrics() -> dict:
-    """Return current metrics snapshot."""
-    times = _metrics["response_times_ms"]
+    """Return current metrics snapshot (this process only)."""
+    return _summarize({**_metrics, "slow_requests": list(_metrics["slow_requests"])})
+
+
+def _summarize(m: dict) -> dict:
+    times = m["response_times_ms"]
     return {
-        **_metrics,
+        **m,
         "avg_response_ms": round(sum(times) / len(times), 2) if times else 0,
         "p95_response_ms": _percentile(times, 95),
         "p99_response_ms": _percentile(times, 99),
         "response_times_ms": times[-100:],  # last 100 only
+        "jobs": queue_metrics(),
     }
 
 
@@ -81,86 +147,265 @@ def _percentile(data: list, p: int) -> float:
     return sorted_data[min(idx, len(sorted_data) - 1)]
 
 
+# ─── Fleet aggregation (Redis) ────────────────────────────────────────────────
+METRICS_KEY = "cierp:metrics"          # hash: process id → JSON snapshot
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_flusher: Optional[asyncio.Task] = None
+
+
+def _snapshot() -> dict:
+    return {
+        **_metrics,
+        "requests_by_route": dict(_metrics["requests_by_route"]),
+        "errors_by_route": dict(_metrics["errors_by_route"]),
+        "db_by_route": {key: dict(agg) for key, agg in _metrics["db_by_route"].items()},
+        "response_times_ms": list(_metrics["response_times_ms"]),
+        "slow_requests": list(_metrics["slow_requests"]),
+        "process": PROCESS_ID,
+        "flushed_at": time.time(),
+    }
+
+
+async def flush_metrics(redis=None) -> bool:
+    """Write this process's snapshot to its field of cierp:metrics (False without Redis)."""
+    redis = redis or await _get_redis(silent=True)
+    if not redis:
+        return False
+    await redis.hset(METRICS_KEY, PROCESS_ID, json.dumps(_snapshot()))
+    return True
+
+
+async def _flush_loop(interval: float):
+    logger = logging.getLogger("cierp.metrics")
+    while True:
+        try:
+            await flush_metrics()
+        except Exception as e:
+            logger.warning(f"Metrics flush failed: {e}")
+        await asyncio.sleep(interval)
+
+
+def start_metrics_flusher(interval: Optional[float] = None) -> None:
+    """Start flushing this process's metrics to Redis in the background (idempotent)."""
+    global _flusher
+    if _flusher is None or _flusher.done():
+        _flusher = asyncio.create_task(_flush_loop(interval or settings.METRICS_FLUSH_SECONDS))
+
+
+async def stop_metrics_flusher() -> None:
+    """Stop the flusher and remove this process from the fleet view."""
+    global _flusher
+    if _flusher is not None:
+        _flusher.cancel()
+        _flusher = None
+    redis = await _get_redis(silent=True)
+    if redis:
+        await redis.hdel(METRICS_KEY, PROCESS_ID)
+
+
+def _merge(snapshots: list[dict]) -> dict:
+    merged: dict = {
+        "requests_total": 0, "errors_total": 0, "active_requests": 0,
+        "requests_by_route": {}, "errors_by_route": {}, "db_by_route": {},
+        "response_times_ms": [], "slow_requests": [],
+        "started_at": min(s["started_at"] for s in snapshots),
+    }
+    for s in snapshots:
+        for field in ("requests_total", "errors_total", "active_requests"):
+            merged[field] += s[field]
+        for field in ("requests_by_route", "errors_by_route"):
+            for key, n in s[field].items():
+                merged[field][key] = merged[field].get(key, 0) + n
+        for key, agg in s.get("db_by_route", {}).items():
+            into = merged["db_by_route"].get(key)
+            if into is None:
+                merged["db_by_route"][key] = dict(agg)
+                continue
+            for field in ("requests", "queries", "n_plus_one"):
+                into[field] += agg[field]
+            into["db_ms"] = round(into["db_ms"] + agg["db_ms"], 2)
+            into["max_queries"] = max(into["max_queries"], agg["max_queries"])
+        merged["response_times_ms"] += s["response_times_ms"]
+        merged["slow_requests"] += s["slow_requests"]
+    merged["slow_requests"] = sorted(merged["slow_requests"], key=lambda r: r["duration_ms"])[-50:]
+    return merged
+
+
+async def get_fleet_metrics() -> dict:
+    """
+    Metrics of every process that flushed within the last 3 intervals, merged (this
+    process's own snapshot is refreshed first).  Falls back to get_metrics() without Redis.
+    """
+    redis = await _get_redis(silent=True)
+    if not redis:
+        return {**get_metrics(), "processes": [PROCESS_ID]}
+    await flush_metrics(redis)
+    cutoff = time.time() - 3 * settings.METRICS_FLUSH_SECONDS
+    snapshots, stale = [], []
+    for process, raw in (await redis.hgetall(METRICS_KEY)).items():
+        snapshot = json.loads(raw)
+        (snapshots if snapshot["flushed_at"] >= cutoff else stale).append(snapshot)
+    if stale:
+        await redis.hdel(METRICS_KEY, *(s["process"] for s in stale))
+    return {
+        **_summarize(_merge(snapshots)),
+        "processes": sorted(s["process"] for s in snapshots),
+    }
+
+
 # ─── Request Tracing Middleware ────────────────────────────────────────────────
-class ObservabilityMiddleware(BaseHTTPMiddleware):
+class ObservabilityMiddleware:
     """
     Adds per-request:
     - X-Trace-ID header (for distributed tracing)
     - Structured access log
     - Metrics tracking
     - Performance monitoring
+    - Per-request DB query count / time, with N+1 detection
+    - Stack sampling (app.core.profiler): per-route hot stacks, and the task that
+      get_current_user turns into a superadmin's on-demand profile, stored under
+      the trace id (X-Profile-ID header)
+
+    Plain ASGI: it wraps `send` to stamp the headers and read the status as the
+    response starts, and never touches the body, so streaming responses pass
+    straight through.  Durations are time to response headers.
     """
-    
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         trace_id = str(uuid.uuid4())[:8]
-        request.state.trace_id = trace_id
+        scope.setdefault("state", {})["trace_id"] = trace_id
         
         _metrics["requests_total"] += 1
         _metrics["active_requests"] += 1
         
-        start = time.time()
+        start = time.perf_counter()
         logger = logging.getLogger("cierp.http")
+        method, path = scope["method"], scope["path"]
+        status_code, duration_ms = 500, None
+        db_token = start_query_stats(trace_id)
+        live_db = current_query_stats()
+        task = asyncio.current_task()
+        if profiler.profile_requested(scope):
+            scope["state"]["profile_task"] = task     # started by get_current_user for superadmins
+        profiler.begin(False)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, duration_ms
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                duration_ms = round((time.perf_counter() - start) * 1000, 2)
+                headers = MutableHeaders(scope=message)
+                headers["X-Trace-ID"] = trace_id
+                headers["X-Response-Time"] = f"{duration_ms}ms"
+                if not settings.is_production:
+                    headers["X-DB-Queries"] = str(live_db["queries"])
+                    headers["X-DB-Time"] = f"{round(live_db['db_ms'], 2)}ms"
+                if scope["state"].get("profiled"):
+                    headers["X-Profile-ID"] = trace_id
+            await send(message)
         
         try:
-            response = await call_next(request)
-        except Exception as e:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                # Also on cancellation (client gone, shutdown): CancelledError skips the
+                # handlers below, and a leaked sampler record would hold its on-demand slot.
+                db = end_query_stats(db_token)
+                key = _route_key(method, route_template(scope))
+                profile = profiler.end(task, key)
+                _metrics["active_requests"] -= 1
+        except Exception:
             _metrics["errors_total"] += 1
-            _metrics["active_requests"] -= 1
-            duration_ms = round((time.time() - start) * 1000, 2)
+            _metrics["requests_by_route"][key] = _metrics["requests_by_route"].get(key, 0) + 1
+            _metrics["errors_by_route"][key] = _metrics["errors_by_route"].get(key, 0) + 1
+            _record_db(key, db)
+            duration_ms = round((time.perf_counter() - start) * 1000, 2)
+            await self._save_profile(profile, scope, key, trace_id, status_code=500,
+                                     duration_ms=duration_ms, db_queries=db["queries"])
             logger.error(
                 "Request failed",
                 extra={
                     "trace_id": trace_id,
-                    "path": request.url.path,
-                    "method": request.method,
+                    "path": path,
+                    "method": method,
                     "duration_ms": duration_ms,
+                    "db_queries": db["queries"],
+                    "db_ms": db["db_ms"],
                 }
             )
             raise
         
-        duration_ms = round((time.time() - start) * 1000, 2)
-        _metrics["active_requests"] -= 1
+        if duration_ms is None:     # app returned without starting a response
+            duration_ms = round((time.perf_counter() - start) * 1000, 2)
         _metrics["response_times_ms"].append(duration_ms)
         
-        path = request.url.path
-        _metrics["requests_by_path"][path] = _metrics["requests_by_path"].get(path, 0) + 1
+        _metrics["requests_by_route"][key] = _metrics["requests_by_route"].get(key, 0) + 1
+        _record_db(key, db)
+        await self._save_profile(profile, scope, key, trace_id, status_code=status_code,
+                                 duration_ms=round((time.perf_counter() - start) * 1000, 2),
+                                 db_queries=db["queries"])
         
-        if response.status_code >= 400:
+        if status_code >= 400:
             _metrics["errors_total"] += 1
+            _metrics["errors_by_route"][key] = _metrics["errors_by_route"].get(key, 0) + 1
         
         if duration_ms > 1000:
             _metrics["slow_requests"].append({
-                "path": path,
+                "route": key,
                 "duration_ms": duration_ms,
                 "trace_id": trace_id,
+                "db_queries": db["queries"],
+                "db_ms": db["db_ms"],
             })
-            if len(_metrics["slow_requests"]) > 50:
-                _metrics["slow_requests"] = _metrics["slow_requests"][-50:]
+        
+        if db["n_plus_one"]:
+            logging.getLogger("cierp.db").warning(
+                f"Likely N+1 on {key}: " + "; ".join(f"{r['count']}× {r['sql'][:120]}" for r in db["n_plus_one"]),
+                extra={"trace_id": trace_id, "path": path, "method": method, "n_plus_one": db["n_plus_one"]},
+            )
         
         # Keep last 1000 timing samples
         if len(_metrics["response_times_ms"]) > 1000:
             _metrics["response_times_ms"] = _metrics["response_times_ms"][-1000:]
         
-        # Add trace headers
-        response.headers["X-Trace-ID"] = trace_id
-        response.headers["X-Response-Time"] = f"{duration_ms}ms"
-        
         # Log access (skip health checks to reduce noise)
         if path not in ("/api/v1/health", "/favicon.ico"):
-            tenant = request.headers.get("X-Tenant-ID", "-")
+            tenant = Headers(scope=scope).get("X-Tenant-ID", "-")
             logger.info(
-                f"{request.method} {path} {response.status_code} {duration_ms}ms",
+                f"{method} {path} {status_code} {duration_ms}ms",
                 extra={
                     "trace_id": trace_id,
                     "path": path,
-                    "method": request.method,
-                    "status_code": response.status_code,
+                    "method": method,
+                    "status_code": status_code,
                     "duration_ms": duration_ms,
                     "tenant_id": tenant,
+                    "db_queries": db["queries"],
+                    "db_ms": db["db_ms"],
+                    "db_slowest_ms": db["slowest_ms"],
+                    **({"n_plus_one": db["n_plus_one"]} if db["n_plus_one"] else {}),
                 }
             )
-        
-        return response
+
+    @staticmethod
+    async def _save_profile(profile: Optional[dict], scope: Scope, key: str, trace_id: str, **meta) -> None:
+        state = scope["state"]
+        if not (profile and profile["on_demand"]):
+            return
+        try:
+            await profiler.save_profile(trace_id, profile, route=key, method=scope["method"],
+                                        path=scope["path"], tenant_id=state.get("tenant_id"),
+                                        user_id=state.get("user_id"), **meta)
+        except Exception as e:
+            logging.getLogger("cierp.profiler").warning(f"Profile {trace_id} not stored: {e}")
 
 
 def setup_observability(app: FastAPI):
@@ -0,0 +1,163 @@
+"""
+CI ERP — List Pagination
+Offset pagination (page/limit) plus opt-in keyset (cursor) pagination.
+
+Keyset mode:
+  - Every page carries `next_cursor` when more rows exist.
+  - Passing it back as `?cursor=` seeks past the last row with a row
+    comparison on the sort key — (created_at, id) by default, or the
+    endpoint's own key such as (name, id) — instead of OFFSET.
+  - Each list table has a matching (tenant_id, <sort key>, id) index
+    (migration 20250907_007), so page N costs the same as page 1, no matter
+    how deep.  A new list sorted on another key needs its own index.
+
+Totals go through app.core.counts (exact+cached, estimate, or skip) and are
+computed for offset pages only; cursor pages reuse a cached exact total or
+return null.
+
+Usage:
+    page = await paginate(db, q, AccountMove.created_at, descending=True,
+                          page=page, limit=limit, cursor=cursor)
+    return {"items": [row_to_dict(x) for x in page.items], "total": page.total,
+            "next_cursor": page.next_cursor}
+"""
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, List, Optional, Sequence
+
+from sqlalchemy import literal, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.counts import TotalMode, cached_count, count_total
+from app.core.serialization import table_columns
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client-supplied cursor cannot be decoded for this sort key."""
+
+
+class Page:
+    """One page of ORM rows plus the metadata the list endpoints return."""
+
+    __slots__ = ("items", "total", "next_cursor")
+
+    def __init__(self, items: list, total: Optional[int], next_cursor: Optional[str]):
+        self.items = items
+        self.total = total
+        self.next_cursor = next_cursor
+
+
+# ─── Cursor encoding ──────────────────────────────────────────────────────────
+
+def _to_json(v: Any) -> Any:
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    if isinstance(v, Decimal):
+        return str(v)
+    return v
+
+
+def _from_json(col, v: Any) -> Any:
+    if v is None:
+        return None
+    try:
+        py_type = col.type.python_type
+    except NotImplementedError:
+        return v
+    if py_type is datetime:
+        return datetime.fromisoformat(v)
+    if py_type is date:
+        return date.fromisoformat(v)
+    if py_type is Decimal:
+        return Decimal(v)
+    return v
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Opaque, URL-safe cursor from the sort-key values of the last row."""
+    raw = json.dumps([_to_json(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: Sequence) -> list:
+    """Decode a cursor back into typed values for `keys`; raises InvalidCursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError("cursor does not match sort key")
+        return [_from_json(k, v) for k, v in zip(keys, values)]
+    except Exception as e:
+        raise InvalidCursor(f"Invalid cursor: {e}") from e
+
+
+# ─── Keyset helpers ───────────────────────────────────────────────────────────
+
+def sort_keys(q, *keys) -> list:
+    """Sort key columns with the entity's primary key appended as tiebreaker."""
+    entity = q.column_descriptions[0].get("entity")
+    id_col = getattr(entity, "id", None)
+    cols = list(keys)
+    if id_col is not None and not any(c is id_col for c in cols):
+        cols.append(id_col)
+    return cols
+
+
+def keyset_filter(keys: Sequence, values: Sequence, *, descending: bool):
+    """Row-value comparison `(k1, k2, ...) < (v1, v2, ...)` — index-friendly in PostgreSQL."""
+    lhs = tuple_(*keys)
+    rhs = tuple_(*[literal(v, type_=k.type) for k, v in zip(keys, values)])
+    return lhs < rhs if descending else lhs > rhs
+
+
+def order_clause(keys: Sequence, *, descending: bool) -> list:
+    return [k.desc() if descending else k.asc() for k in keys]
+
+
+# ─── Main entry point ─────────────────────────────────────────────────────────
+
+async def paginate(
+    db: AsyncSession,
+    q,
+    *keys,
+    descending: bool = False,
+    page: int = 1,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    tenant_id: Optional[str] = None,
+    total: TotalMode | str = TotalMode.EXACT,
+    core_rows: bool = False,
+) -> Page:
+    """
+    Run one page of `q` ordered by `keys` (+ id tiebreaker).
+    Uses OFFSET when no cursor is supplied, keyset seek otherwise.
+    `total` picks the count strategy (see app.core.counts).  Cursor pages
+    never count: they return the first page's exact total while it is still
+    cached, else None.
+    `core_rows=True` returns Core rows in table-column order (for
+    app.core.serialization.row_encoder_for) instead of ORM instances.
+    """
+    cols = sort_keys(q, *keys)
+    if cursor:
+        row_total = cached_count(q, tenant_id) if TotalMode(total) is TotalMode.EXACT else None
+        q = q.where(keyset_filter(cols, decode_cursor(cursor, cols), descending=descending))
+    else:
+        row_total = await count_total(db, q, mode=total, tenant_id=tenant_id)
+        q = q.offset((max(page, 1) - 1) * limit)
+
+    q = q.order_by(*order_clause(cols, descending=descending)).limit(limit + 1)
+    if core_rows:
+        entity = q.column_descriptions[0]["entity"]
+        result = await db.execute(q.with_only_columns(*table_columns(entity)))
+        rows: List = list(result.all())
+    else:
+        rows = list((await db.execute(q)).scalars().all())
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, c.key) for c in cols])
+    return Page(rows, row_total, next_cursor)
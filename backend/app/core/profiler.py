@@ -0,0 +1,273 @@
+"""
+CI ERP — Sampling Profiler
+Low-overhead, in-process stack sampling of individual requests, keyed by trace id.
+
+On demand: a request sent with `X-Profile: 1` (or `?profile=1`) by a superadmin is
+sampled every PROFILE_INTERVAL_MS.  The result is stored for PROFILE_TTL_SECONDS
+under its trace id in collapsed-stack format, ready for flamegraph.pl or speedscope.
+Fetch it with GET /api/v1/profiles/{trace_id}.  Sampling starts only once
+get_current_user has authenticated a superadmin; for anyone else the flag is ignored
+and takes no on-demand slot.
+
+Continuous: with PROFILE_CONTINUOUS every request is sampled every
+PROFILE_CONTINUOUS_INTERVAL_MS.  The samples are summed into hot stacks per route
+template in this process (GET /api/v1/profiles/hot).
+
+A daemon thread takes the samples, so the event loop does no profiling work.  A
+request's task is sampled as follows:
+- While it runs, the thread stack from its root coroutine down is sampled.
+- While it awaits, its coroutine await chain is sampled, ending in an
+  `[awaiting]` frame.
+The profiles are therefore wall-clock: time spent waiting on the database or
+on Redis shows up where the request awaits it.  Work handed to a thread pool
+(sync endpoints, run_in_executor) shows as an await.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import sysconfig
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+
+from app.core.config import settings
+from app.core.jobs_impl import _get_redis
+
+logger = logging.getLogger("cierp.profiler")
+
+PROFILE_KEY = "cierp:profile:{}"        # trace id → JSON profile (with TTL)
+MAX_ON_DEMAND = 4                       # concurrently profiled requests per process
+MAX_DEPTH = 128                         # frames kept per sample
+MAX_HOT_STACKS = 500                    # distinct stacks kept per route
+TRUNCATED_STACK = "[other stacks]"
+LOCAL_PROFILES_MAX = 100                # kept in-process when Redis is unavailable
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_STDLIB = sysconfig.get_paths()["stdlib"]
+
+_records: dict = {}          # asyncio.Task → sample record; read by the sampler thread
+_hot: dict = {}              # route key → {collapsed stack → samples}
+_local_profiles: OrderedDict = OrderedDict()
+_on_demand = 0
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread: Optional[int] = None
+_sampler: Optional[threading.Thread] = None
+_wake = threading.Event()
+
+
+# ─── Stack capture (sampler thread) ───────────────────────────────────────────
+@lru_cache(maxsize=4096)
+def _label(code) -> str:
+    path = code.co_filename
+    if "site-packages" + os.sep in path:
+        path = path.split("site-packages" + os.sep, 1)[1]
+    elif path.startswith(_ROOT):
+        path = os.path.relpath(path, _ROOT)
+    elif path.startswith(_STDLIB):
+        path = os.path.relpath(path, _STDLIB)
+    return f"{code.co_qualname} ({path}:{code.co_firstlineno})"
+
+
+def _await_chain(coro) -> list:
+    """Frames of a suspended coroutine, outermost first, down to what it awaits."""
+    frames = []
+    while coro is not None and len(frames) < MAX_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        frames.append(_label(frame.f_code))
+        if hasattr(coro, "cr_await"):
+            coro = coro.cr_await
+        elif hasattr(coro, "gi_yieldfrom"):
+            coro = coro.gi_yieldfrom
+        else:
+            coro = getattr(coro, "ag_await", None)
+    return frames
+
+
+def _running_stack(frame, root) -> Optional[list]:
+    """Thread frames from `root` down to the executing one (None if root is not on the stack)."""
+    frames = []
+    while frame is not None and len(frames) < MAX_DEPTH:
+        frames.append(_label(frame.f_code))
+        if frame is root:
+            return frames[::-1]
+        frame = frame.f_back
+    return None
+
+
+def _thread_stack(frame) -> list:
+    frames = []
+    while frame is not None and len(frames) < MAX_DEPTH:
+        frames.append(_label(frame.f_code))
+        frame = frame.f_back
+    return frames[::-1]
+
+
+def _stack(task, running: bool, frame) -> str:
+    coro = task.get_coro()
+    if not running or frame is None:
+        frames = _await_chain(coro) + ["[awaiting]"]
+    else:
+        frames = _running_stack(frame, getattr(coro, "cr_frame", None))
+        if frames is None:      # executing in a greenlet (SQLAlchemy's sync layer)
+            frames = _await_chain(coro) + _thread_stack(frame)
+    return ";".join(frames[-MAX_DEPTH:])
+
+
+def _sample(take_hot: bool) -> None:
+    frame = sys._current_frames().get(_loop_thread)
+    running = asyncio.current_task(_loop)
+    for task, record in list(_records.items()):
+        if not (record["on_demand"] or take_hot):
+            continue
+        stack = _stack(task, task is running, frame)
+        if record["on_demand"]:
+            record["stacks"][stack] = record["stacks"].get(stack, 0) + 1
+        if take_hot:
+            record["hot"][stack] = record["hot"].get(stack, 0) + 1
+
+
+def _sample_loop() -> None:
+    last_hot = 0.0
+    while True:
+        if not _records:
+            _wake.wait()
+            _wake.clear()
+            continue
+        interval = settings.PROFILE_INTERVAL_MS if _on_demand else settings.PROFILE_CONTINUOUS_INTERVAL_MS
+        if _wake.wait(interval / 1000):     # an on-demand profile began: switch to its rate now
+            _wake.clear()
+        now = time.perf_counter()
+        take_hot = settings.PROFILE_CONTINUOUS and now - last_hot >= settings.PROFILE_CONTINUOUS_INTERVAL_MS / 1000
+        if take_hot:
+            last_hot = now
+        try:
+            _sample(take_hot)
+        except Exception:       # raced the event loop mid-update; skip this tick
+            pass
+
+
+# ─── Request hooks (event loop) ───────────────────────────────────────────────
+def profile_requested(scope: dict) -> bool:
+    """True if the request asks to be profiled (X-Profile: 1 or ?profile=1)."""
+    if b"profile=" in scope.get("query_string", b""):
+        for pair in scope["query_string"].split(b"&"):
+            if pair in (b"profile=1", b"profile=true"):
+                return True
+    for name, value in scope.get("headers", ()):
+        if name == b"x-profile":
+            return value in (b"1", b"true")
+    return False
+
+
+def begin(on_demand: bool, task: Optional[asyncio.Task] = None) -> Optional[dict]:
+    """
+    Start sampling `task` (default: the current one), or upgrade its continuous-mode
+    record to an on-demand profile.  ObservabilityMiddleware calls this for
+    continuous mode; get_current_user calls it with on_demand=True for superadmins
+    on the task the middleware registered, which always end()s it.  Returns the
+    record, or None when there is nothing to do (continuous mode off and no
+    on-demand slot free).
+    """
+    global _on_demand, _loop, _loop_thread, _sampler
+    task = task or asyncio.current_task()
+    record = _records.get(task)
+    if record is not None and record["on_demand"]:
+        return record
+    if on_demand and _on_demand >= MAX_ON_DEMAND:
+        on_demand = False
+    if not (on_demand or settings.PROFILE_CONTINUOUS):
+        return None
+    loop = asyncio.get_running_loop()
+    if loop is not _loop:
+        _loop, _loop_thread = loop, threading.get_ident()
+    if _sampler is None:
+        _sampler = threading.Thread(target=_sample_loop, name="cierp-profiler", daemon=True)
+        _sampler.start()
+    if record is None:
+        record = _records[task] = {"on_demand": False, "stacks": {}, "hot": {}}
+    if on_demand:
+        record["on_demand"] = True
+        _on_demand += 1
+    if on_demand or len(_records) == 1:
+        _wake.set()
+    return record
+
+
+def end(task: asyncio.Task, route_key: str) -> Optional[dict]:
+    """
+    Stop sampling `task`, fold its continuous samples into the route's hot stacks
+    and return its record (None if it was not being sampled).
+    """
+    global _on_demand
+    record = _records.pop(task, None)
+    if record is None:
+        return None
+    _on_demand -= record["on_demand"]
+    if not record["hot"]:
+        return record
+    hot = _hot.setdefault(route_key, {})
+    for stack, n in dict(record["hot"]).items():
+        if stack not in hot and len(hot) >= MAX_HOT_STACKS:
+            stack = TRUNCATED_STACK
+        hot[stack] = hot.get(stack, 0) + n
+    return record
+
+
+def collapsed(stacks: dict) -> str:
+    """Brendan Gregg's collapsed format: one `frame;frame;frame count` line per stack."""
+    return "\n".join(f"{stack} {n}" for stack, n in sorted(stacks.items(), key=lambda i: -i[1]))
+
+
+# ─── Storage ──────────────────────────────────────────────────────────────────
+async def save_profile(trace_id: str, record: dict, **meta) -> None:
+    """Store an on-demand profile under its trace id (Redis, else this process)."""
+    stacks = dict(record["stacks"])
+    profile = {
+        "trace_id": trace_id,
+        **meta,
+        "interval_ms": settings.PROFILE_INTERVAL_MS,
+        "samples": sum(stacks.values()),
+        "collapsed": collapsed(stacks),
+        "created_at": time.time(),
+    }
+    redis = await _get_redis(silent=True)
+    if redis:
+        await redis.set(PROFILE_KEY.format(trace_id), json.dumps(profile), ex=settings.PROFILE_TTL_SECONDS)
+    else:
+        _local_profiles[trace_id] = profile
+        while len(_local_profiles) > LOCAL_PROFILES_MAX:
+            _local_profiles.popitem(last=False)
+    logger.info(f"Profile stored: {meta.get('method')} {meta.get('path')} — {profile['samples']} samples",
+                extra={"trace_id": trace_id})
+
+
+async def get_profile(trace_id: str, tenant_id: str) -> Optional[dict]:
+    """A stored profile, or None if unknown, expired or recorded under another tenant."""
+    redis = await _get_redis(silent=True)
+    if redis:
+        raw = await redis.get(PROFILE_KEY.format(trace_id))
+        profile = json.loads(raw) if raw else None
+    else:
+        profile = _local_profiles.get(trace_id)
+    if not profile or profile.get("tenant_id") != tenant_id:
+        return None
+    return profile
+
+
+def get_hot_stacks(route: Optional[str] = None, limit: int = 20) -> dict:
+    """Top continuous-mode stacks per route key ("GET /api/v1/..."), this process only."""
+    out = {}
+    for key, stacks in list(_hot.items()):
+        if route and key != route:
+            continue
+        stacks = dict(stacks)
+        top = sorted(stacks.items(), key=lambda i: -i[1])[:limit]
+        out[key] = {"samples": sum(stacks.values()),
+                    "stacks": [{"stack": stack, "samples": n} for stack, n in top]}
+    return out
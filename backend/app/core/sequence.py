@@ -0,0 +1,156 @@
+"""
+CI ERP — Document Sequences
+Per-(tenant, code, year) counters for document numbers (SO-2025-0001, OUT/2025/00001 …),
+replacing the `COUNT(*) + 1` lookups that scanned the table on every create and
+handed out duplicates under concurrency.
+
+Table
+-----
+document_sequence  (tenant_id, code, year) PK, last_value
+
+Modes (per code, see SEQUENCES)
+-------------------------------
+- gapless   Fiscal documents (SINV, PINV, PAY).  The counter row is incremented with
+            UPDATE … RETURNING inside the caller's transaction, so the row lock is held
+            until that transaction commits or rolls back — a rolled-back posting gives
+            its number back.  Postings of the same code serialize on that one row.
+- standard  Operational documents.  Values are taken in a separate short transaction,
+            so the lock is released immediately; a rollback leaves a gap.
+            `block > 1` preallocates that many values per worker process and serves
+            them from memory, for high-volume sequences (numbers stay unique but are
+            no longer strictly ordered across processes).
+
+Either way assignment is one indexed row update, independent of table size.
+
+Counters are created on first use.  The optional `seed` statement passed by the caller
+(the old COUNT query) runs once at that point so numbering continues where the
+count-based scheme left off.
+
+Usage:
+    move.name = await next_number(db, tenant_id, "SINV", seed=select(func.count())...)
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, func
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.core.database import Base, dialect_insert, engine as _default_engine
+
+logger = logging.getLogger("cierp.sequence")
+
+
+class DocumentSequence(Base):
+    """One counter per tenant, sequence code and year (year 0 = never resets)."""
+
+    tenant_id  = Column(String(100), primary_key=True)
+    code       = Column(String(40),  primary_key=True)
+    year       = Column(Integer,     primary_key=True, default=0)
+    last_value = Column(BigInteger,  nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(),
+                        onupdate=func.now(), nullable=False)
+
+
+# ─── Registry ─────────────────────────────────────────────────────────────────
+# pattern fields: {year}, {n}.  yearly=False keeps a single counter for all years.
+SEQUENCES: dict[str, dict] = {
+    "SINV": {"pattern": "SINV-{year}-{n:04d}", "gapless": True},
+    "PINV": {"pattern": "PINV-{year}-{n:04d}", "gapless": True},
+    "PAY":  {"pattern": "PAY-{year}-{n:04d}",  "gapless": True},
+    "SO":   {"pattern": "SO-{year}-{n:04d}"},
+    "PO":   {"pattern": "PO-{year}-{n:04d}"},
+    "MO":   {"pattern": "MO-{year}-{n:04d}"},
+    "TKT":  {"pattern": "TKT-{year}-{n:04d}"},
+    "EMP":  {"pattern": "EMP-{n:04d}", "yearly": False},
+    "OUT":  {"pattern": "OUT/{year}/{n:05d}",  "block": 20},
+    "IN":   {"pattern": "IN/{year}/{n:05d}",   "block": 20},
+    "COMP": {"pattern": "COMP/{year}/{n:05d}", "block": 20},
+}
+
+_table = DocumentSequence.__table__
+
+# (tenant, code, year) → [next value, end of block (exclusive)] for block-allocated codes
+_blocks: dict[tuple, list[int]] = {}
+_block_locks: dict[tuple, asyncio.Lock] = {}
+
+
+def _insert_missing(dialect_name: str, values: dict):
+    """INSERT that is a no-op when the counter row already exists."""
+    return dialect_insert(dialect_name)(_table).values(**values).on_conflict_do_nothing()
+
+
+def _bump(tenant_id: str, code: str, year: int, n: int):
+    return (
+        _table.update()
+        .where(_table.c.tenant_id == tenant_id, _table.c.code == code, _table.c.year == year)
+        .values(last_value=_table.c.last_value + n, updated_at=func.now())
+        .returning(_table.c.last_value)
+    )
+
+
+async def _increment(conn, tenant_id: str, code: str, year: int, n: int, seed) -> int:
+    """
+    Atomically add `n` to the counter and return the new last_value.
+    `conn` is an AsyncSession or AsyncConnection; the row lock lasts until its commit.
+    """
+    new = (await conn.execute(_bump(tenant_id, code, year, n))).scalar()
+    if new is not None:
+        return new
+
+    start = int((await conn.execute(seed)).scalar() or 0) if seed is not None else 0
+    dialect = conn.get_bind().dialect.name if isinstance(conn, AsyncSession) else conn.dialect.name
+    await conn.execute(_insert_missing(dialect, {
+        "tenant_id": tenant_id, "code": code, "year": year, "last_value": start,
+    }))
+    logger.info(f"Sequence {code}/{year} created for tenant={tenant_id} at {start}")
+    return (await conn.execute(_bump(tenant_id, code, year, n))).scalar()
+
+
+async def _take_standard(db: AsyncSession, tenant_id: str, code: str, year: int,
+                         block: int, seed) -> int:
+    key = (tenant_id, code, year)
+    lock = _block_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        cached = _blocks.get(key)
+        if cached and cached[0] < cached[1]:
+            value = cached[0]
+            cached[0] += 1
+            return value
+
+        eng = db.bind or _default_engine
+        conn: AsyncConnection
+        async with eng.begin() as conn:
+            last = await _increment(conn, tenant_id, code, year, block, seed)
+        first = last - block + 1
+        if block > 1:
+            _blocks[key] = [first + 1, last + 1]
+        return first
+
+
+async def next_value(db: AsyncSession, tenant_id: str, code: str, *,
+                     year: Optional[int] = None, seed=None) -> int:
+    """Next integer for sequence `code` (see module docstring for the two modes)."""
+    spec = SEQUENCES[code]
+    if not spec.get("yearly", True):
+        year = 0
+    elif year is None:
+        year = datetime.now().year
+
+    if spec.get("gapless"):
+        return await _increment(db, tenant_id, code, year, 1, seed)
+    return await _take_standard(db, tenant_id, code, year, spec.get("block", 1), seed)
+
+
+async def next_number(db: AsyncSession, tenant_id: str, code: str, *,
+                      year: Optional[int] = None, seed=None) -> str:
+    """Next formatted document number, e.g. next_number(db, t, "SO") → 'SO-2025-0042'."""
+    year = year or datetime.now().year
+    n = await next_value(db, tenant_id, code, year=year, seed=seed)
+    return SEQUENCES[code]["pattern"].format(year=year, n=n)
+
+
+def reset_blocks() -> None:
+    """Forget preallocated blocks (tests / after restoring a database)."""
+    _blocks.clear()
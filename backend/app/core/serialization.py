@@ -0,0 +1,98 @@
+"""
+CI ERP — Row Serialization
+One place to turn mapped rows into JSON-ready dicts (replaces the per-router
+row_to_dict / _row_dict / _row copies).
+
+  - encoder_for(Model)      → compiled `obj -> dict` for ORM instances
+  - row_encoder_for(Model)  → compiled `row -> dict` for Core rows from
+                              select(*table_columns(Model)) — no ORM hydration
+  - to_dict(obj)            → drop-in row_to_dict using the cached encoder
+
+The dicts are plain JSON types, ready for fastapi.responses.ORJSONResponse.
+
+Encoders are generated once per mapped class from its column types, so the
+per-cell work is a single attribute/index read plus at most one conversion:
+dates → isoformat(), Numeric → float, everything else passed through.
+"""
+import datetime as _dt
+from decimal import Decimal
+from typing import Any, Callable, Iterable
+
+from sqlalchemy import inspect as sa_inspect
+
+
+_obj_encoders: dict[type, Callable[[Any], dict]] = {}
+_row_encoders: dict[type, Callable[[Any], dict]] = {}
+
+
+def _conversion(col) -> str:
+    """Which conversion this column's values need: 'iso', 'float' or '' (none)."""
+    try:
+        py_type = col.type.python_type
+    except NotImplementedError:
+        return ""
+    if py_type in (_dt.datetime, _dt.date, _dt.time):
+        return "iso"
+    if py_type is Decimal:
+        return "float"
+    return ""
+
+
+_TEMPLATES = {
+    "":      "{read}",
+    "iso":   "(None if (v := {read}) is None else v.isoformat())",
+    "float": "(None if (v := {read}) is None else float(v))",
+}
+
+
+def _fields(model) -> list[tuple[str, str, str]]:
+    """(output name, attribute key, conversion) for every table column, in table order."""
+    mapper = sa_inspect(model)
+    return [
+        (col.name, mapper.get_property_by_column(col).key, _conversion(col))
+        for col in model.__table__.columns
+    ]
+
+
+def _build(model, getter: Callable[[int, str], str], name: str) -> Callable[[Any], dict]:
+    """Generate and compile `def name(o): return {...}` specialised for `model`."""
+    body = [
+        f"        {col_name!r}: " + _TEMPLATES[conv].format(read=getter(i, key)) + ","
+        for i, (col_name, key, conv) in enumerate(_fields(model))
+    ]
+    src = f"def {name}(o):\n    return {{\n" + "\n".join(body) + "\n    }\n"
+    ns: dict = {}
+    exec(compile(src, f"<serializer {model.__name__}>", "exec"), ns)
+    return ns[name]
+
+
+def encoder_for(model) -> Callable[[Any], dict]:
+    """Compiled serializer for ORM instances of `model` (built on first use)."""
+    enc = _obj_encoders.get(model)
+    if enc is None:
+        enc = _obj_encoders[model] = _build(model, lambda i, key: f"o.{key}", "encode_obj")
+    return enc
+
+
+def row_encoder_for(model) -> Callable[[Any], dict]:
+    """Compiled serializer for Core rows selected with table_columns(model)."""
+    enc = _row_encoders.get(model)
+    if enc is None:
+        enc = _row_encoders[model] = _build(model, lambda i, key: f"o[{i}]", "encode_row")
+    return enc
+
+
+def table_columns(model) -> list:
+    """Columns to select for row_encoder_for(model), in encoder order."""
+    return list(model.__table__.columns)
+
+
+def to_dict(obj) -> dict:
+    """Serialize one ORM instance (drop-in for the old row_to_dict helpers)."""
+    return encoder_for(type(obj))(obj)
+
+
+def rows_to_dicts(model, rows: Iterable) -> list[dict]:
+    enc = row_encoder_for(model)
+    return [enc(r) for r in rows]
+
@@ -0,0 +1,148 @@
+"""
+CI ERP — Dashboard Statistics
+Per-table aggregate snapshots shared by /dashboard, /dashboard/kpis and the
+per-module /dashboard routes.  Value KPIs (AR/AP, revenue, pipeline, spend,
+stock value, open tickets) come from the app.core.kpi rollups instead.
+
+  - One query per table: every metric of that table is a `count(*) FILTER (WHERE …)`
+    or `sum(col) FILTER (WHERE …)` column of a single SELECT over the tenant's rows,
+    instead of one round trip per number.
+  - Results are cached per (tenant, table) for STATS_CACHE_TTL seconds.
+  - Any committed ORM write to a tenant's table drops that table's snapshot
+    (via app.core.counts.on_commit_write), so post_invoice, confirm_sale_order,
+    validate_picking etc. are reflected on the next load.  The cache is per
+    process; other workers converge within the TTL.
+
+Usage:
+    s = await table_stats(db, tenant_id, "sale_order", "customer")
+    s["sale_order"]["confirmed"], s["customer"]["customers"]
+"""
+import time
+from typing import Optional
+
+from sqlalchemy import Integer, and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.counts import on_commit_write
+from app.modules.accounting.models import AccountMove
+from app.modules.sales.models import SaleOrder, Customer
+from app.modules.purchasing.models import PurchaseOrder
+from app.modules.inventory.models import Product, StockPicking
+from app.modules.hr.models import Employee, LeaveRequest
+from app.modules.manufacturing.models import ProductionOrder
+from app.modules.projects.models import Project, Task
+from app.modules.helpdesk.models import HelpdeskTicket
+
+STATS_CACHE_TTL = 15.0          # seconds a snapshot may be served without a write
+
+
+def _count(*conds):
+    return func.count().filter(and_(*conds)) if conds else func.count()
+
+
+def _sum(col, *conds):
+    agg = func.sum(col)
+    return func.coalesce(agg.filter(and_(*conds)) if conds else agg, 0)
+
+
+# table → (model, {metric: aggregate expression})
+TABLE_METRICS: dict[str, tuple] = {
+    "account_move": (AccountMove, {
+        "invoices":   _count(AccountMove.move_type.in_(["out_invoice", "in_invoice"])),
+    }),
+    "sale_order": (SaleOrder, {
+        "orders":    _count(),
+        "confirmed": _count(SaleOrder.state == "confirmed"),
+        "active":    _count(SaleOrder.state.in_(["draft", "confirmed"])),
+    }),
+    "customer": (Customer, {
+        "customers": _count(),
+    }),
+    "purchase_order": (PurchaseOrder, {
+        "orders":  _count(),
+        "pending": _count(PurchaseOrder.state.in_(["draft", "sent"])),
+    }),
+    "product": (Product, {
+        "products":    _count(),
+        "low_stock":   _count(Product.qty_on_hand <= Product.reorder_point, Product.reorder_point > 0),
+    }),
+    "stock_picking": (StockPicking, {
+        "pending_receipts": _count(StockPicking.picking_type == "incoming",
+                                   StockPicking.state.in_(["confirmed", "assigned"])),
+    }),
+    "employee": (Employee, {
+        "employees": _count(),
+        "active":    _count(Employee.status == "active"),
+        "payroll":   _sum(Employee.salary, Employee.status == "active"),
+    }),
+    "leave_request": (LeaveRequest, {
+        "pending": _count(LeaveRequest.state == "pending"),
+    }),
+    "production_order": (ProductionOrder, {
+        "orders":      _count(),
+        "in_progress": _count(ProductionOrder.state.in_(["confirmed", "in_progress"])),
+        "done":        _count(ProductionOrder.state == "done"),
+    }),
+    "project": (Project, {
+        "projects": _count(),
+        "active":   _count(Project.state == "active"),
+    }),
+    "task": (Task, {
+        "open": _count(Task.state.in_(["new", "in_progress"])),
+    }),
+    "helpdesk_ticket": (HelpdeskTicket, {
+        "tickets": _count(),
+        "urgent":  _count(HelpdeskTicket.priority == "urgent"),
+    }),
+}
+
+
+# ─── Cache ────────────────────────────────────────────────────────────────────
+_cache: dict[tuple[str, str], tuple[dict, float]] = {}     # (tenant, table) → (values, expires)
+_generation: dict[tuple[str, str], int] = {}               # bumped on every committed write
+
+
+@on_commit_write
+def invalidate(tenant_id: str, table: str) -> None:
+    key = (tenant_id, table)
+    _generation[key] = _generation.get(key, 0) + 1
+    _cache.pop(key, None)
+
+
+def clear_cache() -> None:
+    _cache.clear()
+    _generation.clear()
+
+
+# ─── Queries ──────────────────────────────────────────────────────────────────
+
+async def _compute(db: AsyncSession, tenant_id: str, table: str) -> dict:
+    model, metrics = TABLE_METRICS[table]
+    q = select(*[expr.label(name) for name, expr in metrics.items()]).where(
+        model.tenant_id == tenant_id, model.is_deleted == False
+    )
+    row = (await db.execute(q)).mappings().one()
+    return {
+        name: int(row[name] or 0) if isinstance(expr.type, Integer) else float(row[name] or 0)
+        for name, expr in metrics.items()
+    }
+
+
+async def table_stats(db: AsyncSession, tenant_id: str, *tables: str,
+                      ttl: Optional[float] = None) -> dict[str, dict]:
+    """Aggregate snapshot for each requested table (one query per cache miss)."""
+    ttl = STATS_CACHE_TTL if ttl is None else ttl
+    now = time.monotonic()
+    out: dict[str, dict] = {}
+    for table in tables:
+        key = (tenant_id, table)
+        hit = _cache.get(key)
+        if hit and hit[1] > now:
+            out[table] = hit[0]
+            continue
+        gen = _generation.get(key, 0)
+        values = await _compute(db, tenant_id, table)
+        if _generation.get(key, 0) == gen:          # no write landed while we were querying
+            _cache[key] = (values, now + ttl)
+        out[table] = values
+    return out
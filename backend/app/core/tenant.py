@@ -7,6 +7,7 @@ from typing import Type, TypeVar, Optional, List, Any
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, func, desc
 from app.core.database import BaseModel
+from app.core.pagination import Page, paginate
 
 T = TypeVar("T", bound=BaseModel)
 
@@ -55,7 +56,10 @@ class TenantScope:
         limit: int = 100,
         eager_loads=None,
     ) -> List[T]:
-        """List records for tenant."""
+        """
+        List records for tenant (OFFSET paging).
+        For keyset paging with a next_cursor, use page().
+        """
         filters = [self._base_filter(model)]
         if extra_filters:
             if isinstance(extra_filters, list):
@@ -78,6 +82,30 @@ class TenantScope:
         result = await self.db.execute(q)
         return list(result.scalars().all())
 
+    async def page(
+        self,
+        model: Type[T],
+        *keys,
+        extra_filters=None,
+        descending: bool = True,
+        page: int = 1,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ) -> Page:
+        """
+        One page of tenant records plus total and next_cursor.
+        Sort key defaults to (created_at, id) descending; raises InvalidCursor on a bad cursor.
+        """
+        filters = [self._base_filter(model)]
+        if extra_filters:
+            if isinstance(extra_filters, list):
+                filters.extend(extra_filters)
+            else:
+                filters.append(extra_filters)
+        q = select(model).where(and_(*filters))
+        return await paginate(self.db, q, *(keys or (model.created_at,)),
+                              descending=descending, page=page, limit=limit, cursor=cursor)
+
     async def count(self, model: Type[T], *, extra_filters=None) -> int:
         """Count records for tenant."""
         filters = [self._base_filter(model)]
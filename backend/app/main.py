@@ -4,21 +4,28 @@ import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 from app.core.config import settings
 from app.core.database import create_tables
-from app.core.observability import setup_logging, setup_observability, get_metrics
+from app.core.observability import (
+    setup_logging, setup_observability, get_metrics, get_fleet_metrics,
+    start_metrics_flusher, stop_metrics_flusher,
+)
 from app.core.audit import AuditMiddleware
 
 logger = logging.getLogger("cierp")
 
 # Background worker reference (kept alive for shutdown)
+_worker = None
 _worker_task = None
+_scheduler = None
+_scheduler_task = None
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global _worker_task
+    global _worker, _worker_task, _scheduler, _scheduler_task
     setup_logging()
     logger.info(f"CI ERP starting — environment={settings.ENVIRONMENT}")
 
@@ -27,22 +34,41 @@ async def lifespan(app: FastAPI):
     from app.seed import seed_demo_data
     await seed_demo_data()
 
+    # KPI rollups: first start after the kpi_rollup migration records the current values
+    from app.core.kpi import ensure_built
+    await ensure_built(settings.TENANT_ID)
+
     # Start background job worker
-    from app.core.jobs import JobWorker
-    worker = JobWorker(tenant_id=settings.TENANT_ID, poll_interval=3.0)
-    _worker_task = asyncio.create_task(worker.run())
+    from app.core.jobs import JobWorker, CronScheduler
+    from app.core.jobs_impl import shutdown_process_pool
+    _worker = JobWorker(tenant_id=None if settings.WORKER_TENANTS == "*" else settings.TENANT_ID,
+                        poll_interval=3.0,
+                        concurrency=settings.WORKER_CONCURRENCY,
+                        drain_timeout=settings.WORKER_DRAIN_SECONDS,
+                        tenant_concurrency=settings.WORKER_TENANT_CONCURRENCY)
+    _worker_task = asyncio.create_task(_worker.run())
     logger.info("Background job worker started.")
+    if settings.CRON_ENABLED:
+        _scheduler = CronScheduler(tenant_id=None if settings.WORKER_TENANTS == "*" else settings.TENANT_ID)
+        _scheduler_task = asyncio.create_task(_scheduler.run())
+
+    start_metrics_flusher()
 
     logger.info("CI ERP ready ✓")
     yield
 
-    # Graceful shutdown
+    # Graceful shutdown: stop dequeuing, let in-flight jobs drain
+    if _scheduler_task and not _scheduler_task.done():
+        _scheduler.stop()
+        await _scheduler_task
     if _worker_task and not _worker_task.done():
-        _worker_task.cancel()
+        _worker.stop()
         try:
-            await asyncio.wait_for(_worker_task, timeout=5.0)
+            await asyncio.wait_for(_worker_task, timeout=_worker.drain_timeout + _worker.poll_interval + 1)
         except (asyncio.CancelledError, asyncio.TimeoutError):
-            pass
+            _worker_task.cancel()
+    shutdown_process_pool(wait=False)
+    await stop_metrics_flusher()
     logger.info("CI ERP shut down.")
 
 
@@ -53,6 +79,7 @@ app = FastAPI(
     lifespan=lifespan,
     docs_url="/docs",
     redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
 )
 
 # ── Observability (must attach before other middleware) ───────────────────────
@@ -84,6 +111,7 @@ from app.api.payroll import router as payroll_router
 from app.api.reports import router as reports_router
 from app.api.branding import router as branding_router
 from app.api.jobs import router as jobs_router
+from app.api.profiling import router as profiling_router
 from app.api.modules import (
     accounting_router, sales_router, crm_router,
     purchasing_router, inventory_router, hr_router,
@@ -107,6 +135,7 @@ app.include_router(reports_router,          prefix=PREFIX)
 app.include_router(admin_router,            prefix=PREFIX)
 app.include_router(branding_router,         prefix=PREFIX)
 app.include_router(jobs_router,             prefix=PREFIX)
+app.include_router(profiling_router,        prefix=PREFIX)
 
 
 @app.get(f"{PREFIX}/health")
@@ -120,9 +149,12 @@ async def health():
 
 
 @app.get(f"{PREFIX}/metrics")
-async def metrics():
-    """Operational metrics (consider restricting in production)."""
-    return get_metrics()
+async def metrics(local: bool = False):
+    """
+    Operational metrics (consider restricting in production), merged across every
+    worker process; ?local=true returns only the process that served the request.
+    """
+    return get_metrics() if local else await get_fleet_metrics()
 
 
 @app.get(f"{PREFIX}/permissions")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, Numeric, DateTime, ForeignKey, Text, Integer
+from sqlalchemy import Column, String, Boolean, Numeric, DateTime, ForeignKey, Text, Integer, Index
 from sqlalchemy.orm import relationship
 from app.core.database import BaseModel
 
@@ -24,6 +24,7 @@ class Journal(BaseModel):
 class AccountMove(BaseModel):
     """A journal entry — the real double-entry accounting record."""
     __tablename__ = "account_move"
+    __table_args__ = (Index("ix_account_move_tenant_created_at", "tenant_id", "created_at", "id"),)  # list sort key
     name = Column(String(100), nullable=True, index=True)
     move_type = Column(String(30), nullable=False, default="entry")
     # entry | out_invoice | in_invoice | out_refund | in_refund | payment
@@ -100,6 +101,7 @@ class Tax(BaseModel):
 
 class Payment(BaseModel):
     __tablename__ = "payment"
+    __table_args__ = (Index("ix_payment_tenant_created_at", "tenant_id", "created_at", "id"),)  # list sort key
     number = Column(String(100), nullable=True, index=True)
     payment_type = Column(String(30), nullable=False)  # inbound | outbound
     partner_id = Column(String(36), nullable=True)
@@ -11,6 +11,7 @@ from app.modules.accounting.models import (
     Account, AccountMove, AccountMoveLine, InvoiceLine, Payment, Journal
 )
 from app.core.audit import audited
+from app.core.sequence import next_number
 
 
 async def get_or_create_account(db: AsyncSession, tenant_id: str, code: str,
@@ -67,11 +68,11 @@ async def post_invoice(db: AsyncSession, move: AccountMove, tenant_id: str, *, u
     # Generate sequence number
     if not move.name:
         prefix = "SINV" if move.move_type == "out_invoice" else "PINV"
-        seq = (await db.execute(
-            select(func.count()).where(AccountMove.tenant_id == tenant_id,
-                                       AccountMove.move_type == move.move_type)
-        )).scalar() or 0
-        move.name = f"{prefix}-{datetime.now().year}-{str(seq + 1).zfill(4)}"
+        move.name = await next_number(
+            db, tenant_id, prefix,
+            seed=select(func.count()).where(AccountMove.tenant_id == tenant_id,
+                                            AccountMove.move_type == move.move_type),
+        )
 
     # Get/create required accounts
     if move.move_type == "out_invoice":
@@ -187,10 +188,10 @@ async def post_payment(db: AsyncSession, payment: Payment, tenant_id: str,
     outbound: DR Accounts Payable / CR Bank/Cash
     """
     if not payment.number:
-        seq = (await db.execute(
-            select(func.count()).where(Payment.tenant_id == tenant_id)
-        )).scalar() or 0
-        payment.number = f"PAY-{datetime.now().year}-{str(seq + 1).zfill(4)}"
+        payment.number = await next_number(
+            db, tenant_id, "PAY",
+            seed=select(func.count()).where(Payment.tenant_id == tenant_id),
+        )
 
     bank_account = await get_or_create_account(
         db, tenant_id, "1010", "Bank Account", "asset", "bank"
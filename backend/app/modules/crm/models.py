@@ -1,12 +1,13 @@
 # CRM models - Lead pipeline is in sales/models.py
 # This module handles activities and contacts
 
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Text, Index
 from app.core.database import BaseModel
 
 
 class Activity(BaseModel):
     __tablename__ = "activity"
+    __table_args__ = (Index("ix_activity_tenant_created_at", "tenant_id", "created_at", "id"),)  # list sort key
     activity_type = Column(String(50), nullable=False)  # call, email, meeting, task
     subject = Column(String(500), nullable=False)
     body = Column(Text, nullable=True)
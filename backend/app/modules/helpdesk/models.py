@@ -1,10 +1,11 @@
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Text, Integer
+from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Text, Integer, Index
 from sqlalchemy.orm import relationship
 from app.core.database import BaseModel
 
 
 class HelpdeskTicket(BaseModel):
     __tablename__ = "helpdesk_ticket"
+    __table_args__ = (Index("ix_helpdesk_ticket_tenant_created_at", "tenant_id", "created_at", "id"),)  # list sort key
     number = Column(String(50), nullable=True, index=True)
     subject = Column(String(500), nullable=False)
     description = Column(Text, nullable=True)
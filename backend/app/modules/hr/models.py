@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, Numeric, DateTime, ForeignKey, Text, Date
+from sqlalchemy import Column, String, Boolean, Numeric, DateTime, ForeignKey, Text, Date, Index
 from sqlalchemy.orm import relationship
 from app.core.database import BaseModel
 
@@ -13,6 +13,7 @@ class Department(BaseModel):
 
 class Employee(BaseModel):
     __tablename__ = "employee"
+    __table_args__ = (Index("ix_employee_tenant_first_name", "tenant_id", "first_name", "id"),)  # list sort key
     employee_number = Column(String(50), nullable=True)
     first_name = Column(String(100), nullable=False)
     last_name = Column(String(100), nullable=False)
@@ -40,6 +41,7 @@ class Employee(BaseModel):
 
 class LeaveRequest(BaseModel):
     __tablename__ = "leave_request"
+    __table_args__ = (Index("ix_leave_request_tenant_created_at", "tenant_id", "created_at", "id"),)  # list sort key
     employee_id = Column(String(36), ForeignKey("employee.id"), nullable=False)
     employee_name = Column(String(200), nullable=True)
     leave_type = Column(String(50), nullable=False)  # annual, sick, unpaid, other
@@ -55,6 +57,7 @@ class LeaveRequest(BaseModel):
 
 class Payslip(BaseModel):
     __tablename__ = "payslip"
+    __table_args__ = (Index("ix_payslip_tenant_created_at", "tenant_id", "created_at", "id"),)  # list sort key
     employee_id = Column(String(36), ForeignKey("employee.id"), nullable=False)
     employee_name = Column(String(200), nullable=True)
     period_start = Column(DateTime(timezone=True), nullable=False)
@@ -1,10 +1,11 @@
-from sqlalchemy import Column, String, Boolean, Numeric, DateTime, ForeignKey, Text
+from sqlalchemy import Column, String, Boolean, Numeric, DateTime, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from app.core.database import BaseModel
 
 
 class Product(BaseModel):
     __tablename__ = "product"
+    __table_args__ = (Index("ix_product_tenant_name", "tenant_id", "name", "id"),)  # list sort key
     name = Column(String(300), nullable=False)
     code = Column(String(100), nullable=True, index=True)
     description = Column(Text, nullable=True)
@@ -49,6 +50,7 @@ class Warehouse(BaseModel):
 class StockPicking(BaseModel):
     """A transfer document (groups moves)."""
     __tablename__ = "stock_picking"
+    __table_args__ = (Index("ix_stock_picking_tenant_created_at", "tenant_id", "created_at", "id"),)  # list sort key
     name = Column(String(100), nullable=True, index=True)
     picking_type = Column(String(50), nullable=False, default="outgoing")
     # incoming | outgoing | internal | return
@@ -70,6 +72,7 @@ class StockPicking(BaseModel):
 
 class StockMove(BaseModel):
     __tablename__ = "stock_move"
+    __table_args__ = (Index("ix_stock_move_tenant_created_at", "tenant_id", "created_at", "id"),)  # list sort key
     picking_id = Column(String(36), ForeignKey("stock_picking.id"), nullable=True, index=True)
     move_type = Column(String(50), nullable=False)  # in | out | transfer | adjustment
     state = Column(String(30), default="draft")   # draft | confirmed | done | cancelled
@@ -8,6 +8,7 @@ from decimal import Decimal
 import uuid
 
 from app.core.audit import audited
+from app.core.sequence import next_number
 from app.modules.inventory.models import (
     Product, StockMove, StockPicking, StockLocation, StockQuant, Warehouse
 )
@@ -114,16 +115,14 @@ async def create_delivery_picking(db: AsyncSession, tenant_id: str,
     stock_loc = await get_or_create_location(db, tenant_id, "WH/Stock", "internal")
     customer_loc = await get_or_create_location(db, tenant_id, "Customers", "customer")
 
-    seq = (await db.execute(
-        select(func.count()).where(
-            StockPicking.tenant_id == tenant_id,
-            StockPicking.picking_type == "outgoing"
-        )
-    )).scalar() or 0
+    name = await next_number(db, tenant_id, "OUT", seed=select(func.count()).where(
+        StockPicking.tenant_id == tenant_id,
+        StockPicking.picking_type == "outgoing"
+    ))
 
     picking = StockPicking(
         tenant_id=tenant_id,
-        name=f"OUT/{datetime.now().year}/{str(seq + 1).zfill(5)}",
+        name=name,
         picking_type="outgoing",
         state="confirmed",
         source_type=source_type,
@@ -169,16 +168,14 @@ async def create_receipt_picking(db: AsyncSession, tenant_id: str,
     vendor_loc = await get_or_create_location(db, tenant_id, "Vendors", "vendor")
     stock_loc = await get_or_create_location(db, tenant_id, "WH/Stock", "internal")
 
-    seq = (await db.execute(
-        select(func.count()).where(
-            StockPicking.tenant_id == tenant_id,
-            StockPicking.picking_type == "incoming"
-        )
-    )).scalar() or 0
+    name = await next_number(db, tenant_id, "IN", seed=select(func.count()).where(
+        StockPicking.tenant_id == tenant_id,
+        StockPicking.picking_type == "incoming"
+    ))
 
     picking = StockPicking(
         tenant_id=tenant_id,
-        name=f"IN/{datetime.now().year}/{str(seq + 1).zfill(5)}",
+        name=name,
         picking_type="incoming",
         state="confirmed",
         source_type=source_type,
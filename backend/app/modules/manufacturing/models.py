@@ -1,10 +1,11 @@
-from sqlalchemy import Column, String, Boolean, Numeric, DateTime, ForeignKey, Text
+from sqlalchemy import Column, String, Boolean, Numeric, DateTime, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from app.core.database import BaseModel
 
 
 class BOM(BaseModel):
     __tablename__ = "bom"
+    __table_args__ = (Index("ix_bom_tenant_product_name", "tenant_id", "product_name", "id"),)  # list sort key
     product_id = Column(String(36), nullable=True)
     product_name = Column(String(300), nullable=False)
     product_qty = Column(Numeric(20, 4), default=1)  # how many finished goods this BOM produces
@@ -30,6 +31,7 @@ class BOMLine(BaseModel):
 
 class ProductionOrder(BaseModel):
     __tablename__ = "production_order"
+    __table_args__ = (Index("ix_production_order_tenant_created_at", "tenant_id", "created_at", "id"),)  # list sort key
     number = Column(String(100), nullable=True, index=True)
     state = Column(String(30), default="draft")
     # draft | confirmed | in_progress | done | cancelled
@@ -3,6 +3,7 @@ Manufacturing workflow: Draft → Confirm (reserve components) → Produce → D
 """
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.audit import audited
+from app.core.sequence import next_number
 from sqlalchemy import select
 from datetime import datetime, timezone
 
@@ -65,16 +66,14 @@ async def confirm_production_order(db: AsyncSession, order: ProductionOrder, ten
         prod_loc = await get_or_create_location(db, tenant_id, "Production", "internal")
 
         from sqlalchemy import func as sqlfunc
-        seq = (await db.execute(
-            select(sqlfunc.count()).where(
-                StockPicking.tenant_id == tenant_id,
-                StockPicking.picking_type == "internal"
-            )
-        )).scalar() or 0
+        comp_name = await next_number(db, tenant_id, "COMP", seed=select(sqlfunc.count()).where(
+            StockPicking.tenant_id == tenant_id,
+            StockPicking.picking_type == "internal"
+        ))
 
         comp_picking = StockPicking(
             tenant_id=tenant_id,
-            name=f"COMP/{datetime.now().year}/{str(seq + 1).zfill(5)}",
+            name=comp_name,
             picking_type="internal",
             state="confirmed",
             source_type="production_order",
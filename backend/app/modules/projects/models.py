@@ -1,10 +1,11 @@
-from sqlalchemy import Column, String, Boolean, Numeric, DateTime, ForeignKey, Text, Integer
+from sqlalchemy import Column, String, Boolean, Numeric, DateTime, ForeignKey, Text, Integer, Index
 from sqlalchemy.orm import relationship
 from app.core.database import BaseModel
 
 
 class Project(BaseModel):
     __tablename__ = "project"
+    __table_args__ = (Index("ix_project_tenant_created_at", "tenant_id", "created_at", "id"),)  # list sort key
     name = Column(String(300), nullable=False)
     code = Column(String(50), nullable=True)
     description = Column(Text, nullable=True)
@@ -22,6 +23,7 @@ class Project(BaseModel):
 
 class Task(BaseModel):
     __tablename__ = "task"
+    __table_args__ = (Index("ix_task_tenant_created_at", "tenant_id", "created_at", "id"),)  # list sort key
     project_id = Column(String(36), ForeignKey("project.id"), nullable=False)
     title = Column(String(500), nullable=False)
     description = Column(Text, nullable=True)
@@ -1,10 +1,11 @@
-from sqlalchemy import Column, String, Boolean, Numeric, DateTime, ForeignKey, Text
+from sqlalchemy import Column, String, Boolean, Numeric, DateTime, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from app.core.database import BaseModel
 
 
 class Supplier(BaseModel):
     __tablename__ = "supplier"
+    __table_args__ = (Index("ix_supplier_tenant_name", "tenant_id", "name", "id"),)  # list sort key
     name = Column(String(300), nullable=False)
     email = Column(String(255), nullable=True)
     phone = Column(String(50), nullable=True)
@@ -17,6 +18,7 @@ class Supplier(BaseModel):
 
 class PurchaseOrder(BaseModel):
     __tablename__ = "purchase_order"
+    __table_args__ = (Index("ix_purchase_order_tenant_created_at", "tenant_id", "created_at", "id"),)  # list sort key
     number = Column(String(100), nullable=True, index=True)
     state = Column(String(30), default="draft")
     # draft | sent | confirmed | received | billed | cancelled
@@ -1,10 +1,11 @@
-from sqlalchemy import Column, String, Boolean, Numeric, DateTime, ForeignKey, Text, Integer
+from sqlalchemy import Column, String, Boolean, Numeric, DateTime, ForeignKey, Text, Integer, Index
 from sqlalchemy.orm import relationship
 from app.core.database import BaseModel
 
 
 class Customer(BaseModel):
     __tablename__ = "customer"
+    __table_args__ = (Index("ix_customer_tenant_name", "tenant_id", "name", "id"),)  # list sort key
     name = Column(String(300), nullable=False)
     email = Column(String(255), nullable=True)
     phone = Column(String(50), nullable=True)
@@ -18,6 +19,7 @@ class Customer(BaseModel):
 
 class SaleOrder(BaseModel):
     __tablename__ = "sale_order"
+    __table_args__ = (Index("ix_sale_order_tenant_created_at", "tenant_id", "created_at", "id"),)  # list sort key
     number = Column(String(100), nullable=True, index=True)
     state = Column(String(30), default="draft")
     # draft | confirmed | done | cancelled
@@ -59,6 +61,7 @@ class SaleOrderLine(BaseModel):
 
 class Lead(BaseModel):
     __tablename__ = "lead"
+    __table_args__ = (Index("ix_lead_tenant_created_at", "tenant_id", "created_at", "id"),)  # list sort key
     title = Column(String(300), nullable=False)
     state = Column(String(30), default="new")
     # new | qualified | proposal | negotiation | won | lost
@@ -0,0 +1,8 @@
+"""
+CI ERP — Micro/throughput benchmarks.
+
+Run from the backend directory, e.g.:
+    python -m benchmarks.serialization
+    python -m benchmarks.jobs
+    python -m benchmarks.middleware
+"""
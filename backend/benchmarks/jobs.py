@@ -0,0 +1,209 @@
+"""
+Job queue benchmark — enqueue rate, throughput and end-to-end latency of JobWorker.
+
+    python -m benchmarks.jobs [--backend memory fakeredis redis] [--handler noop sleep cpu]
+                              [--workers 1 2] [--concurrency 1 4 16] [--jobs 2000]
+                              [--rate 200] [--redis-url redis://localhost:6379/15]
+
+For every combination it runs, on a fresh tenant:
+  enqueue/s   — sequential enqueue_job calls with no worker running
+  many/s      — the same jobs through one enqueue_many call (pipelined chunks)
+  drain/s     — jobs/sec while `workers` JobWorkers of `concurrency` slots drain that backlog
+  p50/p95/p99 — enqueue → handler-finished latency (ms) of --latency-jobs jobs
+                enqueued at --rate per second while the workers are idle
+
+Handlers (registered on JobType.NOTIFY for the run):
+  noop   — returns at once (measures queue overhead)
+  sleep  — awaits --sleep-ms (I/O-bound work)
+  cpu    — --spin iterations of arithmetic in the job process pool
+
+Backends: memory (in-process), fakeredis (if installed) and redis (a real server at
+--redis-url; only keys of the benchmark tenants are touched, and removed afterwards).
+"""
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+
+import app.core.jobs_impl as jobs
+from app.core.jobs_impl import JobType, JobWorker, enqueue_job, enqueue_many, run_cpu, shutdown_process_pool
+
+_real_get_redis = jobs._get_redis
+_done: dict[str, float] = {}
+_finished = asyncio.Event()
+_expected = 0
+_args = None
+
+
+async def _no_redis(silent: bool = False):
+    return None
+
+
+def use_backend(client) -> None:
+    """Point the job module at `client` (None = in-memory backend)."""
+    jobs._redis_client = client
+    jobs._get_redis = _real_get_redis if client is not None else _no_redis
+
+
+def spin(n: int) -> int:
+    """CPU-bound busy work for the process pool (top level, so it pickles)."""
+    x = 0
+    for i in range(n):
+        x = (x * 31 + i) % 1_000_003
+    return x
+
+
+async def _handler(payload: dict):
+    kind = payload["kind"]
+    if kind == "sleep":
+        await asyncio.sleep(payload["ms"] / 1000)
+    elif kind == "cpu":
+        await run_cpu(spin, payload["spin"])
+    _done[payload["key"]] = time.perf_counter() - payload["t0"]
+    if len(_done) >= _expected:
+        _finished.set()
+
+
+def _payload(kind: str, key: str) -> dict:
+    return {"kind": kind, "key": key, "ms": _args.sleep_ms, "spin": _args.spin, "t0": time.perf_counter()}
+
+
+def _pct(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)] * 1000
+
+
+async def _cleanup(client, tenant: str) -> None:
+    if client is None:
+        jobs._memory.clear()
+        return
+    keys = [k async for k in client.scan_iter(match=f"cierp:jobs:*{tenant}*", count=1000)]
+    keys += [jobs._job_key(k) for k in _done] + [jobs._progress_key(k) for k in _done]
+    for i in range(0, len(keys), 1000):
+        await client.delete(*keys[i:i + 1000])
+    await client.srem(jobs._TENANTS_KEY, tenant)
+
+
+async def _wait(n: int) -> None:
+    global _expected
+    _expected = n
+    if len(_done) < n:
+        _finished.clear()
+        await asyncio.wait_for(_finished.wait(), timeout=_args.timeout)
+
+
+async def run_case(client, kind: str, n_workers: int, concurrency: int) -> dict:
+    tenant = f"bench-{uuid.uuid4().hex[:8]}"
+    _done.clear()
+    n = _args.jobs
+
+    # Enqueue rate, one call per job, no consumer
+    t = time.perf_counter()
+    for i in range(n):
+        await enqueue_job(JobType.NOTIFY, _payload(kind, f"a{i}"), tenant_id=tenant)
+    enqueue_rate = n / (time.perf_counter() - t)
+
+    # The same jobs through enqueue_many
+    t = time.perf_counter()
+    await enqueue_many(JobType.NOTIFY, [_payload(kind, f"b{i}") for i in range(n)], tenant_id=tenant, track=False)
+    many_rate = n / (time.perf_counter() - t)
+
+    workers = [JobWorker(tenant_id=tenant, poll_interval=0.5, concurrency=concurrency) for _ in range(n_workers)]
+    tasks = [asyncio.create_task(w.run()) for w in workers]
+    try:
+        # Drain the 2n-job backlog
+        t = time.perf_counter()
+        await _wait(2 * n)
+        drain_rate = 2 * n / (time.perf_counter() - t)
+
+        # Latency at a fixed arrival rate
+        _done.clear()
+        m = _args.latency_jobs
+        start = time.perf_counter()
+        for i in range(m):
+            delay = start + i / _args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await enqueue_job(JobType.NOTIFY, _payload(kind, f"c{i}"), tenant_id=tenant)
+        await _wait(m)
+        lat = list(_done.values())
+    finally:
+        for w in workers:
+            w.stop()
+        await asyncio.gather(*tasks)
+        await _cleanup(client, tenant)
+    return {"enqueue": enqueue_rate, "many": many_rate, "drain": drain_rate,
+            "p50": _pct(lat, 50), "p95": _pct(lat, 95), "p99": _pct(lat, 99)}
+
+
+async def _client(backend: str):
+    if backend == "memory":
+        return None
+    if backend == "fakeredis":
+        try:
+            import fakeredis
+        except ImportError:
+            print("fakeredis not installed — skipping (pip install fakeredis lupa)")
+            return False
+        return fakeredis.FakeAsyncRedis(decode_responses=True)
+    import redis.asyncio as aioredis
+    client = aioredis.from_url(_args.redis_url, decode_responses=True)
+    try:
+        await client.ping()
+    except Exception as e:
+        print(f"redis at {_args.redis_url} unavailable ({e}) — skipping")
+        return False
+    return client
+
+
+async def run() -> None:
+    original = jobs._handlers.get(JobType.NOTIFY.value)
+    jobs._handlers[JobType.NOTIFY.value] = (_handler, False)
+    print(f"{'backend':<10} {'handler':<7} {'wk':>3} {'conc':>5} {'enqueue/s':>10} {'many/s':>10} "
+          f"{'drain/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    try:
+        for backend in _args.backend:
+            client = await _client(backend)
+            if client is False:
+                continue
+            use_backend(client)
+            for kind in _args.handler:
+                for n_workers in _args.workers:
+                    for concurrency in _args.concurrency:
+                        r = await run_case(client, kind, n_workers, concurrency)
+                        print(f"{backend:<10} {kind:<7} {n_workers:>3} {concurrency:>5} {r['enqueue']:>10,.0f} "
+                              f"{r['many']:>10,.0f} {r['drain']:>9,.0f} {r['p50']:>8.2f} {r['p95']:>8.2f} "
+                              f"{r['p99']:>8.2f}")
+            if client is not None:
+                await client.aclose()
+    finally:
+        if original:
+            jobs._handlers[JobType.NOTIFY.value] = original
+        jobs._redis_client, jobs._get_redis = None, _real_get_redis
+        shutdown_process_pool()
+
+
+def main(argv=None):
+    global _args
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--backend", nargs="+", default=["memory", "fakeredis"],
+                    choices=["memory", "fakeredis", "redis"])
+    ap.add_argument("--handler", nargs="+", default=["noop", "sleep"], choices=["noop", "sleep", "cpu"])
+    ap.add_argument("--workers", type=int, nargs="+", default=[1])
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    ap.add_argument("--jobs", type=int, default=2000, help="backlog size per enqueue method")
+    ap.add_argument("--latency-jobs", type=int, default=500)
+    ap.add_argument("--rate", type=float, default=200, help="arrivals/sec for the latency phase")
+    ap.add_argument("--sleep-ms", type=float, default=5)
+    ap.add_argument("--spin", type=int, default=200_000)
+    ap.add_argument("--timeout", type=float, default=300, help="seconds to wait for a phase to finish")
+    ap.add_argument("--redis-url", default="redis://localhost:6379/15")
+    _args = ap.parse_args(argv)
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+Middleware overhead benchmark — BaseHTTPMiddleware vs plain ASGI.
+
+    python -m benchmarks.middleware [--requests 5000] [--chunks 50]
+
+Calls a small FastAPI app in-process (no sockets) on uvloop when it is installed,
+and reports µs per request for:
+  bare       — no middleware
+  legacy     — the former BaseHTTPMiddleware ObservabilityMiddleware + AuditMiddleware
+  asgi       — the current plain-ASGI ObservabilityMiddleware + AuditMiddleware
+for a JSON GET, an audited JSON POST and a StreamingResponse of --chunks chunks.
+The audit layer runs without a DB factory so only middleware cost is measured.
+"""
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.core import observability
+from app.core.audit import AUDIT_METHODS, AUDIT_SKIP_PATHS, AuditMiddleware
+from app.core.observability import ObservabilityMiddleware
+
+
+class LegacyObservabilityMiddleware(BaseHTTPMiddleware):
+    """The pre-ASGI implementation's request path (metrics, headers, access log)."""
+
+    async def dispatch(self, request: Request, call_next) -> Response:
+        trace_id = str(uuid.uuid4())[:8]
+        request.state.trace_id = trace_id
+        observability._metrics["requests_total"] += 1
+        start = time.time()
+        response = await call_next(request)
+        duration_ms = round((time.time() - start) * 1000, 2)
+        key = observability._route_key(request.method, observability.route_template(request.scope))
+        by_route = observability._metrics["requests_by_route"]
+        by_route[key] = by_route.get(key, 0) + 1
+        response.headers["X-Trace-ID"] = trace_id
+        response.headers["X-Response-Time"] = f"{duration_ms}ms"
+        request.headers.get("X-Tenant-ID", "-")
+        return response
+
+
+class LegacyAuditMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next) -> Response:
+        path = request.url.path
+        if request.method not in AUDIT_METHODS or path in AUDIT_SKIP_PATHS or not path.startswith("/api/"):
+            return await call_next(request)
+        response = await call_next(request)
+        getattr(request.state, "user_id", None)
+        return response
+
+
+def build_app(stack: str, chunks: int) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/v1/items/{item_id}")
+    async def item(item_id: str):
+        return {"id": item_id, "name": "Widget", "qty": 3}
+
+    @app.post("/api/v1/sales/orders/{oid}/confirm")
+    async def confirm(oid: str, request: Request):
+        request.state.user_id = "u1"
+        return {"ok": True}
+
+    @app.get("/api/v1/export")
+    async def export():
+        async def rows():
+            for i in range(chunks):
+                yield b"x" * 1024
+        return StreamingResponse(rows(), media_type="application/octet-stream")
+
+    if stack == "legacy":
+        app.add_middleware(LegacyObservabilityMiddleware)
+        app.add_middleware(LegacyAuditMiddleware)
+    elif stack == "asgi":
+        app.add_middleware(ObservabilityMiddleware)
+        app.add_middleware(AuditMiddleware)
+    return app
+
+
+async def call(app, method: str, path: str) -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 5000),
+        "server": ("bench", 80),
+    }
+    sent, requested = 0, False
+
+    async def receive():
+        nonlocal requested
+        if requested:                               # like a server: block until the client leaves
+            await asyncio.Event().wait()
+        requested = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal sent
+        if message["type"] == "http.response.body":
+            sent += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return sent
+
+
+async def run(requests: int, chunks: int) -> None:
+    cases = {
+        "GET json":   ("GET",  "/api/v1/items/42"),
+        "POST audit": ("POST", "/api/v1/sales/orders/7/confirm"),
+        "stream":     ("GET",  "/api/v1/export"),
+    }
+    print(f"{'case':<11} {'bare µs':>9} {'legacy µs':>10} {'asgi µs':>9} {'legacy +µs':>11} {'asgi +µs':>9}")
+    apps = {stack: build_app(stack, chunks) for stack in ("bare", "legacy", "asgi")}
+    for name, (method, path) in cases.items():
+        res = {}
+        for stack, app in apps.items():
+            for _ in range(200):                     # warm up routing / caches
+                await call(app, method, path)
+            best = None
+            for _ in range(3):
+                t = time.perf_counter()
+                for _ in range(requests):
+                    await call(app, method, path)
+                elapsed = (time.perf_counter() - t) / requests * 1e6
+                best = elapsed if best is None else min(best, elapsed)
+            res[stack] = best
+        print(f"{name:<11} {res['bare']:>9.1f} {res['legacy']:>10.1f} {res['asgi']:>9.1f} "
+              f"{res['legacy'] - res['bare']:>11.1f} {res['asgi'] - res['bare']:>9.1f}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--requests", type=int, default=5000)
+    ap.add_argument("--chunks", type=int, default=50)
+    args = ap.parse_args(argv)
+    try:
+        import uvloop
+        uvloop.install()
+        print("event loop: uvloop")
+    except ImportError:
+        print("event loop: asyncio (uvloop not installed)")
+    observability.logging.getLogger("cierp.http").disabled = True
+    asyncio.run(run(args.requests, args.chunks))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Serialization microbenchmark — legacy row_to_dict vs compiled encoders.
+
+    python -m benchmarks.serialization [--rows 100 500] [--repeat 200]
+
+Builds synthetic AccountMove rows (ORM instances and plain Core-style tuples)
+and times, per response of N rows:
+  legacy      — the old reflective row_to_dict + stdlib json.dumps
+  compiled    — encoder_for(Model) on ORM instances + ORJSONResponse.render
+  core rows   — row_encoder_for(Model) on tuples   + ORJSONResponse.render
+"""
+import argparse
+import json
+import sys
+import timeit
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from fastapi.responses import ORJSONResponse
+
+from app.core.serialization import encoder_for, row_encoder_for, table_columns
+from app.modules.accounting.models import AccountMove
+
+
+def legacy_row_to_dict(obj):
+    d = {}
+    for c in obj.__table__.columns:
+        v = getattr(obj, c.name)
+        if hasattr(v, 'isoformat'):
+            v = v.isoformat()
+        elif hasattr(v, '__float__'):
+            try:
+                v = float(v)
+            except Exception:
+                pass
+        d[c.name] = v
+    return d
+
+
+def make_rows(n: int):
+    now = datetime.now(timezone.utc)
+    objs = []
+    for i in range(n):
+        objs.append(AccountMove(
+            id=str(uuid.uuid4()), tenant_id="cierp", name=f"SINV-2025-{i:04d}",
+            move_type="out_invoice", state="posted", partner_name=f"Customer {i}",
+            move_date=now, due_date=now, currency="USD", ref=f"Invoice {i}",
+            amount_untaxed=Decimal("100.0000"), amount_tax=Decimal("11.0000"),
+            amount_total=Decimal("111.0000"), amount_residual=Decimal("111.0000"),
+            payment_state="not_paid", created_at=now, updated_at=now, is_deleted=False,
+        ))
+    tuples = [tuple(getattr(o, c.name) for c in table_columns(AccountMove)) for o in objs]
+    return objs, tuples
+
+
+def run(sizes, repeat: int):
+    render = ORJSONResponse(None).render
+    enc = encoder_for(AccountMove)
+    row_enc = row_encoder_for(AccountMove)
+
+    print(f"{'rows':>6} {'legacy µs':>12} {'compiled µs':>12} {'core rows µs':>13} {'speed-up':>9}")
+    for n in sizes:
+        objs, tuples = make_rows(n)
+        cases = {
+            "legacy":   lambda: json.dumps({"items": [legacy_row_to_dict(o) for o in objs]}).encode(),
+            "compiled": lambda: render({"items": [enc(o) for o in objs]}),
+            "core":     lambda: render({"items": [row_enc(t) for t in tuples]}),
+        }
+        res = {k: min(timeit.repeat(fn, number=repeat, repeat=3)) / repeat * 1e6 for k, fn in cases.items()}
+        print(f"{n:>6} {res['legacy']:>12.1f} {res['compiled']:>12.1f} {res['core']:>13.1f} "
+              f"{res['legacy'] / res['core']:>8.1f}x")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--rows", type=int, nargs="+", default=[100, 500])
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args(argv)
+    run(args.rows, args.repeat)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+"""Add document_sequence counter table
+
+Revision ID: 20250905_005
+Revises: 20250904_004
+Create Date: 2025-09-05 09:00:00
+
+What this migration does
+------------------------
+Creates `document_sequence` — one row per (tenant_id, code, year) holding the
+last number handed out for that document type (see app/core/sequence.py).
+Rows are created lazily on first use and seeded from the existing row count,
+so no data backfill is needed here.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '20250905_005'
+down_revision = '20250904_004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'document_sequence',
+        sa.Column('tenant_id',  sa.String(100), nullable=False),
+        sa.Column('code',       sa.String(40),  nullable=False),
+        sa.Column('year',       sa.Integer(),   nullable=False, server_default=sa.text('0')),
+        sa.Column('last_value', sa.BigInteger(), nullable=False, server_default=sa.text('0')),
+        sa.Column('updated_at', sa.DateTime(timezone=True),
+                  server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('tenant_id', 'code', 'year', name='pk_document_sequence'),
+    )
+
+
+def downgrade():
+    op.drop_table('document_sequence')
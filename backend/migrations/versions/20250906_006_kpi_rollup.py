@@ -0,0 +1,40 @@
+"""Add kpi_rollup table for incrementally maintained dashboard KPIs
+
+Revision ID: 20250906_006
+Revises: 20250905_005
+Create Date: 2025-09-06 09:00:00
+
+What this migration does
+------------------------
+Creates `kpi_rollup` — per (tenant_id, metric, day) net change of each value
+KPI, plus one running-total row per metric at day 0001-01-01
+(see app/core/kpi.py).
+
+The table starts empty.  The application records the default tenant's current
+values on its next start; other tenants with POST /api/v1/dashboard/kpis/reconcile.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '20250906_006'
+down_revision = '20250905_005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'kpi_rollup',
+        sa.Column('tenant_id',  sa.String(100), nullable=False),
+        sa.Column('metric',     sa.String(60),  nullable=False),
+        sa.Column('day',        sa.Date(),      nullable=False),
+        sa.Column('value',      sa.Numeric(20, 4), nullable=False, server_default=sa.text('0')),
+        sa.Column('updated_at', sa.DateTime(timezone=True),
+                  server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('tenant_id', 'metric', 'day', name='pk_kpi_rollup'),
+    )
+
+
+def downgrade():
+    op.drop_table('kpi_rollup')
@@ -0,0 +1,53 @@
+"""Add composite indexes matching the list endpoints' sort keys
+
+Revision ID: 20250907_007
+Revises: 20250906_006
+Create Date: 2025-09-07 09:00:00
+
+What this migration does
+------------------------
+Every list endpoint filters on tenant_id and orders by one sort key plus id as
+tiebreaker (see app/core/pagination.py).  Each table gets an index on
+(tenant_id, <sort key>, id), so both the first page and every keyset
+`?cursor=` seek are a range scan on that index instead of a sort of the
+tenant's rows.  The same indexes are declared on the models.
+"""
+from alembic import op
+
+
+revision = '20250907_007'
+down_revision = '20250906_006'
+branch_labels = None
+depends_on = None
+
+LIST_SORT_KEYS = [
+    ('account_move',     'created_at'),
+    ('payment',          'created_at'),
+    ('customer',         'name'),
+    ('sale_order',       'created_at'),
+    ('lead',             'created_at'),
+    ('supplier',         'name'),
+    ('purchase_order',   'created_at'),
+    ('product',          'name'),
+    ('stock_picking',    'created_at'),
+    ('stock_move',       'created_at'),
+    ('employee',         'first_name'),
+    ('leave_request',    'created_at'),
+    ('payslip',          'created_at'),
+    ('bom',              'product_name'),
+    ('production_order', 'created_at'),
+    ('activity',         'created_at'),
+    ('project',          'created_at'),
+    ('task',             'created_at'),
+    ('helpdesk_ticket',  'created_at'),
+]
+
+
+def upgrade():
+    for table, key in LIST_SORT_KEYS:
+        op.create_index(f'ix_{table}_tenant_{key}', table, ['tenant_id', key, 'id'])
+
+
+def downgrade():
+    for table, key in LIST_SORT_KEYS:
+        op.drop_index(f'ix_{table}_tenant_{key}', table_name=table)
@@ -0,0 +1,42 @@
+"""Add kpi_delta table for append-only KPI changes
+
+Revision ID: 20250908_008
+Revises: 20250907_007
+Create Date: 2025-09-08 09:00:00
+
+What this migration does
+------------------------
+Creates `kpi_delta` — the KPI changes written by each flush, one insert per
+(tenant_id, metric), until the kpi_rollup job folds them into `kpi_rollup`
+(see app/core/kpi.py).  Writers no longer update the running-total rows of
+`kpi_rollup` themselves.
+
+The table starts empty; no backfill is needed.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '20250908_008'
+down_revision = '20250907_007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'kpi_delta',
+        sa.Column('id',         sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column('tenant_id',  sa.String(100), nullable=False),
+        sa.Column('metric',     sa.String(60),  nullable=False),
+        sa.Column('day',        sa.Date(),      nullable=False),
+        sa.Column('value',      sa.Numeric(20, 4), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True),
+                  server_default=sa.text('now()'), nullable=False),
+    )
+    op.create_index('ix_kpi_delta_tenant_metric_day', 'kpi_delta', ['tenant_id', 'metric', 'day'])
+
+
+def downgrade():
+    op.drop_index('ix_kpi_delta_tenant_metric_day', table_name='kpi_delta')
+    op.drop_table('kpi_delta')
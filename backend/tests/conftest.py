@@ -0,0 +1,40 @@
+"""
+CI ERP — Test fixtures
+Async tests run on anyio's pytest plugin (`pytestmark = pytest.mark.anyio`).
+Job-queue tests take the `backend` fixture, so each runs twice: against
+fakeredis (with Lua, so the claim/reap/promote scripts really execute) and
+against the in-memory MemoryJobBackend.
+"""
+import fakeredis
+import pytest
+
+from app.core import jobs_impl
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(params=["redis", "memory"])
+def backend(request, monkeypatch):
+    """The fake Redis client the job queue uses, or None for the in-memory backend."""
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True) if request.param == "redis" else None
+
+    async def get_redis(silent: bool = False):
+        return redis
+
+    monkeypatch.setattr(jobs_impl, "_get_redis", get_redis)
+    monkeypatch.setattr(jobs_impl, "_scripts", {})      # scripts bind to the client they were registered on
+    jobs_impl._memory.clear()
+    yield redis
+    jobs_impl._memory.clear()
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    """Install a test handler for one job type: handler(JobType.NOTIFY, async fn(payload))."""
+    def install(job_type, fn):
+        monkeypatch.setitem(jobs_impl._handlers, job_type.value, (fn, False))
+
+    return install
@@ -0,0 +1,268 @@
+"""
+Job queue semantics, on fakeredis and on the in-memory backend (see conftest.backend).
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.core import jobs_impl
+from app.core.jobs_impl import (
+    JobStatus, JobType, JobWorker, _processing_key, _promote_due, _workers_key,
+    count_dead_letters, enqueue_job, get_job_status, replay_dead_letters, retry_dead_letter,
+)
+
+pytestmark = pytest.mark.anyio
+
+TENANT = "t1"
+
+
+def _worker(**kw) -> JobWorker:
+    return JobWorker(tenant_id=TENANT, poll_interval=0.05, **kw)
+
+
+async def _run_all(worker: JobWorker) -> int:
+    """Process jobs inline until none is ready; returns how many ran."""
+    n = 0
+    while await worker._process_one():
+        n += 1
+    return n
+
+
+async def _succeed(payload):
+    return {"echo": payload["n"]}
+
+
+async def _fail(payload):
+    raise RuntimeError("boom")
+
+
+@pytest.fixture
+def fail_fast(monkeypatch):
+    """Dead-letter on the first failure instead of retrying with back-off."""
+    monkeypatch.setattr(jobs_impl, "MAX_ATTEMPTS", 1)
+
+
+# ─── Claim / ack ──────────────────────────────────────────────────────────────
+
+async def test_claim_runs_job_and_acks(backend, handler):
+    handler(JobType.NOTIFY, _succeed)
+    job_id = await enqueue_job(JobType.NOTIFY, {"n": 7}, tenant_id=TENANT)
+    assert (await get_job_status(job_id, TENANT))["status"] == JobStatus.PENDING.value
+
+    worker = _worker()
+    assert await _run_all(worker) == 1
+
+    job = await get_job_status(job_id, TENANT)
+    assert job["status"] == JobStatus.DONE.value
+    assert job["result"] == {"echo": 7}
+    assert job["attempts"] == 1
+    if backend:
+        assert await backend.llen(_processing_key(TENANT, worker.worker_id)) == 0
+    assert await _run_all(_worker()) == 0       # acked: never handed out again
+
+
+async def test_job_status_is_tenant_scoped(backend):
+    job_id = await enqueue_job(JobType.NOTIFY, {"n": 1}, tenant_id=TENANT)
+    assert await get_job_status(job_id, TENANT) is not None
+    assert await get_job_status(job_id, "other") is None
+
+
+# ─── Recovery of unfinished jobs ──────────────────────────────────────────────
+
+async def test_reap_requeues_jobs_of_worker_that_missed_heartbeat(backend, handler):
+    if backend is None:
+        pytest.skip("in-memory jobs never leave the process; see test_drain_timeout_returns_job_to_queue")
+    handler(JobType.NOTIFY, _succeed)
+    job_id = await enqueue_job(JobType.NOTIFY, {"n": 1}, tenant_id=TENANT)
+
+    crashed = _worker()
+    job, _, _ = await crashed._next_job()          # claimed, then the worker dies
+    assert job["id"] == job_id
+    stale = datetime.now(timezone.utc).timestamp() - jobs_impl.VISIBILITY_TIMEOUT - 1
+    await backend.zadd(_workers_key(TENANT), {crashed.worker_id: stale})
+
+    survivor = _worker()
+    await survivor._heartbeat(backend)
+    assert await survivor._reap(backend) == 1
+    assert await survivor._reap(backend) == 0      # the reaper that removed the heartbeat moved it
+    assert await _run_all(survivor) == 1
+    assert (await get_job_status(job_id, TENANT))["status"] == JobStatus.DONE.value
+
+
+async def test_live_worker_is_not_reaped(backend):
+    if backend is None:
+        pytest.skip("no heartbeats in the in-memory backend")
+    await enqueue_job(JobType.NOTIFY, {"n": 1}, tenant_id=TENANT)
+    busy = _worker()
+    await busy._heartbeat(backend)
+    assert (await busy._next_job())[0] is not None
+    assert await _worker()._reap(backend) == 0
+
+
+async def test_drain_timeout_returns_job_to_queue(backend, handler):
+    started = asyncio.Event()
+
+    async def hang(payload):
+        started.set()
+        await asyncio.sleep(60)
+
+    handler(JobType.NOTIFY, hang)
+    job_id = await enqueue_job(JobType.NOTIFY, {"n": 1}, tenant_id=TENANT)
+    worker = _worker(drain_timeout=0.05)
+    run = asyncio.create_task(worker.run())
+    await asyncio.wait_for(started.wait(), 5)
+    worker.stop()
+    await asyncio.wait_for(run, 5)
+
+    handler(JobType.NOTIFY, _succeed)
+    assert await _run_all(_worker()) == 1
+    assert (await get_job_status(job_id, TENANT))["status"] == JobStatus.DONE.value
+
+
+# ─── Delayed jobs ─────────────────────────────────────────────────────────────
+
+async def _promote(backend) -> None:
+    """What worker housekeeping does each tick (the memory backend promotes on claim)."""
+    if backend:
+        await _promote_due(backend, [TENANT])
+
+
+async def test_delayed_job_runs_only_once_due(backend, handler):
+    handler(JobType.NOTIFY, _succeed)
+    run_at = datetime.now(timezone.utc) + timedelta(seconds=0.3)
+    job_id = await enqueue_job(JobType.NOTIFY, {"n": 1}, tenant_id=TENANT, run_at=run_at)
+    worker = _worker()
+
+    await _promote(backend)
+    assert await worker._process_one() is False
+    assert (await get_job_status(job_id, TENANT))["status"] == JobStatus.PENDING.value
+
+    await asyncio.sleep(0.5)
+    await _promote(backend)
+    assert await _run_all(worker) == 1
+    assert (await get_job_status(job_id, TENANT))["status"] == JobStatus.DONE.value
+
+
+async def test_failed_job_is_retried_after_backoff(backend, handler, monkeypatch):
+    monkeypatch.setattr(jobs_impl, "RETRY_DELAY_SECONDS", [0, 0.2, 0.2])
+    calls = []
+
+    async def flaky(payload):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("transient")
+        return "ok"
+
+    handler(JobType.NOTIFY, flaky)
+    job_id = await enqueue_job(JobType.NOTIFY, {"n": 1}, tenant_id=TENANT)
+    worker = _worker()
+    assert await _run_all(worker) == 1
+    assert (await get_job_status(job_id, TENANT))["status"] == JobStatus.RETRYING.value
+
+    await asyncio.sleep(0.4)
+    await _promote(backend)
+    assert await _run_all(worker) == 1
+    job = await get_job_status(job_id, TENANT)
+    assert job["status"] == JobStatus.DONE.value and job["attempts"] == 2
+
+
+# ─── Idempotency ──────────────────────────────────────────────────────────────
+
+async def test_idempotent_enqueue_returns_first_job(backend):
+    first = await enqueue_job(JobType.NOTIFY, {"n": 1}, tenant_id=TENANT, idempotency_key="k")
+    assert await enqueue_job(JobType.NOTIFY, {"n": 1}, tenant_id=TENANT, idempotency_key="k") == first
+    assert await enqueue_job(JobType.NOTIFY, {"n": 1}, tenant_id="other", idempotency_key="k") != first
+
+
+async def test_idempotent_reenqueue_after_dead_letter(backend, handler, fail_fast):
+    handler(JobType.NOTIFY, _fail)
+    first = await enqueue_job(JobType.NOTIFY, {"n": 1}, tenant_id=TENANT, idempotency_key="k")
+    await _run_all(_worker())
+    assert (await get_job_status(first, TENANT))["status"] == JobStatus.DEAD.value
+
+    second = await enqueue_job(JobType.NOTIFY, {"n": 1}, tenant_id=TENANT, idempotency_key="k")
+    assert second != first
+    assert await enqueue_job(JobType.NOTIFY, {"n": 1}, tenant_id=TENANT, idempotency_key="k") == second
+
+    handler(JobType.NOTIFY, _succeed)
+    assert await _run_all(_worker()) == 1
+    assert (await get_job_status(second, TENANT))["status"] == JobStatus.DONE.value
+
+
+async def test_concurrent_reenqueue_after_dead_letter_queues_one_job(backend, handler, fail_fast):
+    handler(JobType.NOTIFY, _fail)
+    await enqueue_job(JobType.NOTIFY, {"n": 1}, tenant_id=TENANT, idempotency_key="k")
+    await _run_all(_worker())
+
+    ids = await asyncio.gather(*[
+        enqueue_job(JobType.NOTIFY, {"n": 1}, tenant_id=TENANT, idempotency_key="k") for _ in range(5)
+    ])
+    assert len(set(ids)) == 1
+
+
+async def test_failed_enqueue_releases_idempotency_key(backend, monkeypatch):
+    if backend is None:
+        pytest.skip("the in-memory enqueue cannot fail midway")
+    pipeline = backend.pipeline
+
+    def broken_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+
+        async def execute(*a, **k):
+            raise ConnectionError("connection lost")
+
+        pipe.execute = execute
+        return pipe
+
+    monkeypatch.setattr(backend, "pipeline", broken_pipeline)
+    with pytest.raises(ConnectionError):
+        await enqueue_job(JobType.NOTIFY, {"n": 1}, tenant_id=TENANT, idempotency_key="k")
+    monkeypatch.setattr(backend, "pipeline", pipeline)
+
+    job_id = await enqueue_job(JobType.NOTIFY, {"n": 1}, tenant_id=TENANT, idempotency_key="k")
+    assert await get_job_status(job_id, TENANT) is not None
+
+
+# ─── Dead letters ─────────────────────────────────────────────────────────────
+
+async def test_replay_dead_letters(backend, handler, fail_fast):
+    handler(JobType.NOTIFY, _fail)
+    ids = [await enqueue_job(JobType.NOTIFY, {"n": n}, tenant_id=TENANT) for n in range(3)]
+    await _run_all(_worker())
+    assert await count_dead_letters(TENANT) == 3
+
+    handler(JobType.NOTIFY, _succeed)
+    assert await replay_dead_letters(TENANT) == 3
+    assert await replay_dead_letters(TENANT) == 0
+    assert await count_dead_letters(TENANT) == 0
+    assert await _run_all(_worker()) == 3
+    for job_id in ids:
+        job = await get_job_status(job_id, TENANT)
+        assert job["status"] == JobStatus.DONE.value
+        assert job["history"][-1]["event"] == "replayed"
+
+
+async def test_concurrent_replays_enqueue_each_dead_letter_once(backend, handler, fail_fast):
+    handler(JobType.NOTIFY, _fail)
+    for n in range(5):
+        await enqueue_job(JobType.NOTIFY, {"n": n}, tenant_id=TENANT)
+    await _run_all(_worker())
+
+    replayed = await asyncio.gather(*[replay_dead_letters(TENANT) for _ in range(3)])
+    assert sum(replayed) == 5
+    handler(JobType.NOTIFY, _succeed)
+    assert await _run_all(_worker()) == 5
+
+
+async def test_retry_single_dead_letter(backend, handler, fail_fast):
+    handler(JobType.NOTIFY, _fail)
+    job_id = await enqueue_job(JobType.NOTIFY, {"n": 1}, tenant_id=TENANT)
+    await _run_all(_worker())
+
+    assert await retry_dead_letter(job_id, "other") is False
+    assert await retry_dead_letter(job_id, TENANT) is True
+    assert await retry_dead_letter(job_id, TENANT) is False
+    handler(JobType.NOTIFY, _succeed)
+    assert await _run_all(_worker()) == 1
+    assert (await get_job_status(job_id, TENANT))["status"] == JobStatus.DONE.value